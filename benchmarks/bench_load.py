@@ -0,0 +1,434 @@
+"""
+Teste de carga da aplicação Flask com um modelo Gemini falso (sem rede e sem chave de API).
+
+Para cada tamanho de banco (`--db-sizes`, histórico sintético gerado em `classifications`),
+cenário (`--scenarios`) e nível de concorrência (`--concurrency`), dispara `--requests`
+requisições pelo cliente de teste do Flask e mostra as latências p50/p95/p99, as requisições
+por segundo, os erros e o pico de memória (RSS). Cada combinação roda em um processo novo, com
+uma cópia do banco gerado, para que o pico de RSS e os caches não contaminem a medição seguinte.
+
+O modelo falso responde após `--latency` segundos (± `--jitter`) e falha com um erro transitório
+(503) na fração `--failure-rate` das chamadas. Outro modelo pode ser usado com
+`--model-factory modulo:funcao`: a função recebe latency, jitter, failure_rate e seed e retorna
+um objeto com `generate_content(prompt, request_options=None)`.
+
+O cache e as quase-duplicatas ficam desligados (use `--with-cache` para ligá-los), para que cada
+e-mail passe pelo pipeline completo. As demais opções vêm do ambiente/.env, como no servidor.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_load.py --concurrency 1,4,16 --db-sizes 0,10000 --requests 200
+    python benchmarks/bench_load.py --save benchmarks/baseline.json
+    python benchmarks/bench_load.py --compare benchmarks/baseline.json --tolerance 0.15
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+CORPUS_DIR = os.path.join(PROJECT_ROOT, 'Test-Email')
+
+sys.path.insert(0, SRC_DIR)
+
+SCENARIOS = ('classify_text', 'classify_pdf', 'history', 'dashboard_data', 'export_history')
+RESULT_MARKER = 'BENCH_RESULT '
+
+# --- Modelo falso --------------------------------------------------------------------------------
+
+class FakeServiceUnavailable(Exception):
+    """Erro transitório simulado; o nome e o código fazem o LLMClient tratá-lo como um 503 do serviço."""
+    code = 503
+
+class FakeUsage:
+    def __init__(self, prompt_tokens, candidates_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = candidates_tokens
+        self.total_token_count = prompt_tokens + candidates_tokens
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+class FakeGenerativeModel:
+    """Substituto de genai.GenerativeModel com latência e taxa de falhas configuráveis."""
+
+    def __init__(self, latency=0.3, jitter=0.2, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            return self._rng.uniform(1 - self.jitter, 1 + self.jitter), self._rng.random()
+
+    def generate_content(self, prompt, request_options=None):
+        factor, failure_draw = self._draw()
+        time.sleep(max(0.0, self.latency * factor))
+        if failure_draw < self.failure_rate:
+            raise FakeServiceUnavailable("Serviço simulado indisponível.")
+
+        # Prompt agrupado: um objeto por "E-mail id=N"
+        ids = [int(number) for number in re.findall(r'=== E-mail id=(\d+) ===', prompt)]
+        entries = [self._entry(prompt, number) for number in ids] if ids else None
+        text = json.dumps(entries if entries is not None else self._entry(prompt), ensure_ascii=False)
+        return FakeResponse(text, FakeUsage(len(prompt) // 4, len(text) // 4))
+
+    @staticmethod
+    def _entry(prompt, number=None):
+        productive = 'fatura' in prompt or 'acesso' in prompt or 'erro' in prompt
+        entry = {
+            'classification': 'Produtivo' if productive else 'Improdutivo',
+            'confidence_score': 0.9,
+            'key_topic': 'Solicitação' if productive else 'Agradecimento',
+            'sentiment': 'Neutro',
+            'suggested_response': 'Recebemos sua mensagem e retornaremos em breve.',
+        }
+        if number is not None:
+            entry['id'] = number
+        return entry
+
+def load_model_factory(spec):
+    """Importa a fábrica 'modulo:funcao' (ou 'modulo:Classe') do modelo."""
+    import importlib
+
+    module_name, _, attribute = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attribute or 'FakeGenerativeModel')
+
+# --- Dados sintéticos ----------------------------------------------------------------------------
+
+PRODUCTIVE_TEMPLATES = [
+    "Olá, a fatura {numero} de {mes} veio com um valor diferente do contrato. Podem verificar e reenviar o boleto?",
+    "Bom dia, estou sem acesso ao sistema desde {mes}. O erro {numero} aparece ao fazer login. Podem ajudar?",
+    "Prezados, qual o status do chamado {numero}? Precisamos da atualização até o fim de {mes}.",
+    "Hello, the invoice {numero} for {mes} is still pending. Could you confirm the payment date?",
+]
+UNPRODUCTIVE_TEMPLATES = [
+    "Muito obrigado pelo excelente atendimento no chamado {numero}! Feliz {mes} a toda a equipe.",
+    "Parabéns pelo lançamento de {mes}, o time está de parabéns. Abraços!",
+    "Thank you so much for the help last {mes}, have a great week!",
+]
+FILLER_WORDS = (
+    "contrato cliente equipe projeto relatório reunião prazo pagamento sistema suporte conta pedido "
+    "entrega nota fiscal cadastro senha acesso proposta orçamento documento anexo planilha"
+).split()
+MONTHS = ['janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho', 'julho', 'agosto', 'setembro',
+          'outubro', 'novembro', 'dezembro']
+
+def make_email(rng, productive=None):
+    """Gera um e-mail sintético (produtivo ou não) com um trecho de palavras aleatórias, para não repetir o texto."""
+    if productive is None:
+        productive = rng.random() < 0.6
+    template = rng.choice(PRODUCTIVE_TEMPLATES if productive else UNPRODUCTIVE_TEMPLATES)
+    body = template.format(numero=rng.randint(1000, 999999), mes=rng.choice(MONTHS))
+    filler = ' '.join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(10, 60)))
+    return f"{body}\n\n{filler.capitalize()}.\n\nAtenciosamente,\nFulano"
+
+def generate_history(database_path, rows, seed=0, batch_size=5000):
+    """Cria o banco (com as migrações da aplicação) e insere `rows` classificações espalhadas nos últimos 180 dias."""
+    import database
+
+    database.DATABASE_NAME = database_path
+    database.initialize_db()
+
+    rng = random.Random(seed)
+    now = datetime.datetime.now()
+    sources = ['llm'] * 7 + ['cache', 'local', 'near_duplicate']
+    conn = sqlite3.connect(database_path)
+    try:
+        for start in range(0, rows, batch_size):
+            batch = []
+            for _ in range(min(batch_size, rows - start)):
+                productive = rng.random() < 0.6
+                content = make_email(rng, productive)
+                created_at = now - datetime.timedelta(seconds=rng.randint(0, 180 * 24 * 3600))
+                batch.append((
+                    'Produtivo' if productive else 'Improdutivo',
+                    round(rng.uniform(0.5, 1.0), 4),
+                    rng.choice(['Solicitação de Pagamento', 'Suporte Técnico', 'Status de Chamado', 'Felicitação']),
+                    rng.choice(['Positivo', 'Negativo', 'Neutro']),
+                    'Recebemos sua mensagem e retornaremos em breve.',
+                    content,
+                    rng.choice(sources),
+                    created_at.isoformat(),
+                    database.make_snippet(content),
+                ))
+            conn.executemany("""
+                INSERT INTO classifications (classification, confidence_score, key_topic, sentiment, suggested_response, email_content, source, created_at, email_snippet)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+            conn.commit()
+        # Consolida o WAL no arquivo principal para que o banco possa ser copiado
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+def load_pdf_corpus():
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '**', '*.pdf'), recursive=True)):
+        with open(path, 'rb') as f:
+            corpus.append((os.path.basename(path), f.read()))
+    return corpus
+
+# --- Cenários (executados no processo filho) -----------------------------------------------------
+
+def request_classify_text(client, rng, pdfs):
+    return client.post('/classify', data={'email_text': make_email(rng)})
+
+def request_classify_pdf(client, rng, pdfs):
+    filename, data = rng.choice(pdfs)
+    return client.post('/classify', data={'files[]': [(BytesIO(data), filename)]}, content_type='multipart/form-data')
+
+def request_history(client, rng, pdfs):
+    return client.get('/history')
+
+def request_dashboard_data(client, rng, pdfs):
+    return client.get('/dashboard/data')
+
+def request_export_history(client, rng, pdfs):
+    return client.get('/export_history')
+
+REQUESTS = {
+    'classify_text': request_classify_text,
+    'classify_pdf': request_classify_pdf,
+    'history': request_history,
+    'dashboard_data': request_dashboard_data,
+    'export_history': request_export_history,
+}
+
+def percentile(sorted_values, fraction):
+    """Percentil pelo método do posto mais próximo (valores já ordenados)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def peak_rss_mb():
+    # ru_maxrss está em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_scenario(config):
+    """Executa um cenário neste processo e retorna as métricas (chamado no processo filho)."""
+    os.environ['CACHE_ENABLED'] = '1' if config['with_cache'] else '0'
+    os.environ['NEAR_DUP_ENABLED'] = '1' if config['with_cache'] else '0'
+    os.environ['JOB_RESUME_ON_START'] = '0'
+    os.environ['WARM_UP_ON_START'] = '0'
+
+    import database
+    database.DATABASE_NAME = config['database']
+    import app
+
+    if config['model_factory']:
+        factory = load_model_factory(config['model_factory'])
+    else:
+        factory = FakeGenerativeModel
+    model = factory(latency=config['latency'], jitter=config['jitter'],
+                    failure_rate=config['failure_rate'], seed=config['seed'])
+    app.get_model = lambda: model
+    app.llm_client.get_model = lambda: model
+
+    send = REQUESTS[config['scenario']]
+    pdfs = load_pdf_corpus() if config['scenario'] == 'classify_pdf' else []
+    if config['scenario'] == 'classify_pdf' and not pdfs:
+        raise SystemExit(f"Nenhum PDF encontrado em {CORPUS_DIR}")
+
+    # Aquecimento (importações tardias, conexões do pool) fora da medição
+    warm_up_client = app.app.test_client()
+    for number in range(config['warm_up']):
+        send(warm_up_client, random.Random(number), pdfs)
+
+    latencies = []
+    errors = 0
+    counter = iter(range(config['requests']))
+    lock = threading.Lock()
+
+    def worker(worker_number):
+        nonlocal errors
+        client = app.app.test_client()
+        rng = random.Random(config['seed'] * 1000 + worker_number)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            started_at = time.perf_counter()
+            try:
+                response = send(client, rng, pdfs)
+                response.get_data()
+                failed = response.status_code >= 400 or (
+                    config['scenario'].startswith('classify') and '"error"' in response.get_data(as_text=True)
+                )
+            except Exception as e:
+                print(f"Erro na requisição: {e}")
+                failed = True
+            elapsed = time.perf_counter() - started_at
+            with lock:
+                latencies.append(elapsed)
+                errors += failed
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=config['concurrency']) as executor:
+        for worker_number in range(config['concurrency']):
+            executor.submit(worker, worker_number)
+    wall_time = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        'scenario': config['scenario'],
+        'concurrency': config['concurrency'],
+        'db_size': config['db_size'],
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'rps': round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'llm_calls': getattr(model, 'calls', None),
+    }
+
+def run_in_subprocess(config):
+    """Roda o cenário em um processo novo e devolve o resultado impresso por ele."""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run-scenario', json.dumps(config)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    sys.stderr.write(completed.stdout[-2000:] + completed.stderr[-4000:])
+    raise RuntimeError(f"O cenário {config['scenario']} falhou (código {completed.returncode}).")
+
+# --- Relatório e comparação ----------------------------------------------------------------------
+
+def print_header():
+    print(f"{'cenário':<16} {'banco':>8} {'conc.':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'req/s':>8} {'erros':>6} {'RSS MB':>7}")
+
+def print_result(result):
+    print(f"{result['scenario']:<16} {result['db_size']:>8} {result['concurrency']:>5} {result['p50_ms']:>9.1f} "
+          f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['rps']:>8.1f} {result['errors']:>6} "
+          f"{result['peak_rss_mb']:>7.0f}")
+
+def result_key(result):
+    return result['scenario'], result['db_size'], result['concurrency']
+
+def compare_runs(baseline, results, tolerance):
+    """
+    Compara com uma execução salva (--save). Há regressão quando o p95 sobe ou as req/s caem
+    mais que `tolerance` (fração). Retorna o número de regressões.
+    """
+    previous = {result_key(result): result for result in baseline['results']}
+    regressions = 0
+    print(f"\nComparação com a execução de {baseline.get('created_at', '?')} (tolerância {tolerance:.0%}):")
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        p95_change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+        rps_change = (result['rps'] - before['rps']) / before['rps'] if before['rps'] else 0.0
+        regressed = p95_change > tolerance or rps_change < -tolerance
+        regressions += regressed
+        print(f"{result['scenario']:<16} {result['db_size']:>8} {result['concurrency']:>5}   "
+              f"p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms ({p95_change:+.0%})   "
+              f"req/s {before['rps']:.1f} -> {result['rps']:.1f} ({rps_change:+.0%})"
+              f"{'   REGRESSÃO' if regressed else ''}")
+    return regressions
+
+def parse_int_list(value):
+    return [int(number) for number in value.split(',') if number.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Cenários separados por vírgula.')
+    parser.add_argument('--concurrency', type=parse_int_list, default=[1, 4, 16], help='Níveis de concorrência (ex.: 1,4,16).')
+    parser.add_argument('--db-sizes', type=parse_int_list, default=[0, 10000], help='Linhas de histórico sintético (ex.: 0,10000,100000).')
+    parser.add_argument('--requests', type=int, default=100, help='Requisições por combinação.')
+    parser.add_argument('--warm-up', type=int, default=3, help='Requisições de aquecimento (fora da medição).')
+    parser.add_argument('--latency', type=float, default=0.3, help='Latência média do modelo falso (segundos).')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Variação relativa da latência (0.2 = ±20%%).')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fração das chamadas que falham com 503.')
+    parser.add_argument('--model-factory', default=None, help='Modelo alternativo, no formato modulo:funcao.')
+    parser.add_argument('--with-cache', action='store_true', help='Mantém o cache e as quase-duplicatas ligados.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db-dir', default=None, help='Pasta dos bancos gerados (padrão: temporária).')
+    parser.add_argument('--save', default=None, help='Salva os resultados em JSON.')
+    parser.add_argument('--compare', default=None, help='JSON de uma execução anterior para detectar regressões.')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Variação tolerada na comparação (fração).')
+    parser.add_argument('--run-scenario', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(RESULT_MARKER + json.dumps(run_scenario(json.loads(args.run_scenario))))
+        return
+
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(',') if scenario.strip()]
+    unknown = set(scenarios) - set(REQUESTS)
+    if unknown:
+        sys.exit(f"Cenários desconhecidos: {', '.join(sorted(unknown))}")
+
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix='autou-bench-')
+    os.makedirs(db_dir, exist_ok=True)
+    print(f"Modelo: {args.model_factory or 'FakeGenerativeModel'} (latência {args.latency}s, falhas {args.failure_rate:.0%}), "
+          f"{args.requests} requisições por combinação, bancos em {db_dir}\n")
+
+    results = []
+    print_header()
+    for db_size in args.db_sizes:
+        template_path = os.path.join(db_dir, f'history-{db_size}.db')
+        if not os.path.exists(template_path):
+            started_at = time.perf_counter()
+            generate_history(template_path, db_size, seed=args.seed)
+            print(f"(banco com {db_size} linhas gerado em {time.perf_counter() - started_at:.1f} s)")
+
+        for scenario in scenarios:
+            for concurrency in args.concurrency:
+                # Cada execução usa uma cópia: as classificações gravadas não alteram o tamanho das seguintes
+                run_path = os.path.join(db_dir, 'run.db')
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(run_path + suffix):
+                        os.remove(run_path + suffix)
+                shutil.copyfile(template_path, run_path)
+
+                result = run_in_subprocess({
+                    'scenario': scenario, 'concurrency': concurrency, 'db_size': db_size,
+                    'database': run_path, 'requests': args.requests, 'warm_up': args.warm_up,
+                    'latency': args.latency, 'jitter': args.jitter, 'failure_rate': args.failure_rate,
+                    'model_factory': args.model_factory, 'with_cache': args.with_cache, 'seed': args.seed,
+                })
+                results.append(result)
+                print_result(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': datetime.datetime.now().isoformat(), 'config': vars(args), 'results': results},
+                      f, indent=2, ensure_ascii=False)
+        print(f"\nResultados salvos em {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_runs(baseline, results, args.tolerance)
+        if regressions:
+            sys.exit(f"\n{regressions} regressão(ões) acima da tolerância.")
+        print("\nNenhuma regressão acima da tolerância.")
+
+if __name__ == '__main__':
+    main()
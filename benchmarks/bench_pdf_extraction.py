@@ -0,0 +1,78 @@
+"""
+Benchmark da extração de texto de PDFs sobre o corpus Test-Email.
+
+Compara a extração serial anterior (todas as páginas, na thread da requisição) com o
+PdfExtractor nos modos 'inline', 'thread' e 'process', repetindo o corpus até `--files`
+arquivos. Mostra o tempo total, a vazão em arquivos/s e o pico de memória (RSS) do processo.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_pdf_extraction.py --files 200 --workers 4
+"""
+import argparse
+import glob
+import os
+import resource
+import sys
+import time
+from io import BytesIO
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(PROJECT_ROOT, 'Test-Email')
+
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+def legacy_extract(data):
+    """Implementação anterior: lê todas as páginas, sem limites."""
+    import pypdf
+    reader = pypdf.PdfReader(BytesIO(data))
+    return "".join(page.extract_text() or "" for page in reader.pages).strip()
+
+def peak_rss_mb():
+    # ru_maxrss está em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def report(label, elapsed, total_files, errors=0):
+    print(f"{label:<28} {elapsed:>8.2f} s {total_files / elapsed:>10.1f} arquivos/s"
+          f"   erros: {errors}   pico RSS: {peak_rss_mb():.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=120, help='Total de PDFs processados (o corpus é repetido).')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Workers dos pools.')
+    parser.add_argument('--max-pages', type=int, default=None, help='Limite de páginas por arquivo.')
+    parser.add_argument('--max-chars', type=int, default=None, help='Limite de caracteres por arquivo.')
+    args = parser.parse_args()
+
+    from pdf_extraction import PdfExtractor, PDF_MAX_PAGES, PDF_MAX_CHARS
+
+    paths = sorted(glob.glob(os.path.join(CORPUS_DIR, '**', '*.pdf'), recursive=True))
+    if not paths:
+        sys.exit(f"Nenhum PDF encontrado em {CORPUS_DIR}")
+    corpus = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            corpus.append(f.read())
+    payloads = [corpus[i % len(corpus)] for i in range(args.files)]
+    print(f"{len(payloads)} PDFs ({len(corpus)} distintos), {args.workers} workers\n")
+
+    started_at = time.perf_counter()
+    for data in payloads:
+        legacy_extract(data)
+    report("Serial (implementação anterior)", time.perf_counter() - started_at, len(payloads))
+
+    for mode in ('inline', 'thread', 'process'):
+        extractor = PdfExtractor(
+            mode=mode, max_workers=args.workers,
+            max_pages=args.max_pages or PDF_MAX_PAGES, max_chars=args.max_chars or PDF_MAX_CHARS
+        )
+        # Aquece o pool (criação dos processos) fora da medição
+        extractor.extract_many(payloads[:args.workers])
+
+        started_at = time.perf_counter()
+        results = extractor.extract_many(payloads)
+        elapsed = time.perf_counter() - started_at
+        report(f"PdfExtractor ({extractor.mode})", elapsed, len(payloads),
+               errors=sum(isinstance(result, Exception) for result in results))
+
+if __name__ == '__main__':
+    main()
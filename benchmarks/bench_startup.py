@@ -0,0 +1,115 @@
+"""
+Benchmark de cold start e de pré-processamento NLP.
+
+Mede:
+  1. O tempo de importação de src/app.py em um processo novo (simula o cold start serverless)
+     e o tempo do hook de aquecimento (warm_up).
+  2. A vazão (docs/s) do pré-processamento NLP sobre os PDFs de Test-Email, comparando a
+     implementação antiga (stop words e stemmer recriados a cada chamada) com o TextPreprocessor
+     (recursos carregados uma vez + LRU de radicais), com o cache de radicais frio e quente.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_startup.py --runs 5 --docs 500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+CORPUS_DIR = os.path.join(PROJECT_ROOT, 'Test-Email')
+
+sys.path.insert(0, SRC_DIR)
+
+IMPORT_SNIPPET = """
+import time
+started_at = time.perf_counter()
+import app
+imported_at = time.perf_counter()
+app.warm_up()
+print(imported_at - started_at, time.perf_counter() - imported_at)
+"""
+
+def bench_cold_start(runs):
+    import_times = []
+    warm_up_times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_SNIPPET],
+            cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        import_time, warm_up_time = (float(value) for value in output.split())
+        import_times.append(import_time)
+        warm_up_times.append(warm_up_time)
+
+    print(f"Importação de src/app.py: mediana {statistics.median(import_times) * 1000:.1f} ms "
+          f"(mín {min(import_times) * 1000:.1f} ms, {runs} execuções)")
+    print(f"warm_up():                mediana {statistics.median(warm_up_times) * 1000:.1f} ms")
+
+def load_corpus_texts():
+    import pypdf
+    from local_classifier import iter_labeled_corpus
+
+    texts = []
+    for path, _ in iter_labeled_corpus(CORPUS_DIR):
+        reader = pypdf.PdfReader(path)
+        texts.append("".join(page.extract_text() or "" for page in reader.pages))
+    return texts
+
+def legacy_preprocess(text):
+    """Implementação anterior: recria stop words e stemmer a cada chamada."""
+    import re
+    import nltk
+    from nltk.corpus import stopwords
+    from nltk.stem import RSLPStemmer
+
+    text = re.sub(r'[^a-z0-9\s]', '', text.lower())
+    tokens = nltk.word_tokenize(text, language='portuguese', preserve_line=True)
+    stop_words = set(stopwords.words('portuguese'))
+    filtered_tokens = [word for word in tokens if word not in stop_words and word.strip()]
+    stemmer = RSLPStemmer()
+    return ' '.join(stemmer.stem(word) for word in filtered_tokens)
+
+def measure_throughput(label, func, documents):
+    started_at = time.perf_counter()
+    for document in documents:
+        func(document)
+    elapsed = time.perf_counter() - started_at
+    print(f"{label:<38} {len(documents) / elapsed:>10.1f} docs/s")
+
+def bench_preprocessing(total_docs):
+    from nlp import TextPreprocessor
+
+    texts = load_corpus_texts()
+    documents = [texts[i % len(texts)] for i in range(total_docs)]
+
+    preprocessor = TextPreprocessor()
+    try:
+        preprocessor.warm_up()
+        preprocessor.preprocess(documents[0])
+    except LookupError:
+        print("Dados do NLTK indisponíveis; benchmark de pré-processamento ignorado.")
+        return
+
+    measure_throughput("Implementação anterior", legacy_preprocess, documents)
+
+    cold = TextPreprocessor()
+    cold.warm_up()
+    measure_throughput("TextPreprocessor (cache de radicais frio)", cold.preprocess, documents[:len(texts)])
+    measure_throughput("TextPreprocessor (cache de radicais quente)", cold.preprocess, documents)
+    print(f"Cache de radicais: {cold.stem_cache_info()}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Número de processos para medir o cold start.')
+    parser.add_argument('--docs', type=int, default=300, help='Número de documentos no teste de vazão.')
+    args = parser.parse_args()
+
+    bench_cold_start(args.runs)
+    bench_preprocessing(args.docs)
+
+if __name__ == '__main__':
+    main()
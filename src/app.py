@@ -1,72 +1,239 @@
 import os
 import json
-from flask import Flask, request, jsonify, render_template, Response
-import google.generativeai as genai
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, url_for, g
 from dotenv import load_dotenv
-import pypdf
-import nltk                                # NOVO: Importa NLTK
-from nltk.corpus import stopwords          # NOVO: Para Stop Words
-from nltk.stem import RSLPStemmer          # NOVO: Para Stemming em Português
-import re 
+import sqlite3
+import hashlib
+import datetime
+import threading
+import click
+import time
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Lógica de importação para suportar o ambiente serverless (Vercel)
 try:
-    from database import initialize_db, insert_classification, get_history, get_raw_history_data
+    from database import initialize_db, get_history, get_raw_history_data
     from export import export_history_to_csv 
+    from cache import ClassificationCache, make_cache_key
+    from database import get_training_data, insert_classifications, WriteBehindQueue
+    from database import get_history_page, get_classification_detail, get_dashboard_aggregates, iter_history_rows
+    from export import HEADER_MAPPING, DEFAULT_EXPORT_COLUMNS
+    from pdf_extraction import pdf_extractor, extract_pdf_text, PdfExtractionTimeout
+    from packing import pack_items, build_packed_prompt, parse_packed_response
+    from llm_client import LLMClient, CircuitBreaker, CircuitOpenError, LLMDeadlineExceeded, is_retryable, requests_sent
+    from database import get_job, get_job_results, search_history
+    from jobs import JobQueue
+    from email_cleanup import prepare_email_for_prompt
+    from near_duplicates import minhash_signature, find_near_duplicate
+    from database import iter_rows_without_signature, save_signatures, count_classifications_by_source
+    from local_classifier import LocalClassifier, LOCAL_RESPONSES, evaluate, guess_language, iter_labeled_corpus
+    from nlp import preprocess_text_nlp, text_preprocessor
+    from metrics import timed, submit_in_context, record_llm_usage, generate_latest, CONTENT_TYPE_LATEST
+    from metrics import start_request_timings, finish_request_timings
+    from metrics import HTTP_REQUEST_SECONDS, ITEMS, ITEM_ERRORS, CACHE_LOOKUPS, LLM_REQUESTS
 except ImportError as e:
     # Cria funções de placeholder se os módulos não forem encontrados, garantindo que o Flask inicie.
     print(f"ATENÇÃO: Falha ao importar módulos customizados: {e}")
     def initialize_db(): pass
-    def insert_classification(*args, **kwargs): pass
     def get_history(): return []
     def get_raw_history_data(): return []
-    def export_history_to_csv(data): return Response("Erro de Módulo", mimetype="text/plain", status=500)
+    def export_history_to_csv(data, *args, **kwargs): return Response("Erro de Módulo", mimetype="text/plain", status=500)
+    def make_cache_key(email_content, prompt_version): return None
+    class ClassificationCache:
+        def __init__(self, *args, **kwargs): pass
+        def get(self, key): return None, None
+        def set(self, key, result): pass
+    def get_training_data(max_rows=None, seed=42): return []
+    def insert_classifications(rows): return 0
+    WriteBehindQueue = None
+    def get_history_page(*args, **kwargs): return [], None
+    def get_classification_detail(classification_id): return None
+    def get_dashboard_aggregates(*args, **kwargs): return {}
+    def iter_history_rows(*args, **kwargs): return iter(())
+    HEADER_MAPPING = {}
+    DEFAULT_EXPORT_COLUMNS = []
+    class PdfExtractionTimeout(Exception): pass
+    class _UnavailablePdfExtractor:
+        def extract_many(self, payloads): return [RuntimeError("Extração de PDF indisponível.") for _ in payloads]
+    pdf_extractor = _UnavailablePdfExtractor()
+    def pack_items(entries, *args, **kwargs): return [[entry] for entry in entries]
+    def build_packed_prompt(template, contents): return ""
+    def parse_packed_response(text, count): return {}
+    class CircuitOpenError(Exception): pass
+    class LLMDeadlineExceeded(Exception): pass
+    def CircuitBreaker(*args, **kwargs): return None
+    class LLMClient:
+        def __init__(self, get_model, **kwargs): self.get_model = get_model
+        def generate_content(self, prompt, timeout=None, **kwargs):
+            return self.get_model().generate_content(prompt, request_options={'timeout': timeout})
+        def get_stats(self): return {}
+    def is_retryable(error): return False
+    def requests_sent(error): return 1
+    def get_job(job_id): return None
+    def get_job_results(job_id, since=0, limit=100): return [], since
+    def search_history(*args, **kwargs): return [], None
+    JobQueue = None
+    def prepare_email_for_prompt(text, max_tokens, **kwargs): return text, {'original': 0, 'sent': 0, 'saved': 0}
+    def minhash_signature(tokens): return None
+    def find_near_duplicate(*args, **kwargs): return None, 0.0
+    def iter_rows_without_signature(*args, **kwargs): return iter(())
+    def save_signatures(signatures): pass
+    def count_classifications_by_source(source): return 0
+    LocalClassifier = None
+    text_preprocessor = None
+    def preprocess_text_nlp(text): raise LookupError("Módulo de NLP indisponível.")
+    from contextlib import nullcontext
+    def timed(stage): return nullcontext()
+    def submit_in_context(executor, function, *args): return executor.submit(function, *args)
+    def record_llm_usage(response): pass
+    def generate_latest(): return ""
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+    def start_request_timings(): return None
+    def finish_request_timings(): pass
+    class _NoopMetric:
+        def inc(self, amount=1, **labels): pass
+        def observe(self, value, **labels): pass
+    HTTP_REQUEST_SECONDS = ITEMS = ITEM_ERRORS = CACHE_LOOKUPS = LLM_REQUESTS = _NoopMetric()
 
 
 load_dotenv()
 
-NLTK_DATA_DIR = '/tmp/nltk_data'
-os.makedirs(NLTK_DATA_DIR, exist_ok=True)
-nltk.data.path.append(NLTK_DATA_DIR)
-
-# Tenta fazer o download dos recursos necessários, se não existirem
-def setup_nltk_data():
-    """Garante que os dados do NLTK necessários para Português estejam em /tmp."""
-    try:
-        # Tenta carregar os dados
-        stopwords.words('portuguese')
-        nltk.data.find('tokenizers/punkt')
-        nltk.data.find('corpora/rslp')
-    except (LookupError, FileNotFoundError):
-        print("Baixando dados do NLTK para /tmp...")
-        try:
-            # Baixa os módulos necessários
-            nltk.download('stopwords', download_dir=NLTK_DATA_DIR)
-            nltk.download('rslp', download_dir=NLTK_DATA_DIR)
-            nltk.download('punkt', download_dir=NLTK_DATA_DIR) 
-            print("Download do NLTK concluído.")
-        except Exception as e:
-            print(f"Erro ao baixar dados do NLTK: {e}")
-
-setup_nltk_data()
-
 # Ajusta o root_path para encontrar as pastas 'templates' e 'static' no diretório pai,
 # após mover 'app.py' para a pasta 'src/'.
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 app = Flask(__name__, root_path=project_root)
 
-# Configuração da API do Google Generative AI
-try:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        # A chave deve ser configurada via Environment Variables (Vercel) ou arquivo .env (local)
-        raise ValueError("A variável de ambiente GEMINI_API_KEY não foi definida.")
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
-except Exception as e:
-    print(f"Erro ao configurar a API do Google: {e}")
-    model = None
+# Configuração da API do Google Generative AI: feita na primeira utilização (ver get_model),
+# para não pesar no cold start do ambiente serverless
+genai = None
+model = None
+_model_configured = False
+_model_lock = threading.Lock()
+
+def get_model():
+    """Importa e configura o cliente do Gemini na primeira chamada; retorna None se a configuração falhar."""
+    global genai, model, _model_configured
+    if model is not None or _model_configured:
+        return model
+
+    with _model_lock:
+        if not _model_configured:
+            try:
+                import google.generativeai as genai_module
+                genai = genai_module
+
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    # A chave deve ser configurada via Environment Variables (Vercel) ou arquivo .env (local)
+                    raise ValueError("A variável de ambiente GEMINI_API_KEY não foi definida.")
+                genai.configure(api_key=api_key)
+                model = genai.GenerativeModel('gemini-2.5-flash-lite')
+            except Exception as e:
+                print(f"Erro ao configurar a API do Google: {e}")
+                model = None
+            _model_configured = True
+    return model
+
+# Configuração do processamento em lote: máximo de chamadas simultâneas à IA e tempo limite por item (segundos)
+CLASSIFY_MAX_WORKERS = int(os.getenv("CLASSIFY_MAX_WORKERS", "8"))
+CLASSIFY_ITEM_TIMEOUT = float(os.getenv("CLASSIFY_ITEM_TIMEOUT", "60"))
+
+# Cliente da IA: limites por minuto (0 = sem limite; valem por processo), novas tentativas com backoff
+# em erros transitórios (429/5xx/timeout) e disjuntor que falha na hora quando o serviço está degradado
+llm_client = LLMClient(
+    get_model,
+    requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")),
+    tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+    backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+    backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "8")),
+    call_timeout=CLASSIFY_ITEM_TIMEOUT,
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+    ),
+)
+# Com o circuito aberto, responde com o classificador local (qualquer confiança) em vez de falhar
+LLM_FALLBACK_TO_LOCAL = os.getenv("LLM_FALLBACK_TO_LOCAL", "1") not in ("0", "false", "False")
+
+# Cache de classificações: LRU em memória na frente da tabela do SQLite, com TTL e limite de tamanho
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") not in ("0", "false", "False")
+classification_cache = ClassificationCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+    db_max_entries=int(os.getenv("CACHE_DB_MAX_ENTRIES", "50000")),
+)
+
+# Gravação do histórico: opcionalmente em segundo plano, agrupando inserções de requisições concorrentes
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "0") in ("1", "true", "True")
+write_behind_queue = WriteBehindQueue(
+    batch_size=int(os.getenv("DB_WRITE_BATCH_SIZE", "100")),
+    max_delay=float(os.getenv("DB_WRITE_MAX_DELAY", "0.5")),
+) if DB_WRITE_BEHIND and WriteBehindQueue else None
+
+# Classificador local (fast path): responde sem chamar a IA quando a confiança atinge o limiar
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "1") not in ("0", "false", "False")
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.9"))
+# Máximo de registros do histórico usados no treino (amostra aleatória quando o histórico é maior)
+LOCAL_CLASSIFIER_MAX_TRAINING_ROWS = int(os.getenv("LOCAL_CLASSIFIER_MAX_TRAINING_ROWS", "20000"))
+LOCAL_CLASSIFIER_PATH = os.getenv(
+    "LOCAL_CLASSIFIER_PATH",
+    '/tmp/local_classifier.json' if os.getenv('VERCEL') else 'local_classifier.json'
+)
+_local_classifier = {'model': None, 'mtime': None}
+_local_classifier_lock = threading.Lock()
+# Protege os contadores de estatísticas do processo (independente do carregamento do modelo local)
+_stats_lock = threading.Lock()
+# Contadores do processo para medir quanto do tráfego o classificador local absorve
+local_classifier_stats = {'local': 0, 'llm': 0}
+
+# Quase-duplicatas: reaproveita o resultado da IA para um e-mail com similaridade de Jaccard de pelo menos
+# NEAR_DUP_THRESHOLD com outro classificado nos últimos NEAR_DUP_MAX_AGE_DAYS dias (a estimativa por MinHash
+# é comparada com uma margem abaixo do limiar, ver near_duplicates.match_threshold)
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "1") not in ("0", "false", "False")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+NEAR_DUP_MAX_AGE_DAYS = float(os.getenv("NEAR_DUP_MAX_AGE_DAYS", "30"))
+# Contadores do processo: consultas ao índice e chamadas à IA evitadas
+near_duplicate_stats = {'lookups': 0, 'hits': 0}
+
+# Preparação da entrada: remove histórico citado, assinaturas e avisos legais e limita o e-mail
+# a INPUT_MAX_TOKENS tokens estimados (início + final, na proporção INPUT_HEAD_RATIO) antes do prompt
+INPUT_CLEANUP_ENABLED = os.getenv("INPUT_CLEANUP_ENABLED", "1") not in ("0", "false", "False")
+INPUT_MAX_TOKENS = int(os.getenv("INPUT_MAX_TOKENS", "2000"))
+INPUT_HEAD_RATIO = float(os.getenv("INPUT_HEAD_RATIO", "0.7"))
+
+# Agrupamento de e-mails curtos: até CLASSIFY_PACK_MAX_ITEMS e-mails (somando CLASSIFY_PACK_MAX_TOKENS
+# tokens estimados) em um único prompt; e-mails acima de CLASSIFY_PACK_ITEM_MAX_TOKENS seguem sozinhos
+CLASSIFY_PACK_ENABLED = os.getenv("CLASSIFY_PACK_ENABLED", "1") not in ("0", "false", "False")
+CLASSIFY_PACK_MAX_ITEMS = int(os.getenv("CLASSIFY_PACK_MAX_ITEMS", "8"))
+CLASSIFY_PACK_MAX_TOKENS = int(os.getenv("CLASSIFY_PACK_MAX_TOKENS", "4000"))
+CLASSIFY_PACK_ITEM_MAX_TOKENS = int(os.getenv("CLASSIFY_PACK_ITEM_MAX_TOKENS", "600"))
+# Contadores do processo: chamadas agrupadas, e-mails resolvidos nelas e e-mails reclassificados individualmente
+packing_stats = {'packed_requests': 0, 'packed_items': 0, 'fallback_items': 0}
+
+# Jobs de classificação em lote (processados em segundo plano, com estado no SQLite)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_CLAIM_SIZE = int(os.getenv("JOB_CLAIM_SIZE", "32"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RESULTS_MAX_LIMIT = 500
+# Limites validados em POST /jobs: itens por job e tamanho de cada PDF (bytes), guardado bruto até o worker extraí-lo
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", "1000"))
+JOB_MAX_PDF_BYTES = int(os.getenv("JOB_MAX_PDF_BYTES", str(10 * 1024 * 1024)))
+# Duração máxima (segundos) de uma conexão em /jobs/<id>/stream e intervalo entre as linhas de heartbeat
+JOB_STREAM_MAX_SECONDS = float(os.getenv("JOB_STREAM_MAX_SECONDS", "300"))
+JOB_STREAM_HEARTBEAT_SECONDS = float(os.getenv("JOB_STREAM_HEARTBEAT_SECONDS", "15"))
+JOB_STREAM_POLL_INTERVAL = 0.5
+
+# Tamanho máximo de página aceito em /history/page
+HISTORY_PAGE_MAX_LIMIT = 100
+
+# Cabeçalho Server-Timing com o tempo de cada etapa da requisição (útil no DevTools; expõe detalhes internos)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "0") in ("1", "true", "True")
 
 # Template do Prompt para o Modelo de IA
 PROMPT_TEMPLATE = """
@@ -100,44 +267,628 @@ O JSON de saída deve ter a seguinte estrutura:
 Retorne apenas o JSON, sem nenhum texto, markdown ou explicação adicional.
 """
 
-def preprocess_text_nlp(text):
+# Template do prompt agrupado: vários e-mails curtos, um objeto por e-mail identificado pelo "id"
+PACKED_PROMPT_TEMPLATE = """
+Você deve analisar cada um dos {count} e-mails fornecidos abaixo, de forma independente, e retornar um array JSON
+com exatamente um objeto por e-mail, seguindo estritamente a estrutura definida abaixo.
+
+Para cada e-mail, siga estas instruções:
+1. Classifique o e-mail como "Produtivo" ou "Improdutivo" com base nas definições:
+   - "Produtivo": E-mails que requerem uma ação ou resposta específica (ex.: solicitações, dúvidas, atualizações de casos).
+   - "Improdutivo": E-mails que não necessitam de ação (ex.: felicitações, agradecimentos, spam).
+2. Preste atenção ao idioma de cada e-mail e responda na mesma língua, especialmente na parte de "suggested_response".
+3. Identifique o tópico principal do e-mail em poucas palavras.
+4. Avalie o tom do e-mail como "Positivo", "Negativo" ou "Neutro".
+5. Evite fazer suposições não justificadas; baseie-se apenas no conteúdo de cada e-mail, sem misturar e-mails.
+6. Seja preciso no "confidence_score" (0.0 a 1.0) refletindo o quão certo você está da classificação.
+
+E-mails para análise:
+{emails}
+
+Cada objeto do array deve ter a seguinte estrutura:
+- "id": O número do e-mail, exatamente como indicado em "E-mail id=...".
+- "classification": A categoria ("Produtivo" ou "Improdutivo").
+- "confidence_score": Um número entre 0.0 e 1.0 indicando a confiança na classificação.
+- "key_topic": Uma palavra ou frase curta resumindo o tópico principal do e-mail (ex.: "Solicitação de Pagamento", "Felicitação").
+- "sentiment": O tom predominante do e-mail ("Positivo", "Negativo" ou "Neutro").
+- "suggested_response":
+    - Se "Produtivo", sugira uma resposta curta e profissional abordando a solicitação ou dúvida.
+    - Se "Improdutivo", sugira uma resposta curta e cordial de agradecimento (ex.: "Obrigado pela informação!").
+
+Retorne apenas o array JSON, sem nenhum texto, markdown ou explicação adicional.
+"""
+
+# Versão do prompt: qualquer alteração nos templates invalida as entradas antigas do cache
+PROMPT_VERSION = hashlib.sha256((PROMPT_TEMPLATE + PACKED_PROMPT_TEMPLATE).encode('utf-8')).hexdigest()[:12]
+
+def get_local_classifier():
+    """Carrega o modelo local treinado (recarregando se o arquivo mudou); retorna None se não houver modelo."""
+    if not LOCAL_CLASSIFIER_ENABLED or LocalClassifier is None:
+        return None
+    try:
+        mtime = os.path.getmtime(LOCAL_CLASSIFIER_PATH)
+    except OSError:
+        return None
+
+    with _local_classifier_lock:
+        if _local_classifier['mtime'] != mtime:
+            try:
+                _local_classifier['model'] = LocalClassifier.load(LOCAL_CLASSIFIER_PATH)
+                _local_classifier['mtime'] = mtime
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Erro ao carregar o classificador local: {e}")
+                return None
+        return _local_classifier['model']
+
+def preprocess_tokens(email_content):
+    """Tokens pré-processados (NLTK) do e-mail, ou None se os dados do NLTK estiverem indisponíveis."""
+    try:
+        return preprocess_text_nlp(email_content).split()
+    except LookupError as e:
+        # Dados do NLTK indisponíveis: segue para a IA
+        print(f"Pré-processamento NLP indisponível: {e}")
+        return None
+
+def classify_locally(email_content, threshold=None, tokens=None):
+    """Tenta classificar o e-mail com o modelo local; retorna None se a confiança ficar abaixo do limiar."""
+    local_model = get_local_classifier()
+    if local_model is None:
+        return None
+
+    if tokens is None:
+        tokens = preprocess_tokens(email_content)
+        if tokens is None:
+            return None
+
+    classification, confidence = local_model.predict(tokens)
+    if confidence < (LOCAL_CLASSIFIER_THRESHOLD if threshold is None else threshold):
+        return None
+
+    return {
+        'classification': classification,
+        'confidence_score': round(confidence, 4),
+        'key_topic': 'N/A',
+        'sentiment': 'N/A',
+        'suggested_response': LOCAL_RESPONSES[guess_language(email_content)][classification]
+    }
+
+def count_classified_by(source):
+    with _stats_lock:
+        local_classifier_stats[source] += 1
+
+def count_near_duplicates(key):
+    with _stats_lock:
+        near_duplicate_stats[key] += 1
+
+def classify_near_duplicate(item, signature, record):
+    """Reaproveita o resultado da IA de um e-mail quase idêntico; retorna None se não houver nenhum no limiar."""
+    try:
+        match, similarity = find_near_duplicate(signature, NEAR_DUP_THRESHOLD, NEAR_DUP_MAX_AGE_DAYS)
+    except Exception as e:
+        print(f"Erro ao consultar o índice de quase-duplicatas: {e}")
+        return None
+
+    count_near_duplicates('lookups')
+    if match is None:
+        return None
+    count_near_duplicates('hits')
+
+    # A confiança herdada é descontada pela similaridade entre os dois e-mails
+    result = {
+        'classification': match['classification'],
+        'confidence_score': round(match['confidence_score'] * similarity, 4),
+        'key_topic': match['key_topic'] or 'N/A',
+        'sentiment': match['sentiment'] or 'N/A',
+        'suggested_response': match['suggested_response']
+    }
+    record((result['classification'], result['confidence_score'], result['key_topic'], result['sentiment'],
+            result['suggested_response'], history_content(item), 'near_duplicate', signature))
+    result['source_filename'] = item['filename']
+    result['cache'] = {'hit': False}
+    result['classified_by'] = 'near_duplicate'
+    result['near_duplicate'] = {'of': match['id'], 'similarity': round(similarity, 3)}
+    return result
+
+def history_content(item):
+    """Texto gravado no histórico: o e-mail original, não a versão limpa/cortada enviada ao modelo."""
+    return item.get('original_content', item['content'])
+
+def record_classification(row):
+    """Salva uma linha no histórico: pela fila em segundo plano, se habilitada, ou diretamente."""
+    if write_behind_queue is not None:
+        write_behind_queue.put(row)
+    else:
+        with timed('db_insert'):
+            insert_classifications([row])
+
+class DiscardableRecord:
     """
-    Executa Limpeza, Tokenização, Remoção de Stop Words e Stemming (RSLP) em Português.
+    `record` de uma unidade de trabalho do pool. Quando ela estoura o prazo, o cliente já recebeu o erro de
+    tempo limite; a thread continua rodando, mas a partir daí não grava no histórico nem no cache.
     """
-    # 1. Limpeza básica (converter para minúsculas e remover pontuação)
-    text = text.lower()
-    text = re.sub(r'[^a-z0-9\s]', '', text) 
 
-    # 2. Tokenização
-    tokens = nltk.word_tokenize(text, language='portuguese')
+    def __init__(self, record):
+        self.record = record
+        self.discarded = False
+        self._lock = threading.Lock()
 
-    # 3. Remoção de Stop Words
-    stop_words = set(stopwords.words('portuguese'))
-    # Filtra tokens que não estão na lista de stop words e que não são apenas espaços em branco
-    filtered_tokens = [word for word in tokens if word not in stop_words and word.strip()]
+    def __call__(self, row):
+        with self._lock:
+            if not self.discarded:
+                self.record(row)
 
-    # 4. Stemming (Redução ao radical - RSLP para Português)
-    stemmer = RSLPStemmer()
-    stemmed_tokens = [stemmer.stem(word) for word in filtered_tokens]
-    
-    # Retorna o texto pré-processado como uma string, separado por espaço
-    return ' '.join(stemmed_tokens)
+    def discard(self):
+        with self._lock:
+            self.discarded = True
 
-@app.route('/')
-def index():
-    """Renderiza a página inicial e garante a inicialização do DB (necessário no Serverless)."""
-    initialize_db()
-    return render_template('index.html')
+def classify_without_llm(item, record):
+    """
+    Tenta resolver o item pelo cache, por uma quase-duplicata já classificada ou pelo classificador local.
+    Retorna (resultado ou None, chave do cache), para que a chamada à IA reaproveite a chave; a assinatura
+    MinHash calculada fica em item['minhash'] para ser gravada com o resultado.
+    """
+    email_content = item['content']
+    filename = item['filename']
 
-@app.route('/classify', methods=['POST'])
-def classify_email():
-    """Recebe o e-mail (texto) ou a lista de arquivos, classifica com a IA, salva e retorna os resultados."""
-    initialize_db()
-    
-    if not model:
-        return jsonify({'error': 'O modelo de IA não foi inicializado. Verifique a chave da API.'}), 503
+    # Consulta o cache antes de chamar a IA
+    cache_key = make_cache_key(email_content, PROMPT_VERSION) if CACHE_ENABLED else None
+    if cache_key:
+        with timed('cache_lookup'):
+            cached_result, cache_layer = classification_cache.get(cache_key)
+        CACHE_LOOKUPS.inc(result='hit' if cached_result is not None else 'miss', layer=cache_layer or 'none')
+        if cached_result is not None:
+            record((cached_result['classification'], cached_result['confidence_score'], cached_result['key_topic'],
+                    cached_result['sentiment'], cached_result['suggested_response'], history_content(item), 'cache'))
+            cached_result['source_filename'] = filename
+            cached_result['cache'] = {'hit': True, 'layer': cache_layer}
+            cached_result['classified_by'] = 'cache'
+            return cached_result, cache_key
+
+    # Os tokens pré-processados são compartilhados pela busca de quase-duplicatas e pelo classificador local
+    tokens = None
+    if NEAR_DUP_ENABLED or get_local_classifier() is not None:
+        tokens = preprocess_tokens(email_content)
+
+    if NEAR_DUP_ENABLED and tokens:
+        item['minhash'] = minhash_signature(tokens)
+        if item['minhash'] is not None:
+            near_duplicate_result = classify_near_duplicate(item, item['minhash'], record)
+            if near_duplicate_result is not None:
+                return near_duplicate_result, cache_key
+
+    # Casos óbvios são resolvidos pelo classificador local, sem chamar a IA
+    local_result = classify_locally(email_content, tokens=tokens) if tokens is not None else None
+    if local_result is not None:
+        count_classified_by('local')
+        record((local_result['classification'], local_result['confidence_score'], local_result['key_topic'],
+                local_result['sentiment'], local_result['suggested_response'], history_content(item), 'local',
+                item.get('minhash')))
+        local_result['source_filename'] = filename
+        local_result['cache'] = {'hit': False}
+        local_result['classified_by'] = 'local'
+        return local_result, cache_key
+
+    return None, cache_key
+
+def finish_llm_result(item, result_json, cache_key, record):
+    """Normaliza os campos devolvidos pela IA, salva no histórico e no cache e completa o resultado."""
+    # Extrai e valida dados
+    classification = result_json.get("classification", "Desconhecido")
+    confidence_score = result_json.get("confidence_score", 0.0)
+    suggested_response = result_json.get("suggested_response", "Nenhuma resposta")
+
+    # CORREÇÃO: Extrai os novos campos do JSON da IA (caindo para N/A se faltar)
+    key_topic = result_json.get("key_topic", "N/A")
+    sentiment = result_json.get("sentiment", "N/A")
+
+    # Garante que confidence_score seja um float
+    if not isinstance(confidence_score, (int, float)):
+        try:
+            confidence_score = float(confidence_score)
+        except ValueError:
+            confidence_score = 0.0
 
+    # Salva no histórico (com a assinatura MinHash, que coloca o resultado no índice de quase-duplicatas)
+    record((classification, confidence_score, key_topic, sentiment, suggested_response, history_content(item), 'llm',
+            item.get('minhash')))
+
+    # Um resultado que chegou depois do prazo não foi gravado no histórico, então também não entra no cache
+    if cache_key and not getattr(record, 'discarded', False):
+        classification_cache.set(cache_key, {
+            'classification': classification,
+            'confidence_score': confidence_score,
+            'key_topic': key_topic,
+            'sentiment': sentiment,
+            'suggested_response': suggested_response
+        })
+
+    # Adiciona o nome da fonte e os metadados do cache ao resultado
+    result_json['source_filename'] = item['filename']
+    result_json['cache'] = {'hit': False}
+    result_json['classified_by'] = 'llm'
+    return result_json
+
+def classify_degraded(item, record):
+    """Resposta de contingência com o classificador local quando a IA está indisponível (circuito aberto)."""
+    if not LLM_FALLBACK_TO_LOCAL:
+        return None
+    local_result = classify_locally(item['content'], threshold=0.0)
+    if local_result is None:
+        return None
+
+    count_classified_by('local')
+    record((local_result['classification'], local_result['confidence_score'], local_result['key_topic'],
+            local_result['sentiment'], local_result['suggested_response'], history_content(item), 'local'))
+    local_result['source_filename'] = item['filename']
+    local_result['cache'] = {'hit': False}
+    local_result['classified_by'] = 'local'
+    local_result['degraded'] = True
+    return local_result
+
+def classify_with_llm(item, cache_key, record):
+    """Classifica um único item com o modelo Gemini (um prompt por e-mail)."""
+    with timed('prompt_build'):
+        prompt = PROMPT_TEMPLATE.format(email_content=item['content'])
+    try:
+        # O prazo da chamada (incluindo esperas e novas tentativas) respeita o limite por item
+        with timed('llm_call'):
+            response = llm_client.generate_content(prompt, timeout=CLASSIFY_ITEM_TIMEOUT)
+    except CircuitOpenError as e:
+        LLM_REQUESTS.inc(kind='single', outcome='short_circuited' if not requests_sent(e) else 'error')
+        degraded_result = classify_degraded(item, record)
+        if degraded_result is None:
+            raise
+        return degraded_result
+    except Exception as e:
+        # Prazo esgotado ainda na espera do limite de taxa: nenhuma chamada chegou ao modelo
+        LLM_REQUESTS.inc(kind='single', outcome='error' if requests_sent(e) else 'not_sent')
+        raise
+    LLM_REQUESTS.inc(kind='single', outcome='success')
+    record_llm_usage(response)
+    count_classified_by('llm')
+
+    cleaned_response = response.text.strip().replace('```json', '').replace('```', '')
+
+    try:
+        with timed('json_parse'):
+            result_json = json.loads(cleaned_response)
+    except json.JSONDecodeError:
+        print(f"Erro ao decodificar JSON. Resposta da IA: {cleaned_response}")
+        return {'error': f"A resposta da IA não estava em um formato JSON válido para: {item['filename']}"}
+
+    return finish_llm_result(item, result_json, cache_key, record)
+
+def classification_error(e, filename):
+    """Converte uma exceção da classificação no item de erro devolvido ao cliente."""
+    if isinstance(e, CircuitOpenError):
+        print(f"Chamada à IA não realizada: {e}")
+        return {'error': f"O serviço de IA está temporariamente indisponível. Tente novamente em instantes: {filename}"}
+    if isinstance(e, LLMDeadlineExceeded):
+        print(f"Prazo da chamada à IA esgotado: {e}")
+        return {'error': f"Tempo limite excedido ao analisar: {filename}"}
+    if is_retryable(e):
+        print(f"Erro transitório da IA após as novas tentativas: {e}")
+        return {'error': f"O serviço de IA está sobrecarregado no momento. Tente novamente em instantes: {filename}"}
+    if genai is not None and isinstance(e, genai.types.generation_types.StopCandidateException):
+        print(f"Geração interrompida pela IA: {e}")
+        return {'error': f"A IA interrompeu a geração por razões de segurança ou conteúdo: {filename}"}
+    print(f"Ocorreu um erro inesperado: {e}")
+    return {'error': f"Ocorreu um erro inesperado no servidor para: {filename}"}
+
+def classify_item(item, record=None):
+    """
+    Classifica um único item (texto ou arquivo) com o modelo Gemini, salva no histórico e retorna o resultado.
+    `record` recebe a linha a gravar (padrão: record_classification); permite agrupar as inserções de um lote.
+    """
+    record = record or record_classification
+
+    try:
+        result, cache_key = classify_without_llm(item, record)
+        if result is not None:
+            return result
+        return classify_with_llm(item, cache_key, record)
+    except Exception as e:
+        return classification_error(e, item['filename'])
+
+def count_packing(key, amount=1):
+    with _stats_lock:
+        packing_stats[key] += amount
+
+def classify_packed_items(items, record=None):
+    """
+    Classifica vários e-mails curtos com uma única chamada à IA (PACKED_PROMPT_TEMPLATE) e retorna
+    os resultados na mesma ordem. Cache e classificador local são consultados antes, item a item.
+    E-mails sem uma entrada válida na resposta agrupada ficam com None no resultado (e a chave do cache
+    em item['cache_key']) para que o chamador os reclassifique individualmente, em paralelo.
+    """
+    record = record or record_classification
+    results = [None] * len(items)
+    pending = []  # (posição, item, chave do cache)
+
+    for position, item in enumerate(items):
+        try:
+            result, cache_key = classify_without_llm(item, record)
+        except Exception as e:
+            results[position] = classification_error(e, item['filename'])
+            continue
+        if result is not None:
+            results[position] = result
+        else:
+            pending.append((position, item, cache_key))
+
+    if len(pending) > 1:
+        response = None
+        sent = True
+        try:
+            with timed('prompt_build'):
+                prompt = build_packed_prompt(PACKED_PROMPT_TEMPLATE, [item['content'] for _, item, _ in pending])
+            # A resposta agrupada é maior: reserva tokens de saída proporcionais ao número de e-mails
+            with timed('llm_call'):
+                response = llm_client.generate_content(
+                    prompt, timeout=CLASSIFY_ITEM_TIMEOUT, expected_output_tokens=200 * len(pending)
+                )
+            record_llm_usage(response)
+            with timed('json_parse'):
+                parsed = parse_packed_response(response.text, len(pending))
+        except Exception as e:
+            print(f"Falha na chamada agrupada ({len(pending)} e-mails); classificando individualmente: {e}")
+            parsed = {}
+            sent = response is not None or requests_sent(e) > 0
+            if not sent:
+                # Circuito aberto ou prazo esgotado antes do envio: não conta como chamada agrupada nem como erro
+                LLM_REQUESTS.inc(kind='packed', outcome='short_circuited' if isinstance(e, CircuitOpenError) else 'not_sent')
+        if sent:
+            LLM_REQUESTS.inc(kind='packed', outcome='success' if response is not None else 'error')
+            count_packing('packed_requests')
+
+        fallback = 0
+        for number, (position, item, cache_key) in enumerate(pending, start=1):
+            result_json = parsed.get(number)
+            if result_json is None:
+                item['cache_key'] = cache_key
+                fallback += 1
+                continue
+            count_classified_by('llm')
+            count_packing('packed_items')
+            try:
+                results[position] = finish_llm_result(item, result_json, cache_key, record)
+                results[position]['packed'] = True
+            except Exception as e:
+                results[position] = classification_error(e, item['filename'])
+
+        if fallback:
+            print(f"Resposta agrupada sem entrada válida para {fallback} de {len(pending)} e-mails; "
+                  f"classificando individualmente.")
+            count_packing('fallback_items', fallback)
+        return results
+
+    for position, item, cache_key in pending:
+        try:
+            results[position] = classify_with_llm(item, cache_key, record)
+        except Exception as e:
+            results[position] = classification_error(e, item['filename'])
+
+    return results
+
+def classify_fallback_item(item, record=None):
+    """Reclassifica individualmente um e-mail que ficou sem resposta válida na chamada agrupada."""
+    record = record or record_classification
+    try:
+        return [classify_with_llm(item, item.get('cache_key'), record)]
+    except Exception as e:
+        return [classification_error(e, item['filename'])]
+
+def prepare_items(items):
+    """
+    Aplica a limpeza e o orçamento de tokens ao conteúdo de cada item. O texto preparado é o que vai ao
+    prompt, ao cache e ao classificador local; o original é mantido em 'original_content' para o histórico.
+    """
+    prepared_items = []
+    for item in items:
+        if 'error' in item:
+            prepared_items.append(item)
+            continue
+        with timed('input_cleanup'):
+            content, input_tokens = prepare_email_for_prompt(
+                item['content'], INPUT_MAX_TOKENS, head_ratio=INPUT_HEAD_RATIO, cleanup=INPUT_CLEANUP_ENABLED
+            )
+        prepared_items.append({**item, 'content': content, 'original_content': item['content'], 'input_tokens': input_tokens})
+    return prepared_items
+
+def sum_input_tokens(results):
+    """Soma as contagens de tokens (original, enviado, economizado) dos resultados de uma requisição."""
+    totals = {'original': 0, 'sent': 0, 'saved': 0}
+    for result in results:
+        for key, value in result.get('input_tokens', {}).items():
+            totals[key] += value
+    return totals
+
+def group_items_for_classification(items):
+    """Divide os itens (com seus índices) nas unidades de trabalho do pool: lotes agrupados ou itens isolados."""
+    entries = list(enumerate(items))
+    if not CLASSIFY_PACK_ENABLED or CLASSIFY_PACK_MAX_ITEMS < 2:
+        return [[entry] for entry in entries]
+    return pack_items(entries, CLASSIFY_PACK_MAX_ITEMS, CLASSIFY_PACK_MAX_TOKENS, CLASSIFY_PACK_ITEM_MAX_TOKENS)
+
+def iter_classified_items(items, max_workers=None, item_timeout=None, record=None):
+    """
+    Classifica os itens em um pool de threads com no máximo `max_workers` chamadas em andamento.
+    Gera tuplas (índice, resultado) à medida que cada item termina; itens que excedem
+    `item_timeout` segundos geram um erro de tempo limite sem bloquear o restante do lote.
+    Com o agrupamento ativo, e-mails curtos consecutivos dividem uma mesma chamada à IA; os que
+    ficam sem resposta válida voltam à janela como tarefas individuais, cada uma com o seu prazo.
+    `record` recebe as linhas do histórico (padrão: record_classification); as de um item que estourou
+    o prazo são descartadas, assim como a escrita no cache.
+    """
+    max_workers = max(1, max_workers or CLASSIFY_MAX_WORKERS)
+    item_timeout = item_timeout or CLASSIFY_ITEM_TIMEOUT
+    record = record or record_classification
+
+    pending = iter(group_items_for_classification(prepare_items(items)))
+    fallback = deque()  # (índice, item) a reclassificar individualmente após uma chamada agrupada
+    in_flight = {}  # future -> (lista de (índice, item), prazo final, DiscardableRecord)
+    exhausted = False
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    try:
+        while True:
+            # Preenche a janela de execução até o limite de chamadas simultâneas
+            while len(in_flight) < max_workers and (fallback or not exhausted):
+                if fallback:
+                    # As reclassificações individuais têm prioridade sobre os próximos grupos
+                    entry = fallback.popleft()
+                    unit_record = DiscardableRecord(record)
+                    future = submit_in_context(executor, classify_fallback_item, entry[1], unit_record)
+                    in_flight[future] = ([entry], time.monotonic() + item_timeout, unit_record)
+                    continue
+                try:
+                    group = next(pending)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if len(group) == 1 and 'error' in group[0][1]:
+                    # Erros de extração não passam pelo modelo
+                    ITEM_ERRORS.inc()
+                    yield group[0]
+                    continue
+                # As etapas medidas nas threads do pool entram no Server-Timing da requisição atual
+                unit_record = DiscardableRecord(record)
+                future = submit_in_context(executor, classify_packed_items, [item for _, item in group], unit_record)
+                in_flight[future] = (group, time.monotonic() + item_timeout, unit_record)
+
+            if not in_flight:
+                break
+
+            next_deadline = min(deadline for _, deadline, _ in in_flight.values())
+            done, _ = wait(in_flight, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                group, _, _ = in_flight.pop(future)
+                for (index, item), result in zip(group, future.result()):
+                    if result is None:
+                        fallback.append((index, item))
+                        continue
+                    if 'error' not in result:
+                        # Tokens do e-mail original x enviados ao modelo após a limpeza e o orçamento
+                        result['input_tokens'] = item['input_tokens']
+                        ITEMS.inc(classified_by=result.get('classified_by', 'llm'))
+                    else:
+                        ITEM_ERRORS.inc()
+                    yield index, result
+
+            # Descarta os itens que estouraram o prazo (a thread termina sozinha pelo timeout da requisição,
+            # sem gravar o resultado tardio no histórico ou no cache)
+            now = time.monotonic()
+            for future, (group, deadline, unit_record) in list(in_flight.items()):
+                if deadline <= now:
+                    del in_flight[future]
+                    unit_record.discard()
+                    future.cancel()
+                    for index, item in group:
+                        print(f"Tempo limite excedido ao classificar: {item['filename']}")
+                        ITEM_ERRORS.inc()
+                        yield index, {'error': f"Tempo limite excedido ao analisar: {item['filename']}"}
+    finally:
+        # Não espera threads presas; cancela o que ainda não começou
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def save_history_rows(rows):
+    """Grava de uma vez (uma transação) as linhas acumuladas na deque `rows`, esvaziando-a."""
+    batch = []
+    while rows:
+        batch.append(rows.popleft())
+    if not batch:
+        return
+
+    try:
+        if write_behind_queue is not None:
+            for row in batch:
+                write_behind_queue.put(row)
+        else:
+            with timed('db_insert'):
+                insert_classifications(batch)
+    except Exception as e:
+        print(f"Erro ao salvar o histórico do lote: {e}")
+
+def classify_items_in_order(items):
+    """Classifica os itens em paralelo e retorna a lista de resultados na mesma ordem de upload."""
+    results = [None] * len(items)
+    rows = deque()
+
+    # As linhas do histórico são acumuladas pelas threads e gravadas em uma transação a cada unidade concluída
+    for index, result in iter_classified_items(items, record=rows.append):
+        results[index] = result
+        save_history_rows(rows)
+
+    save_history_rows(rows)
+    return results
+
+def extract_pdf_items(items):
+    """
+    Extrai no pool (com limite de páginas, caracteres e tempo por arquivo) o texto dos itens {'pdf_data', 'filename'}:
+    cada um passa a ter 'content' ou, se a extração falhar, 'error'. Os demais itens não são alterados.
+    """
+    pdf_items = [item for item in items if 'pdf_data' in item]
+    if not pdf_items:
+        return items
+
+    with timed('pdf_extraction'):
+        extractions = pdf_extractor.extract_many([item.pop('pdf_data') for item in pdf_items])
+    for item, extraction in zip(pdf_items, extractions):
+        if isinstance(extraction, PdfExtractionTimeout):
+            print(f"Erro ao processar PDF: {extraction}")
+            item['error'] = f"Tempo limite excedido ao processar PDF: {item['filename']}"
+        elif isinstance(extraction, Exception):
+            print(f"Erro ao processar PDF: {extraction}")
+            item['error'] = f"Falha ao processar PDF: {item['filename']}"
+        else:
+            if extraction['truncated']:
+                print(f"PDF truncado para classificação: {item['filename']} "
+                      f"({extraction['pages_read']}/{extraction['total_pages']} páginas)")
+            item['content'] = extraction['text']
+    return items
+
+def classify_job_items(items):
+    """Pipeline dos workers de jobs: extrai os PDFs do lote reservado e classifica os itens, gerando (índice, resultado)."""
+    for item in extract_pdf_items(items):
+        if 'error' not in item and not item['content'].strip():
+            # O item já faz parte do job, então precisa de um resultado (em /classify ele seria apenas ignorado)
+            item['error'] = f"Nenhum texto encontrado no PDF: {item['filename']}"
+    return iter_classified_items(items)
+
+# Fila de jobs: os workers extraem os PDFs e usam o mesmo pipeline do processamento em lote (gravando o histórico item a item)
+job_queue = JobQueue(
+    classify_job_items,
+    num_workers=JOB_WORKERS,
+    claim_size=JOB_CLAIM_SIZE,
+    poll_interval=JOB_POLL_INTERVAL,
+    lease_seconds=JOB_LEASE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+) if JobQueue else None
+
+def collect_items_from_request(extract_pdfs=True):
+    """
+    Extrai os itens a analisar (texto colado, arquivos .txt/.pdf ou JSON) da requisição atual.
+    Com `extract_pdfs=False` os PDFs são devolvidos sem extrair ({'pdf_data', 'filename'}).
+    Levanta ValueError se o corpo JSON não tiver o formato esperado.
+    """
     files_to_process = []
+
+    # 0. Corpo JSON (clientes de API): {"emails": ["texto", ...]} ou {"emails": [{"content": ..., "filename": ...}]}
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if payload is None:
+            raise ValueError('Corpo JSON inválido.')
+        if not isinstance(payload, dict) or not isinstance(payload.get('emails'), list):
+            raise ValueError('O corpo JSON deve ser um objeto com a lista "emails".')
+        for position, email in enumerate(payload['emails'], start=1):
+            if isinstance(email, dict):
+                content, filename = email.get('content'), email.get('filename') or f'E-mail {position}'
+            else:
+                content, filename = email, f'E-mail {position}'
+            if isinstance(content, str) and content.strip():
+                files_to_process.append({'content': content, 'filename': str(filename)})
+        return files_to_process
     
     # 1. Extrai o conteúdo do formulário de texto
     if 'email_text' in request.form and request.form['email_text']:
@@ -158,93 +909,295 @@ def classify_email():
         
         if filename.endswith('.txt'):
             try:
-                file_content = file.read().decode('utf-8')
+                with timed('file_read'):
+                    file_content = file.read().decode('utf-8')
             except UnicodeDecodeError:
                 files_to_process.append({'error': f'Erro ao decodificar .txt: {filename}'})
                 continue
         elif filename.endswith('.pdf'):
-            try:
-                # O processamento de PDF pode ser lento e falhar
-                reader = pypdf.PdfReader(file)
-                text = "".join(page.extract_text() or "" for page in reader.pages)
-                file_content = text.strip()
-            except Exception as e:
-                print(f"Erro ao processar PDF: {e}")
-                files_to_process.append({'error': f'Falha ao processar PDF: {filename}'})
-                continue
+            # O processamento de PDF pode ser lento e falhar: é feito depois, em paralelo, para todos os PDFs
+            with timed('file_read'):
+                pdf_data = file.read()
+            if pdf_data:
+                files_to_process.append({'pdf_data': pdf_data, 'filename': filename})
+            continue
         else:
             continue
 
         if file_content.strip():
             files_to_process.append({'content': file_content, 'filename': filename})
 
-    
-    if not files_to_process:
-        # Se nenhum arquivo/texto válido foi encontrado, retorna 400
-        return jsonify({'error': 'Nenhum conteúdo válido de e-mail fornecido para análise (texto ou arquivo).'}), 400
+    if not extract_pdfs:
+        return files_to_process
 
-    
-    # 4. Processa cada item (texto ou arquivo) com o modelo Gemini
-    all_results = []
-    for item in files_to_process:
-        if 'error' in item:
-            all_results.append(item)
+    # 4. Extrai o texto dos PDFs no pool (com limite de páginas, caracteres e tempo por arquivo)
+    extract_pdf_items(files_to_process)
+
+    # PDFs sem texto extraído são ignorados, como os demais arquivos vazios
+    return [item for item in files_to_process if 'error' in item or item['content'].strip()]
+
+def warm_up():
+    """
+    Hook de aquecimento opcional: carrega antecipadamente os recursos do NLTK, o cliente do Gemini,
+    o classificador local e o banco. Retorna o tempo (ms) gasto em cada etapa.
+    """
+    steps = (
+        ('nlp', text_preprocessor.warm_up if text_preprocessor else None),
+        ('model', get_model),
+        ('local_classifier', get_local_classifier),
+        ('database', initialize_db),
+    )
+    timings = {}
+    for name, step in steps:
+        if step is None:
             continue
-            
-        email_content = item['content']
-        filename = item['filename']
-        
+        started_at = time.perf_counter()
         try:
-            prompt = PROMPT_TEMPLATE.format(email_content=email_content)
-            response = model.generate_content(prompt)
+            step()
+        except Exception as e:
+            print(f"Falha no aquecimento ({name}): {e}")
+        timings[name] = round((time.perf_counter() - started_at) * 1000, 2)
+    return timings
 
-            cleaned_response = response.text.strip().replace('```json', '').replace('```', '')
+@app.before_request
+def start_request_metrics():
+    g.request_started_at = time.perf_counter()
+    g.request_timings = start_request_timings()
 
-            try:
-                result_json = json.loads(cleaned_response)
-            except json.JSONDecodeError:
-                print(f"Erro ao decodificar JSON. Resposta da IA: {cleaned_response}")
-                all_results.append({'error': f'A resposta da IA não estava em um formato JSON válido para: {filename}'})
-                continue
+@app.after_request
+def record_request_metrics(response):
+    """Registra a duração da requisição no histograma e, se habilitado, devolve o Server-Timing das etapas."""
+    started_at = g.pop('request_started_at', None)
+    timings = g.pop('request_timings', None)
+    if started_at is not None:
+        # Respostas em streaming são medidas até o envio dos cabeçalhos
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started_at,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    if SERVER_TIMING_ENABLED and timings is not None:
+        # Etapas executadas em paralelo são somadas, então podem passar do tempo total
+        response.headers['Server-Timing'] = timings.server_timing_header()
+    finish_request_timings()
+    return response
 
-            # Extrai e valida dados
-            classification = result_json.get("classification", "Desconhecido")
-            confidence_score = result_json.get("confidence_score", 0.0)
-            suggested_response = result_json.get("suggested_response", "Nenhuma resposta")
-            
-            # CORREÇÃO: Extrai os novos campos do JSON da IA (caindo para N/A se faltar)
-            key_topic = result_json.get("key_topic", "N/A")
-            sentiment = result_json.get("sentiment", "N/A")
-            
-            # Garante que confidence_score seja um float
-            if not isinstance(confidence_score, (int, float)):
-                try:
-                    confidence_score = float(confidence_score)
-                except ValueError:
-                    confidence_score = 0.0 
-                    
-            # Salva no histórico
-            insert_classification(classification, confidence_score, key_topic, sentiment, suggested_response, email_content)
-            
-            # Adiciona o resultado à lista
-            result_json['source_filename'] = filename
-            all_results.append(result_json)
+@app.route('/')
+def index():
+    """Renderiza a página inicial e garante a inicialização do DB (necessário no Serverless)."""
+    initialize_db()
+    return render_template('index.html')
 
+@app.route('/classify', methods=['POST'])
+def classify_email():
+    """Recebe o e-mail (texto) ou a lista de arquivos, classifica com a IA, salva e retorna os resultados."""
+    initialize_db()
+    
+    if not get_model():
+        return jsonify({'error': 'O modelo de IA não foi inicializado. Verifique a chave da API.'}), 503
 
-        except genai.types.generation_types.StopCandidateException as e:
-            print(f"Geração interrompida pela IA: {e}")
-            all_results.append({'error': f"A IA interrompeu a geração por razões de segurança ou conteúdo: {filename}"})
-        except Exception as e:
-            print(f"Ocorreu um erro inesperado: {e}")
-            all_results.append({'error': f"Ocorreu um erro inesperado no servidor para: {filename}"})
+    try:
+        files_to_process = collect_items_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not files_to_process:
+        # Se nenhum arquivo/texto válido foi encontrado, retorna 400
+        return jsonify({'error': 'Nenhum conteúdo válido de e-mail fornecido para análise (texto ou arquivo).'}), 400
+
+    
+    # 4. Processa os itens com o modelo Gemini em paralelo (limitado), mantendo a ordem de upload
+    all_results = classify_items_in_order(files_to_process)
+
+    # Tokens economizados pela limpeza/orçamento da entrada nesta requisição (também por item, em 'input_tokens')
+    input_tokens = sum_input_tokens(all_results)
+    print(f"Tokens de entrada: {input_tokens['sent']} enviados de {input_tokens['original']} ({input_tokens['saved']} economizados)")
+    headers = {'X-Input-Tokens-Original': input_tokens['original'], 'X-Input-Tokens-Saved': input_tokens['saved']}
 
     # 5. Retorna a lista de resultados (ou o objeto único se for apenas um)
     if len(all_results) == 1 and 'source_filename' in all_results[0]:
         # Se for apenas um item (texto ou 1 arquivo), retorna o objeto único para não quebrar a exibição atual
-        return jsonify(all_results[0])
+        return jsonify(all_results[0]), 200, headers
     
     # Retorna a lista completa de resultados (para o front-end processar)
-    return jsonify(all_results)
+    return jsonify(all_results), 200, headers
+
+@app.route('/classify/stream', methods=['POST'])
+def classify_email_stream():
+    """
+    Variante em streaming de /classify: responde em NDJSON, enviando uma linha por item
+    assim que ele termina (na ordem de conclusão) e uma linha final com o resumo do lote.
+    """
+    initialize_db()
+
+    if not get_model():
+        return jsonify({'error': 'O modelo de IA não foi inicializado. Verifique a chave da API.'}), 503
+
+    try:
+        files_to_process = collect_items_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not files_to_process:
+        return jsonify({'error': 'Nenhum conteúdo válido de e-mail fornecido para análise (texto ou arquivo).'}), 400
+
+    def generate():
+        started_at = time.monotonic()
+        succeeded = 0
+        failed = 0
+        input_tokens = {'original': 0, 'sent': 0, 'saved': 0}
+
+        yield json.dumps({'type': 'start', 'total': len(files_to_process)}) + '\n'
+
+        # Os resultados não são acumulados: cada um é enviado e descartado em seguida
+        for index, result in iter_classified_items(files_to_process):
+            if 'error' in result:
+                failed += 1
+            else:
+                succeeded += 1
+                for key, value in result.get('input_tokens', {}).items():
+                    input_tokens[key] += value
+            yield json.dumps({'type': 'result', 'index': index, 'result': result}) + '\n'
+
+        yield json.dumps({
+            'type': 'summary',
+            'total': len(files_to_process),
+            'succeeded': succeeded,
+            'failed': failed,
+            'input_tokens': input_tokens,
+            'elapsed_seconds': round(time.monotonic() - started_at, 3)
+        }) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def job_links(job_id):
+    return {
+        'status_url': url_for('job_status', job_id=job_id),
+        'stream_url': url_for('job_stream', job_id=job_id)
+    }
+
+@app.route('/jobs', methods=['POST'])
+def create_classification_job():
+    """
+    Recebe um lote (mesmo formulário de /classify ou JSON) e responde na hora com o id do job;
+    a extração dos PDFs e a classificação são feitas pelos workers em segundo plano (a requisição só valida
+    a quantidade de itens e o tamanho dos arquivos). Acompanhe por /jobs/<id> ou /jobs/<id>/stream.
+    """
+    initialize_db()
+
+    if job_queue is None:
+        return jsonify({'error': 'A fila de jobs não está disponível.'}), 503
+    if not get_model():
+        return jsonify({'error': 'O modelo de IA não foi inicializado. Verifique a chave da API.'}), 503
+
+    try:
+        files_to_process = collect_items_from_request(extract_pdfs=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not files_to_process:
+        return jsonify({'error': 'Nenhum conteúdo válido de e-mail fornecido para análise (texto ou arquivo).'}), 400
+    if len(files_to_process) > JOB_MAX_ITEMS:
+        return jsonify({'error': f'O job pode ter no máximo {JOB_MAX_ITEMS} itens.'}), 413
+
+    for item in files_to_process:
+        if len(item.get('pdf_data', b'')) > JOB_MAX_PDF_BYTES:
+            item.pop('pdf_data')
+            item['error'] = f"PDF maior que o limite de {JOB_MAX_PDF_BYTES // (1024 * 1024)} MB: {item['filename']}"
+
+    job_id = job_queue.submit(files_to_process)
+    return jsonify({**get_job(job_id), **job_links(job_id)}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    Estado do job e os resultados concluídos depois de `since` (na ordem de conclusão).
+    Para acompanhar o job, repita a consulta passando o `next_since` recebido.
+    """
+    initialize_db()
+
+    try:
+        since = max(int(request.args.get('since', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 100)), 1), JOB_RESULTS_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros since/limit inválidos.'}), 400
+
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado.'}), 404
+
+    results, next_since = get_job_results(job_id, since, limit)
+    return jsonify({**job, **job_links(job_id), 'results': results, 'next_since': next_since})
+
+@app.route('/jobs/<job_id>/stream')
+def job_stream(job_id):
+    """
+    Acompanha o job em NDJSON: uma linha inicial com o estado, uma linha por item concluído e
+    uma linha final com o resumo. Sem novos resultados, envia um heartbeat a cada JOB_STREAM_HEARTBEAT_SECONDS.
+    A conexão dura no máximo JOB_STREAM_MAX_SECONDS: a linha final 'reconnect' traz o `since` para continuar
+    (o mesmo vale se a conexão cair: reconecte com o último `seq` recebido).
+    """
+    initialize_db()
+
+    try:
+        since = max(int(request.args.get('since', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro since inválido.'}), 400
+
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado.'}), 404
+
+    def generate():
+        position = since
+        started_at = last_sent_at = time.monotonic()
+        yield json.dumps({'type': 'start', 'job': job}) + '\n'
+
+        while True:
+            current = get_job(job_id)
+            if current is None:
+                # O job foi removido enquanto era acompanhado
+                yield json.dumps({'type': 'error', 'error': 'Job não encontrado.', 'next_since': position}) + '\n'
+                break
+
+            results, position = get_job_results(job_id, position, JOB_RESULTS_MAX_LIMIT)
+            for result in results:
+                yield json.dumps({'type': 'result', 'index': result['index'], 'status': result['status'],
+                                  'result': result['result'], 'seq': position}) + '\n'
+
+            # O estado é lido antes dos resultados: se já estava concluído, nada mais vai chegar
+            if current['status'] == 'completed' and not results:
+                yield json.dumps({'type': 'summary', 'job': current}) + '\n'
+                break
+
+            now = time.monotonic()
+            if now - started_at >= JOB_STREAM_MAX_SECONDS:
+                # Não prende o worker web indefinidamente (ex.: nenhum job-worker consumindo a fila)
+                yield json.dumps({
+                    'type': 'reconnect',
+                    'job': current,
+                    'next_since': position,
+                    'stream_url': url_for('job_stream', job_id=job_id, since=position)
+                }) + '\n'
+                break
+            if results:
+                last_sent_at = now
+                continue
+            if now - last_sent_at >= JOB_STREAM_HEARTBEAT_SECONDS:
+                yield json.dumps({'type': 'heartbeat', 'job': current, 'next_since': position}) + '\n'
+                last_sent_at = now
+            time.sleep(JOB_STREAM_POLL_INTERVAL)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/history')
 def history():
@@ -271,15 +1224,117 @@ def history():
         
     return jsonify(processed_history)
 
+@app.route('/history/page')
+def history_page():
+    """
+    Histórico paginado por cursor: ?limit=20&cursor=...&classification=...&sentiment=...&key_topic=...
+    Retorna apenas o snippet de cada e-mail; o conteúdo completo fica em /history/<id>.
+    """
+    initialize_db()
+
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), HISTORY_PAGE_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro limit inválido.'}), 400
+
+    try:
+        items, next_cursor = get_history_page(
+            limit=limit,
+            cursor=request.args.get('cursor') or None,
+            classification=request.args.get('classification') or None,
+            sentiment=request.args.get('sentiment') or None,
+            key_topic=request.args.get('key_topic') or None,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@app.route('/history/search')
+def history_search():
+    """
+    Busca textual no histórico: ?q=palavras&limit=20&cursor=...&classification=...&sentiment=...
+    Resultados ordenados por relevância, com os termos encontrados destacados em <mark>.
+    """
+    initialize_db()
+
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), HISTORY_PAGE_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro limit inválido.'}), 400
+
+    try:
+        items, next_cursor = search_history(
+            request.args.get('q', ''),
+            limit=limit,
+            cursor=request.args.get('cursor') or None,
+            classification=request.args.get('classification') or None,
+            sentiment=request.args.get('sentiment') or None,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except sqlite3.OperationalError as e:
+        print(f"Erro na busca do histórico: {e}")
+        return jsonify({'error': 'A busca textual não está disponível neste servidor.'}), 503
+
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@app.route('/history/<int:classification_id>')
+def history_detail(classification_id):
+    """Retorna o registro completo (com o corpo do e-mail) de uma análise do histórico."""
+    initialize_db()
+
+    detail = get_classification_detail(classification_id)
+    if detail is None:
+        return jsonify({'error': 'Registro não encontrado.'}), 404
+    return jsonify(detail)
+
+def parse_export_date(value, end_of_range=False):
+    """Converte uma data (AAAA-MM-DD) ou data/hora ISO da query string no limite usado em created_at."""
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            day = datetime.date.fromisoformat(value)
+            # O fim do intervalo é inclusivo para datas: vai até o início do dia seguinte
+            if end_of_range:
+                day += datetime.timedelta(days=1)
+            return day.isoformat()
+        return datetime.datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Data inválida: {value}")
+
 @app.route('/export_history')
 def export_history():
-    """Exporta todo o histórico do banco de dados para um arquivo CSV."""
+    """
+    Exporta o histórico do banco de dados para um arquivo CSV, em streaming e com memória constante.
+    Parâmetros opcionais: ?start=AAAA-MM-DD&end=AAAA-MM-DD&columns=id,created_at,...&gzip=1
+    """
     initialize_db()
-    
+
     try:
-        raw_data = get_raw_history_data()
-        return export_history_to_csv(raw_data)
-        
+        start = parse_export_date(request.args.get('start'))
+        end = parse_export_date(request.args.get('end'), end_of_range=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    columns = [column.strip() for column in request.args.get('columns', '').split(',') if column.strip()]
+    columns = columns or DEFAULT_EXPORT_COLUMNS
+    invalid = [column for column in columns if column not in HEADER_MAPPING]
+    if invalid:
+        return jsonify({'error': f"Colunas inválidas: {', '.join(invalid)}"}), 400
+
+    compress = request.args.get('gzip') in ('1', 'true', 'True')
+
+    try:
+        # Executa a consulta (e lê a primeira linha) antes de enviar o status 200: falhas do banco nesse
+        # ponto ainda viram um erro 500; as que ocorrerem depois são sinalizadas no fim do próprio arquivo
+        rows = iter_history_rows(columns, start=start, end=end)
+        first_row = next(rows, None)
+        if first_row is not None:
+            rows = itertools.chain([first_row], rows)
+        return export_history_to_csv(rows, columns=columns, compress=compress)
+
     except Exception as e:
         print(f"Erro ao exportar histórico: {e}")
         return jsonify({'error': 'Falha ao gerar o arquivo CSV.'}), 500
@@ -299,6 +1354,201 @@ def dashboard_data():
     
     return jsonify(history_data)
 
+@app.route('/dashboard/summary')
+def dashboard_summary():
+    """Fornece os agregados do dashboard calculados no servidor (tamanho constante, sem os e-mails)."""
+    initialize_db()
+
+    try:
+        top_topics = min(max(int(request.args.get('top_topics', 20)), 1), 100)
+        days = min(max(int(request.args.get('days', 30)), 1), 366)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros inválidos.'}), 400
+
+    return jsonify(get_dashboard_aggregates(top_topics=top_topics, days=days))
+
+@app.route('/local_classifier/stats')
+def local_classifier_status():
+    """Informa quanto do tráfego deste processo foi respondido pelo classificador local."""
+    with _stats_lock:
+        answered_locally = local_classifier_stats['local']
+        sent_to_llm = local_classifier_stats['llm']
+    total = answered_locally + sent_to_llm
+
+    return jsonify({
+        'enabled': get_local_classifier() is not None,
+        'threshold': LOCAL_CLASSIFIER_THRESHOLD,
+        'answered_locally': answered_locally,
+        'sent_to_llm': sent_to_llm,
+        'absorbed_percentage': round(100.0 * answered_locally / total, 2) if total else 0.0
+    })
+
+@app.route('/classify/packing/stats')
+def packing_status():
+    """Informa quantas chamadas à IA o agrupamento de e-mails curtos economizou neste processo."""
+    with _stats_lock:
+        stats = dict(packing_stats)
+
+    return jsonify({
+        'enabled': CLASSIFY_PACK_ENABLED and CLASSIFY_PACK_MAX_ITEMS > 1,
+        'max_items': CLASSIFY_PACK_MAX_ITEMS,
+        'max_tokens': CLASSIFY_PACK_MAX_TOKENS,
+        'packed_requests': stats['packed_requests'],
+        'packed_items': stats['packed_items'],
+        'fallback_items': stats['fallback_items'],
+        # Cada e-mail resolvido em uma chamada agrupada teria custado uma chamada própria
+        'llm_requests_saved': max(0, stats['packed_items'] - stats['packed_requests'])
+    })
+
+@app.route('/llm/stats')
+def llm_status():
+    """Estado do cliente da IA neste processo: chamadas, novas tentativas, tempo em espera e disjuntor."""
+    return jsonify(llm_client.get_stats())
+
+@app.route('/near_duplicates/stats')
+def near_duplicates_status():
+    """Informa quantas chamadas à IA foram evitadas reaproveitando resultados de e-mails quase idênticos."""
+    with _stats_lock:
+        stats = dict(near_duplicate_stats)
+
+    try:
+        total_avoided = count_classifications_by_source('near_duplicate')
+    except Exception as e:
+        print(f"Erro ao contar as quase-duplicatas do histórico: {e}")
+        total_avoided = None
+
+    return jsonify({
+        'enabled': NEAR_DUP_ENABLED,
+        'threshold': NEAR_DUP_THRESHOLD,
+        'lookups': stats['lookups'],
+        'llm_calls_avoided': stats['hits'],
+        'hit_percentage': round(100.0 * stats['hits'] / stats['lookups'], 2) if stats['lookups'] else 0.0,
+        # Total no histórico (todos os processos e reinícios)
+        'llm_calls_avoided_total': total_avoided
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Métricas deste processo no formato de texto do Prometheus (cada worker expõe as suas)."""
+    return Response(generate_latest(), mimetype=None, content_type=CONTENT_TYPE_LATEST)
+
+@app.route('/warmup')
+def warmup():
+    """Aquece o processo (útil para um cron/ping logo após o deploy) e informa o tempo de cada etapa."""
+    return jsonify(warm_up())
+
+@app.cli.command('retrain-classifier')
+@click.option('--corpus', default=os.path.join(project_root, 'Test-Email'), show_default=True,
+              help='Pasta com PDFs rotulados (Produtivo/Improdutivo).')
+@click.option('--threshold', type=float, default=None, help='Limiar de confiança usado no relatório.')
+@click.option('--max-history', type=int, default=None,
+              help='Máximo de registros do histórico (amostra aleatória). Padrão: LOCAL_CLASSIFIER_MAX_TRAINING_ROWS.')
+def retrain_classifier(corpus, threshold, max_history):
+    """Treina o classificador local com uma amostra do histórico rotulado pela IA e o corpus Test-Email."""
+    initialize_db()
+    threshold = LOCAL_CLASSIFIER_THRESHOLD if threshold is None else threshold
+    max_history = LOCAL_CLASSIFIER_MAX_TRAINING_ROWS if max_history is None else max_history
+
+    texts = []
+    labels = []
+    for email_content, classification in get_training_data(max_rows=max_history):
+        texts.append(email_content)
+        labels.append(classification)
+    history_count = len(texts)
+
+    for path, label in iter_labeled_corpus(corpus):
+        try:
+            with open(path, 'rb') as f:
+                text = extract_pdf_text(f.read())['text']
+        except Exception as e:
+            click.echo(f"Ignorando {path}: {e}")
+            continue
+        if text:
+            texts.append(text)
+            labels.append(label)
+
+    documents = [preprocess_text_nlp(text).split() for text in texts]
+    label_counts = {label: labels.count(label) for label in set(labels)}
+    if len(label_counts) < 2 or min(label_counts.values()) < 2:
+        raise click.ClickException(f"Dados insuficientes para treinar (exemplos por classe: {label_counts}).")
+
+    report = evaluate(documents, labels, threshold)
+    LocalClassifier.train(documents, labels).save(LOCAL_CLASSIFIER_PATH)
+
+    click.echo(f"Exemplos de treino: {len(documents)} ({history_count} do histórico, {len(documents) - history_count} do corpus) {label_counts}")
+    click.echo(f"Precisão na validação ({report['holdout_size']} exemplos): {report['accuracy']:.1%}")
+    click.echo(f"Tráfego absorvido no limiar {threshold}: {report['absorbed_ratio']:.1%}")
+    if report['absorbed_accuracy'] is not None:
+        click.echo(f"Precisão nos itens absorvidos: {report['absorbed_accuracy']:.1%}")
+    click.echo(f"Modelo salvo em {LOCAL_CLASSIFIER_PATH}")
+
+@app.cli.command('reindex-near-duplicates')
+def reindex_near_duplicates():
+    """Calcula a assinatura MinHash dos resultados da IA já gravados, para que entrem no índice de quase-duplicatas."""
+    initialize_db()
+
+    batch = []
+    indexed = 0
+    skipped = 0
+    for row_id, email_content in iter_rows_without_signature():
+        # O histórico guarda o e-mail original: aplica a mesma preparação das requisições antes da assinatura
+        content, _ = prepare_email_for_prompt(
+            email_content or '', INPUT_MAX_TOKENS, head_ratio=INPUT_HEAD_RATIO, cleanup=INPUT_CLEANUP_ENABLED
+        )
+        tokens = preprocess_tokens(content)
+        if tokens is None:
+            raise click.ClickException("Os dados do NLTK são necessários para calcular as assinaturas.")
+        signature = minhash_signature(tokens)
+        if signature is None:
+            skipped += 1
+            continue
+        batch.append((row_id, signature))
+        if len(batch) >= 500:
+            save_signatures(batch)
+            indexed += len(batch)
+            batch = []
+
+    if batch:
+        save_signatures(batch)
+        indexed += len(batch)
+    click.echo(f"Assinaturas calculadas: {indexed} (curtos demais para comparar: {skipped}).")
+
+@app.cli.command('job-worker')
+def job_worker():
+    """Processa os jobs de classificação em primeiro plano (ex.: em um processo separado do servidor web)."""
+    initialize_db()
+    click.echo(f"Processando jobs com {job_queue.num_workers} worker(s). Ctrl+C para encerrar.")
+    job_queue.run_forever()
+
+# Retomada de jobs interrompidos por um reinício: verificada na primeira requisição do processo (e não na
+# importação, para não abrir o banco no cold start); desligada na Vercel, onde não há processo persistente
+JOB_RESUME_ON_START = job_queue is not None and not os.getenv('VERCEL') and \
+    os.getenv("JOB_RESUME_ON_START", "1") not in ("0", "false", "False")
+_job_resume_checked = False
+_job_resume_lock = threading.Lock()
+
+@app.before_request
+def resume_unfinished_jobs():
+    """Inicia os workers se houver itens pendentes ou reservados (reservas de um processo que caiu vencem e são retomadas)."""
+    global _job_resume_checked
+    if not JOB_RESUME_ON_START or _job_resume_checked:
+        return
+    with _job_resume_lock:
+        if _job_resume_checked:
+            return
+        _job_resume_checked = True
+        try:
+            initialize_db()
+            if job_queue.pending():
+                print("Retomando jobs de classificação pendentes.")
+                job_queue.start()
+        except Exception as e:
+            print(f"Erro ao verificar jobs pendentes: {e}")
+
+# Aquecimento no carregamento do módulo, se habilitado (por padrão tudo é carregado sob demanda)
+if os.getenv("WARM_UP_ON_START", "0") in ("1", "true", "True"):
+    warm_up()
+
 if __name__ == '__main__':
     # Bloco para execução local
     initialize_db() 
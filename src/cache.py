@@ -0,0 +1,85 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from database import get_cached_classification, save_cached_classification, prune_classification_cache
+
+# Campos da classificação que são armazenados e devolvidos pelo cache
+CACHED_FIELDS = ('classification', 'confidence_score', 'key_topic', 'sentiment', 'suggested_response')
+
+def normalize_email_content(text):
+    """Normaliza o conteúdo do e-mail (Unicode, caixa e espaços) para que cópias equivalentes gerem a mesma chave."""
+    text = unicodedata.normalize('NFKC', text)
+    text = text.lower()
+    return re.sub(r'\s+', ' ', text).strip()
+
+def make_cache_key(email_content, prompt_version):
+    """Gera a chave do cache: SHA-256 da versão do prompt + conteúdo normalizado."""
+    normalized = normalize_email_content(email_content)
+    return hashlib.sha256(f"{prompt_version}\n{normalized}".encode('utf-8')).hexdigest()
+
+class ClassificationCache:
+    """
+    Cache de classificações em duas camadas: um LRU em memória (por processo) na frente
+    da tabela 'classification_cache' do SQLite. Ambas respeitam o mesmo TTL; o SQLite
+    é podado periodicamente para não passar de `db_max_entries`.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=7 * 24 * 3600, db_max_entries=50000, prune_every=200):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_max_entries = db_max_entries
+        self.prune_every = prune_every
+        self._entries = OrderedDict()  # chave -> (instante de criação, resultado)
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retorna (resultado, camada) em caso de acerto ou (None, None) em caso de falha."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, result = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return dict(result), 'memory'
+                del self._entries[key]
+
+        try:
+            row = get_cached_classification(key, self.ttl_seconds)
+        except Exception as e:
+            print(f"Erro ao consultar o cache de classificações: {e}")
+            return None, None
+
+        if row is None:
+            return None, None
+
+        result = {field: row[field] for field in CACHED_FIELDS}
+        self._remember(key, result, row['cached_at'])
+        return dict(result), 'sqlite'
+
+    def set(self, key, result):
+        """Armazena os campos da classificação nas duas camadas."""
+        result = {field: result.get(field) for field in CACHED_FIELDS}
+        self._remember(key, result, time.time())
+
+        try:
+            save_cached_classification(key, *(result[field] for field in CACHED_FIELDS))
+            with self._lock:
+                self._writes += 1
+                should_prune = self._writes % self.prune_every == 0
+            if should_prune:
+                prune_classification_cache(self.db_max_entries, self.ttl_seconds)
+        except Exception as e:
+            print(f"Erro ao gravar no cache de classificações: {e}")
+
+    def _remember(self, key, result, created_at):
+        with self._lock:
+            self._entries[key] = (created_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,6 +1,17 @@
 import sqlite3
 import datetime
+import time
 import os
+import queue
+import atexit
+import base64
+import html
+import json
+import random
+import re
+import uuid
+import threading
+from contextlib import contextmanager
 
 # "/tmp" para Vercel ou normal para localhost
 if os.getenv('VERCEL'): 
@@ -8,33 +19,107 @@ if os.getenv('VERCEL'):
 else:
     DATABASE_NAME = 'emails.db'
 
-def add_column_if_not_exists(conn, column_name, column_type):
-    """Adiciona uma coluna à tabela 'classifications' se ela ainda não existir usando PRAGMA."""
+# Ajustes de desempenho do SQLite
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '8'))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '8192'))
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '30'))
+
+class ConnectionPool:
+    """
+    Pool simples de conexões SQLite reutilizáveis entre threads. Cada conexão é aberta uma
+    única vez com WAL e pragmas ajustados; conexões excedentes ao tamanho do pool são fechadas.
+    """
+
+    def __init__(self, database, max_size):
+        self.database = database
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=max_size)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        # WAL permite leituras concorrentes com uma escrita; NORMAL evita fsync a cada commit em WAL
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    pool = _pool
+    # Recria o pool se o banco mudou ou se o processo foi "forkado" (ex.: gunicorn --preload)
+    if pool is None or pool.database != DATABASE_NAME or pool.pid != os.getpid():
+        with _pool_lock:
+            pool = _pool
+            if pool is None or pool.database != DATABASE_NAME or pool.pid != os.getpid():
+                pool = _pool = ConnectionPool(DATABASE_NAME, SQLITE_POOL_SIZE)
+    return pool
+
+@contextmanager
+def get_connection():
+    """Empresta uma conexão do pool; desfaz a transação pendente se ocorrer um erro."""
+    pool = _get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        pool.release(conn)
+
+def add_column_if_not_exists(conn, column_name, column_type, table='classifications'):
+    """Adiciona uma coluna à tabela (por padrão 'classifications') se ela ainda não existir usando PRAGMA."""
     cursor = conn.cursor()
     
     # Verifica as colunas existentes usando PRAGMA table_info
     # Colunas de interesse estão no índice 1 (nome da coluna)
-    cursor.execute("PRAGMA table_info(classifications)")
+    cursor.execute(f"PRAGMA table_info({table})")
     columns = [info[1] for info in cursor.fetchall()]
 
     if column_name not in columns:
         print(f"ADICIONANDO COLUNA: {column_name}")
         try:
-            cursor.execute(f"ALTER TABLE classifications ADD COLUMN {column_name} {column_type}")
-            conn.commit()
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_type}")
             print(f"Coluna {column_name} adicionada com sucesso.")
         except sqlite3.OperationalError as e:
             # Captura erros se o ALTER TABLE falhar por algum motivo (tabela bloqueada, etc.)
             print(f"AVISO: Coluna {column_name} já pode existir ou erro de ALTER TABLE: {e}")
 
-def initialize_db():
-    # Cria a tabela de histórico se ela não existir
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    
-    # 1. Criação da Tabela (se não existir)
+SNIPPET_LENGTH = 150
+_TRIMMED_CONTENT_SQL = "trim(email_content, ' ' || char(9) || char(10) || char(13))"
+
+def make_snippet(email_content):
+    """Gera o trecho do e-mail exibido na listagem do histórico."""
+    text = (email_content or '').strip().replace('\n', ' ')
+    return text[:SNIPPET_LENGTH] + '...' if len(text) > SNIPPET_LENGTH else text
+
+# Migrações do schema, aplicadas em ordem. A posição na lista (1, 2, ...) é a versão gravada
+# em PRAGMA user_version; bancos antigos (versão 0) passam por todas, que são idempotentes.
+def _migration_create_classifications(conn):
     # Garante a criação com todos os campos mais recentes, mas não a modifica se já existir.
-    cursor.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS classifications (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             classification TEXT NOT NULL,
@@ -43,83 +128,1038 @@ def initialize_db():
             email_content TEXT,
             created_at TEXT NOT NULL,
             key_topic TEXT,  
-            sentiment TEXT  
+            sentiment TEXT,
+            source TEXT
         )
     """)
-    conn.commit()
-    
-    # 2. Lógica de Migração para Atualizar Schemas Antigos
-    # Chama a função de migração
+    # Atualiza schemas antigos
     add_column_if_not_exists(conn, 'key_topic', 'TEXT')
     add_column_if_not_exists(conn, 'sentiment', 'TEXT')
-    
-    conn.close()
 
-def insert_classification(classification, confidence_score, key_topic, sentiment, suggested_response, email_content):
+def _migration_create_classification_cache(conn):
+    # Tabela de cache das classificações (chave = hash do conteúdo normalizado + versão do prompt)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS classification_cache (
+            cache_key TEXT PRIMARY KEY,
+            classification TEXT NOT NULL,
+            confidence_score REAL NOT NULL,
+            key_topic TEXT,
+            sentiment TEXT,
+            suggested_response TEXT,
+            created_at REAL NOT NULL,
+            last_hit_at REAL NOT NULL,
+            hit_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_classification_cache_last_hit ON classification_cache (last_hit_at)")
+
+def _migration_add_source(conn):
+    # Origem da classificação: 'llm', 'cache' ou 'local' (NULL = registros antigos, vindos da IA)
+    add_column_if_not_exists(conn, 'source', 'TEXT')
+
+def _migration_history_indexes_and_snippet(conn):
+    # Índices para paginação por cursor (keyset) sobre (created_at, id), com e sem filtros
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_classifications_created ON classifications (created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_classifications_classification_created ON classifications (classification, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_classifications_sentiment_created ON classifications (sentiment, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_classifications_topic_created ON classifications (key_topic, created_at, id)")
+
+    # Snippet gravado na inserção, para a listagem não precisar ler o corpo completo do e-mail
+    add_column_if_not_exists(conn, 'email_snippet', 'TEXT')
+    conn.execute(f"""
+        UPDATE classifications
+        SET email_snippet = CASE
+            WHEN length({_TRIMMED_CONTENT_SQL}) > {SNIPPET_LENGTH}
+                THEN substr(replace({_TRIMMED_CONTENT_SQL}, char(10), ' '), 1, {SNIPPET_LENGTH}) || '...'
+            ELSE replace({_TRIMMED_CONTENT_SQL}, char(10), ' ')
+        END
+        WHERE email_snippet IS NULL AND email_content IS NOT NULL
+    """)
+
+# Dimensões agregadas para o dashboard e a expressão SQL do valor de cada uma (sobre NEW/OLD nos triggers)
+ROLLUP_DIMENSIONS = (
+    ('total', "''"),
+    ('classification', "COALESCE(NULLIF({row}.classification, ''), 'Desconhecido')"),
+    ('sentiment', "COALESCE(NULLIF({row}.sentiment, ''), 'N/A')"),
+    ('key_topic', "COALESCE(NULLIF({row}.key_topic, ''), 'N/A')"),
+    ('day', "substr({row}.created_at, 1, 10)"),
+)
+
+def _migration_dashboard_rollups(conn):
+    # Contagens e soma das confianças por dimensão, mantidas por triggers a cada inserção/remoção,
+    # para que o dashboard leia poucos registros independentemente do tamanho do histórico.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS classification_rollups (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            item_count INTEGER NOT NULL DEFAULT 0,
+            confidence_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_classification_rollups_count ON classification_rollups (dimension, item_count)")
+
+    insert_values = ',\n'.join(
+        f"('{dimension}', {expression.format(row='NEW')}, 1, COALESCE(NEW.confidence_score, 0))"
+        for dimension, expression in ROLLUP_DIMENSIONS
+    )
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_classifications_rollup_insert
+        AFTER INSERT ON classifications
+        BEGIN
+            INSERT INTO classification_rollups (dimension, value, item_count, confidence_sum)
+            VALUES {insert_values}
+            ON CONFLICT (dimension, value) DO UPDATE SET
+                item_count = item_count + excluded.item_count,
+                confidence_sum = confidence_sum + excluded.confidence_sum;
+        END
+    """)
+
+    delete_statements = '\n'.join(
+        f"""UPDATE classification_rollups
+            SET item_count = item_count - 1, confidence_sum = confidence_sum - COALESCE(OLD.confidence_score, 0)
+            WHERE dimension = '{dimension}' AND value = {expression.format(row='OLD')};"""
+        for dimension, expression in ROLLUP_DIMENSIONS
+    )
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_classifications_rollup_delete
+        AFTER DELETE ON classifications
+        BEGIN
+            {delete_statements}
+        END
+    """)
+
+    # Preenche os agregados com o histórico já existente
+    conn.execute("DELETE FROM classification_rollups")
+    for dimension, expression in ROLLUP_DIMENSIONS:
+        value = expression.format(row='classifications')
+        conn.execute(f"""
+            INSERT INTO classification_rollups (dimension, value, item_count, confidence_sum)
+            SELECT '{dimension}', {value}, COUNT(*), COALESCE(SUM(confidence_score), 0)
+            FROM classifications
+            GROUP BY {value}
+        """)
+
+def _migration_classification_jobs(conn):
+    # Fila de jobs de classificação em lote: o job guarda os contadores e cada item o seu estado e resultado.
+    # 'finished_seq' numera os itens na ordem de conclusão, para o cliente buscar só o que terminou desde a última consulta.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS classification_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            total_items INTEGER NOT NULL,
+            succeeded_items INTEGER NOT NULL DEFAULT 0,
+            failed_items INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            finished_at TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS classification_job_items (
+            job_id TEXT NOT NULL,
+            item_index INTEGER NOT NULL,
+            filename TEXT,
+            email_content TEXT,
+            status TEXT NOT NULL,
+            result TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claim_token TEXT,
+            lease_until REAL,
+            finished_seq INTEGER,
+            PRIMARY KEY (job_id, item_index)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_classification_jobs_status ON classification_jobs (status, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_status ON classification_job_items (status, lease_until)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_finished ON classification_job_items (job_id, finished_seq)")
+
+# Colunas indexadas pela busca textual e o peso de cada uma no ranking (BM25)
+SEARCH_COLUMNS = (('email_content', 1.0), ('key_topic', 2.0), ('suggested_response', 0.5))
+
+def _migration_history_search(conn):
+    # Índice FTS5 "external content": guarda só o índice invertido e lê o texto da própria tabela classifications
+    columns = ', '.join(column for column, _ in SEARCH_COLUMNS)
+    try:
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS classifications_fts USING fts5(
+                {columns},
+                content='classifications',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite compilado sem FTS5: o restante da aplicação segue funcionando, apenas sem a busca
+        print(f"AVISO: busca textual indisponível (FTS5): {e}")
+        return
+
+    # Ranking padrão (ORDER BY rank) com os pesos por coluna
+    weights = ', '.join(str(weight) for _, weight in SEARCH_COLUMNS)
+    conn.execute(f"INSERT INTO classifications_fts (classifications_fts, rank) VALUES ('rank', 'bm25({weights})')")
+
+    new_values = ', '.join(f"NEW.{column}" for column, _ in SEARCH_COLUMNS)
+    old_values = ', '.join(f"OLD.{column}" for column, _ in SEARCH_COLUMNS)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_classifications_fts_insert
+        AFTER INSERT ON classifications
+        BEGIN
+            INSERT INTO classifications_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_classifications_fts_delete
+        AFTER DELETE ON classifications
+        BEGIN
+            INSERT INTO classifications_fts (classifications_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_classifications_fts_update
+        AFTER UPDATE OF {columns} ON classifications
+        BEGIN
+            INSERT INTO classifications_fts (classifications_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+            INSERT INTO classifications_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END
+    """)
+
+    # Indexa o histórico já existente
+    conn.execute("INSERT INTO classifications_fts (classifications_fts) VALUES ('rebuild')")
+
+# Assinatura MinHash dos e-mails: LSH_BANDS faixas de LSH_ROWS valores de 32 bits (ver near_duplicates.py).
+# Alterar esses valores exige uma migração que descarte as assinaturas antigas (ver _migration_minhash_128)
+# e recalculá-las (flask reindex-near-duplicates).
+LSH_BANDS = 32
+LSH_ROWS = 4
+_LSH_BAND_BYTES = LSH_ROWS * 4
+
+def _migration_near_duplicates(conn):
+    # Assinatura guardada junto com cada registro e índice LSH (uma linha por faixa) mantido por triggers.
+    # Apenas resultados da IA entram no índice, para que reaproveitamentos não se propaguem em cadeia.
+    add_column_if_not_exists(conn, 'minhash', 'BLOB')
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS classification_lsh_bands (
+            band INTEGER NOT NULL,
+            bucket BLOB NOT NULL,
+            classification_id INTEGER NOT NULL,
+            PRIMARY KEY (band, bucket, classification_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_bands_classification ON classification_lsh_bands (classification_id)")
+
+    band_values = ',\n'.join(
+        f"({band}, substr(NEW.minhash, {band * _LSH_BAND_BYTES + 1}, {_LSH_BAND_BYTES}), NEW.id)"
+        for band in range(LSH_BANDS)
+    )
+    indexable = "NEW.minhash IS NOT NULL AND COALESCE(NEW.source, 'llm') = 'llm'"
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_classifications_lsh_insert
+        AFTER INSERT ON classifications
+        WHEN {indexable}
+        BEGIN
+            INSERT OR IGNORE INTO classification_lsh_bands (band, bucket, classification_id) VALUES {band_values};
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_classifications_lsh_update
+        AFTER UPDATE OF minhash ON classifications
+        BEGIN
+            DELETE FROM classification_lsh_bands WHERE classification_id = OLD.id;
+            INSERT OR IGNORE INTO classification_lsh_bands (band, bucket, classification_id)
+            SELECT * FROM (VALUES {band_values}) WHERE {indexable};
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_classifications_lsh_delete
+        AFTER DELETE ON classifications
+        BEGIN
+            DELETE FROM classification_lsh_bands WHERE classification_id = OLD.id;
+        END
+    """)
+
+def _migration_minhash_128(conn):
+    # As assinaturas passaram de 64 para 128 valores (erro da estimativa de ±0,045 para ±0,032 perto de 0,85):
+    # as antigas são descartadas e os triggers, que copiam as faixas da assinatura, recriados com o novo tamanho
+    for trigger in ('trg_classifications_lsh_insert', 'trg_classifications_lsh_update', 'trg_classifications_lsh_delete'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DELETE FROM classification_lsh_bands")
+    conn.execute("UPDATE classifications SET minhash = NULL WHERE minhash IS NOT NULL")
+    _migration_near_duplicates(conn)
+
+def _migration_job_pdf_data(conn):
+    # PDFs de um job são guardados brutos e extraídos pelo worker, fora da requisição que cria o job
+    add_column_if_not_exists(conn, 'pdf_data', 'BLOB', table='classification_job_items')
+
+def _history_search_missing(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'classifications_fts'"
+    ).fetchone() is None
+
+MIGRATIONS = [
+    _migration_create_classifications,
+    _migration_create_classification_cache,
+    _migration_add_source,
+    _migration_history_indexes_and_snippet,
+    _migration_dashboard_rollups,
+    _migration_classification_jobs,
+    _migration_history_search,
+    _migration_near_duplicates,
+    _migration_job_pdf_data,
+    _migration_minhash_128,
+]
+
+_initialized_database = None
+_initialize_lock = threading.Lock()
+
+def initialize_db():
+    """Cria/migra o schema uma única vez por processo; chamadas seguintes não tocam no banco."""
+    global _initialized_database
+    if _initialized_database == DATABASE_NAME:
+        return
+
+    with _initialize_lock:
+        if _initialized_database == DATABASE_NAME:
+            return
+
+        with get_connection() as conn:
+            current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current_version < len(MIGRATIONS):
+                # BEGIN IMMEDIATE serializa a migração entre processos (ex.: vários workers do gunicorn)
+                conn.execute("BEGIN IMMEDIATE")
+                current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+                for version, migration in enumerate(MIGRATIONS, start=1):
+                    if version > current_version:
+                        migration(conn)
+                conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+                conn.commit()
+
+            # Sem FTS5 a migração da busca é pulada, mas a versão avança mesmo assim; por isso o índice
+            # é conferido a cada inicialização e criado assim que o SQLite passar a oferecer FTS5
+            if _history_search_missing(conn):
+                conn.execute("BEGIN IMMEDIATE")
+                if _history_search_missing(conn):
+                    _migration_history_search(conn)
+                conn.commit()
+
+        _initialized_database = DATABASE_NAME
+
+def insert_classification(classification, confidence_score, key_topic, sentiment, suggested_response, email_content, source='llm'):
     """Insere um novo registro de classificação no banco de dados."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
+    insert_classifications([(classification, confidence_score, key_topic, sentiment, suggested_response, email_content, source)])
+
+def insert_classifications(rows):
+    """
+    Insere vários registros de uma vez (executemany em uma única transação, com um único commit).
+    Cada linha é uma tupla (classification, confidence_score, key_topic, sentiment, suggested_response, email_content, source),
+    opcionalmente seguida da assinatura MinHash (bytes) do e-mail.
+    """
     created_at = datetime.datetime.now().isoformat()
-    cursor.execute("""
-        INSERT INTO classifications (classification, confidence_score, key_topic, sentiment, suggested_response, email_content, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (classification, confidence_score, key_topic, sentiment, suggested_response, email_content, created_at))
-    conn.commit()
-    conn.close()
+    # email_content é o 6º campo da linha; a assinatura, quando existe, é o 8º
+    rows = [
+        tuple(row[:7]) + (row[7] if len(row) > 7 else None, created_at, make_snippet(row[5]))
+        for row in rows
+    ]
+    if not rows:
+        return 0
+
+    with get_connection() as conn:
+        conn.executemany("""
+            INSERT INTO classifications (classification, confidence_score, key_topic, sentiment, suggested_response, email_content, source, minhash, created_at, email_snippet)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+    return len(rows)
+
+class WriteBehindQueue:
+    """
+    Fila de gravação em segundo plano: agrupa as inserções de requisições concorrentes e grava
+    em um único commit quando acumula `batch_size` linhas ou após `max_delay` segundos.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size=100, max_delay=0.5):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # A thread não sobrevive a um fork, então é (re)criada por processo
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='db-write-behind', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def put(self, row):
+        """Agenda a gravação de uma linha no mesmo formato de insert_classifications."""
+        self._ensure_started()
+        self._queue.put(row)
+
+    def stop(self, timeout=5.0):
+        """Grava o que estiver pendente e encerra a thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(self._STOP)
+        thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            row = self._queue.get()
+            if row is self._STOP:
+                break
+
+            batch = [row]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is self._STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            try:
+                insert_classifications(batch)
+            except Exception as e:
+                print(f"Erro ao gravar lote de {len(batch)} classificações: {e}")
 
 def get_history():
     # Recupera os últimos 20 registros, incluindo os novos campos.
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT classification, created_at, email_content, suggested_response, key_topic, sentiment
-        FROM classifications
-        ORDER BY created_at DESC
-        LIMIT 20
-    """)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT classification, created_at, email_content, suggested_response, key_topic, sentiment
+            FROM classifications
+            ORDER BY created_at DESC, id DESC
+            LIMIT 20
+        """)
     
-    history = [
+        history = [
+            {
+                'classification': row[0],
+                'created_at': row[1],
+                'email_snippet': row[2].strip().replace('\n', ' ')[:100] + '...' if len(row[2].strip()) > 100 else row[2].strip().replace('\n', ' '),
+                'email_content': row[2], 
+                'suggested_response': row[3],
+                'key_topic': row[4] or 'N/A',
+                'sentiment': row[5] or 'N/A'
+            }
+            for row in cursor.fetchall()
+        ]
+        return history
+
+def encode_history_cursor(created_at, row_id):
+    """Gera o cursor opaco que aponta para a posição (created_at, id) na listagem."""
+    return base64.urlsafe_b64encode(f"{created_at}|{row_id}".encode('utf-8')).decode('ascii')
+
+def decode_history_cursor(cursor):
+    """Decodifica o cursor gerado por encode_history_cursor; lança ValueError se for inválido."""
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return created_at, int(row_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+def get_history_page(limit=20, cursor=None, classification=None, sentiment=None, key_topic=None):
+    """
+    Retorna uma página do histórico (mais recentes primeiro) com paginação por cursor sobre o
+    índice (created_at, id), sem OFFSET: o custo por página não cresce com o tamanho da tabela.
+    Devolve (itens, próximo_cursor); o corpo completo do e-mail não é incluído.
+    """
+    conditions = []
+    params = []
+    for column, value in (('classification', classification), ('sentiment', sentiment), ('key_topic', key_topic)):
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if cursor:
+        created_at, row_id = decode_history_cursor(cursor)
+        conditions.append("(created_at, id) < (?, ?)")
+        params.extend([created_at, row_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with get_connection() as conn:
+        # Busca um registro a mais para saber se existe próxima página
+        rows = conn.execute(f"""
+            SELECT id, classification, confidence_score, created_at, email_snippet, suggested_response, key_topic, sentiment
+            FROM classifications
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, params + [limit + 1]).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
         {
-            'classification': row[0],
-            'created_at': row[1],
-            'email_snippet': row[2].strip().replace('\n', ' ')[:100] + '...' if len(row[2].strip()) > 100 else row[2].strip().replace('\n', ' '),
-            'email_content': row[2], 
-            'suggested_response': row[3],
+            'id': row[0],
+            'classification': row[1],
+            'confidence_score': row[2],
+            'created_at': row[3],
+            'email_snippet': row[4] or '',
+            'suggested_response': row[5],
+            'key_topic': row[6] or 'N/A',
+            'sentiment': row[7] or 'N/A'
+        }
+        for row in rows
+    ]
+    next_cursor = encode_history_cursor(rows[-1][3], rows[-1][0]) if has_more else None
+    return items, next_cursor
+
+def build_search_query(text):
+    """
+    Converte o texto digitado em uma consulta FTS5 segura: cada palavra vira um termo entre aspas
+    (todas precisam aparecer) e uma palavra terminada em '*' é buscada por prefixo.
+    Retorna None se não houver nenhuma palavra.
+    """
+    terms = []
+    for word, prefix in re.findall(r'(\w+)(\*?)', text or ''):
+        terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms) or None
+
+# Marcadores temporários do trecho destacado (escapados depois, para o HTML não vir do conteúdo do e-mail)
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+def _highlighted_html(text):
+    return html.escape(text or '').replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+def search_history(query, limit=20, cursor=None, classification=None, sentiment=None):
+    """
+    Busca textual no histórico (conteúdo do e-mail, tópico e resposta sugerida) pelo índice FTS5,
+    do resultado mais relevante para o menos relevante, com paginação por cursor sobre (rank, id).
+    Devolve (itens, próximo_cursor); o snippet e a resposta vêm em HTML com os termos em <mark>.
+    """
+    match = build_search_query(query)
+    if match is None:
+        raise ValueError("Informe ao menos uma palavra para a busca.")
+
+    conditions = ["classifications_fts MATCH ?"]
+    params = [match]
+    for column, value in (('classification', classification), ('sentiment', sentiment)):
+        if value:
+            conditions.append(f"c.{column} = ?")
+            params.append(value)
+    if cursor:
+        rank, row_id = decode_history_cursor(cursor)
+        try:
+            rank = float(rank)
+        except ValueError as e:
+            raise ValueError(f"Cursor inválido: {cursor}") from e
+        conditions.append("(f.rank > ? OR (f.rank = ? AND f.rowid > ?))")
+        params.extend([rank, rank, row_id])
+
+    with get_connection() as conn:
+        # Busca um registro a mais para saber se existe próxima página
+        rows = conn.execute(f"""
+            SELECT c.id, c.classification, c.confidence_score, c.created_at, c.key_topic, c.sentiment,
+                   snippet(classifications_fts, 0, '{_MARK_START}', '{_MARK_END}', '…', 24),
+                   highlight(classifications_fts, 2, '{_MARK_START}', '{_MARK_END}'),
+                   f.rank
+            FROM classifications_fts f
+            JOIN classifications c ON c.id = f.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY f.rank, f.rowid
+            LIMIT ?
+        """, params + [limit + 1]).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {
+            'id': row[0],
+            'classification': row[1],
+            'confidence_score': row[2],
+            'created_at': row[3],
             'key_topic': row[4] or 'N/A',
-            'sentiment': row[5] or 'N/A'
+            'sentiment': row[5] or 'N/A',
+            'email_snippet': _highlighted_html(row[6]),
+            'suggested_response': _highlighted_html(row[7]),
+            'score': round(-row[8], 4)
         }
-        for row in cursor.fetchall()
+        for row in rows
     ]
-    conn.close()
-    return history
+    next_cursor = encode_history_cursor(repr(rows[-1][8]), rows[-1][0]) if has_more else None
+    return items, next_cursor
+
+def get_classification_detail(classification_id):
+    """Retorna um registro completo do histórico (incluindo o corpo do e-mail) ou None."""
+    with get_connection() as conn:
+        row = conn.execute("""
+            SELECT id, classification, confidence_score, created_at, email_content, suggested_response, key_topic, sentiment
+            FROM classifications
+            WHERE id = ?
+        """, (classification_id,)).fetchone()
+
+    if row is None:
+        return None
+    return {
+        'id': row[0],
+        'classification': row[1],
+        'confidence_score': row[2],
+        'created_at': row[3],
+        'email_content': row[4],
+        'suggested_response': row[5],
+        'key_topic': row[6] or 'N/A',
+        'sentiment': row[7] or 'N/A'
+    }
+
+def get_dashboard_aggregates(top_topics=20, days=30):
+    """
+    Retorna os agregados do dashboard a partir da tabela classification_rollups: total, confiança
+    média, contagens por classificação e sentimento, tópicos mais comuns e série diária recente.
+    """
+    def summarize(rows):
+        return {
+            value: {
+                'count': count,
+                'average_confidence': round(confidence_sum / count, 4) if count else 0.0
+            }
+            for value, count, confidence_sum in rows
+        }
+
+    with get_connection() as conn:
+        def select(dimension, order_by, limit=-1, exclude_value=None):
+            return conn.execute(f"""
+                SELECT value, item_count, confidence_sum
+                FROM classification_rollups
+                WHERE dimension = ? AND item_count > 0 AND value IS NOT ?
+                ORDER BY {order_by}
+                LIMIT ?
+            """, (dimension, exclude_value, limit)).fetchall()
+
+        total_row = conn.execute(
+            "SELECT item_count, confidence_sum FROM classification_rollups WHERE dimension = 'total'"
+        ).fetchone()
+        classifications = select('classification', 'item_count DESC')
+        sentiments = select('sentiment', 'item_count DESC')
+        # Tópicos não identificados ('N/A') não entram no ranking
+        topics = select('key_topic', 'item_count DESC', top_topics, exclude_value='N/A')
+        daily = select('day', 'value DESC', days)
+
+    total, confidence_sum = total_row if total_row else (0, 0.0)
+    return {
+        'total': total,
+        'average_confidence': round(confidence_sum / total, 4) if total else 0.0,
+        'classifications': summarize(classifications),
+        'sentiments': summarize(sentiments),
+        'top_topics': [[value, count] for value, count, _ in topics],
+        'daily': [
+            {
+                'day': value,
+                'count': count,
+                'average_confidence': round(day_confidence_sum / count, 4) if count else 0.0
+            }
+            for value, count, day_confidence_sum in reversed(daily)
+        ]
+    }
+
+# Colunas do histórico que podem ser selecionadas na exportação
+HISTORY_COLUMNS = ('id', 'created_at', 'classification', 'confidence_score', 'email_content',
+                   'suggested_response', 'key_topic', 'sentiment', 'source')
+
+def iter_history_rows(columns, start=None, end=None, chunk_size=500):
+    """
+    Percorre o histórico em ordem cronológica com um cursor do SQLite, buscando `chunk_size`
+    linhas por vez, e gera um dicionário por registro. `start`/`end` limitam created_at
+    (início inclusivo, fim exclusivo). A conexão fica reservada até o gerador terminar.
+    """
+    invalid = [column for column in columns if column not in HISTORY_COLUMNS]
+    if invalid:
+        raise ValueError(f"Colunas inválidas: {', '.join(invalid)}")
+
+    conditions = []
+    params = []
+    if start:
+        conditions.append("created_at >= ?")
+        params.append(start)
+    if end:
+        conditions.append("created_at < ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with get_connection() as conn:
+        cursor = conn.execute(f"""
+            SELECT {', '.join(columns)}
+            FROM classifications
+            {where}
+            ORDER BY created_at ASC, id ASC
+        """, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
 
 def get_raw_history_data():
     # Recupera TODOS os campos para exportação CSV.
 
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, created_at, classification, confidence_score, email_content, suggested_response, key_topic, sentiment
-        FROM classifications
-        ORDER BY created_at ASC
-    """)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, created_at, classification, confidence_score, email_content, suggested_response, key_topic, sentiment
+            FROM classifications
+            ORDER BY created_at ASC
+        """)
     
-    # Mapeia os dados brutos para dicionários
-    raw_history = [
+        # Mapeia os dados brutos para dicionários
+        raw_history = [
+            {
+                'id': row[0],
+                'created_at': row[1],
+                'classification': row[2],
+                'confidence_score': row[3],
+                'email_content': row[4],
+                'suggested_response': row[5],
+                'key_topic': row[6],
+                'sentiment': row[7]
+            }
+            for row in cursor.fetchall()
+        ]
+        return raw_history
+
+def get_training_data(max_rows=None, seed=42):
+    """
+    Recupera os e-mails rotulados pela IA para treinar o classificador local: [(email_content, classification)].
+    Registros vindos do cache ou do próprio classificador local são ignorados. Com `max_rows`, devolve uma
+    amostra aleatória uniforme desse tamanho, percorrendo o cursor sem carregar a tabela inteira na memória.
+    """
+    rng = random.Random(seed)
+    sample = []
+    with get_connection() as conn:
+        cursor = conn.execute("""
+            SELECT email_content, classification
+            FROM classifications
+            WHERE classification IN ('Produtivo', 'Improdutivo')
+              AND (source IS NULL OR source = 'llm')
+              AND email_content IS NOT NULL
+        """)
+        # Amostragem por reservatório: cada linha vista até aqui tem a mesma chance de estar na amostra
+        for seen, row in enumerate(cursor):
+            if max_rows is None or seen < max_rows:
+                sample.append(row)
+            else:
+                position = rng.randint(0, seen)
+                if position < max_rows:
+                    sample[position] = row
+    return sample
+
+def get_near_duplicate_candidates(signature, min_created_at, limit=100):
+    """
+    Busca no índice LSH os registros que compartilham ao menos uma faixa com a assinatura
+    informada (bytes), criados a partir de `min_created_at`; os mais recentes primeiro.
+    """
+    band_keys = [
+        (band, signature[band * _LSH_BAND_BYTES:(band + 1) * _LSH_BAND_BYTES])
+        for band in range(LSH_BANDS)
+    ]
+    placeholders = ', '.join('(?, ?)' for _ in band_keys)
+    params = [value for key in band_keys for value in key]
+
+    with get_connection() as conn:
+        rows = conn.execute(f"""
+            SELECT id, minhash, classification, confidence_score, key_topic, sentiment, suggested_response
+            FROM classifications
+            WHERE id IN (
+                SELECT classification_id FROM classification_lsh_bands
+                WHERE (band, bucket) IN (VALUES {placeholders})
+            )
+            AND created_at >= ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, params + [min_created_at, limit]).fetchall()
+
+    return [
         {
             'id': row[0],
-            'created_at': row[1],
+            'minhash': row[1],
             'classification': row[2],
             'confidence_score': row[3],
-            'email_content': row[4],
-            'suggested_response': row[5],
-            'key_topic': row[6],
-            'sentiment': row[7]
+            'key_topic': row[4],
+            'sentiment': row[5],
+            'suggested_response': row[6]
         }
-        for row in cursor.fetchall()
+        for row in rows
     ]
-    conn.close()
-    return raw_history
+
+def iter_rows_without_signature(chunk_size=500):
+    """Gera (id, email_content) dos resultados da IA ainda sem assinatura MinHash (ex.: registros antigos)."""
+    last_id = 0
+    while True:
+        with get_connection() as conn:
+            rows = conn.execute("""
+                SELECT id, email_content FROM classifications
+                WHERE id > ? AND minhash IS NULL AND COALESCE(source, 'llm') = 'llm'
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+def save_signatures(signatures):
+    """Grava as assinaturas [(id, bytes)]; o trigger atualiza o índice LSH."""
+    with get_connection() as conn:
+        conn.executemany("UPDATE classifications SET minhash = ? WHERE id = ?", [(blob, row_id) for row_id, blob in signatures])
+        conn.commit()
+
+def count_classifications_by_source(source):
+    with get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM classifications WHERE source = ?", (source,)).fetchone()[0]
+
+def get_cached_classification(cache_key, max_age_seconds):
+    """Busca uma classificação no cache persistente; retorna None se não existir ou estiver expirada."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        now = time.time()
+        cursor.execute("""
+            SELECT classification, confidence_score, key_topic, sentiment, suggested_response, created_at
+            FROM classification_cache
+            WHERE cache_key = ?
+        """, (cache_key,))
+        row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        if now - row[5] > max_age_seconds:
+            # Entrada expirada: remove para não ser encontrada novamente
+            cursor.execute("DELETE FROM classification_cache WHERE cache_key = ?", (cache_key,))
+            conn.commit()
+            return None
+
+        cursor.execute("""
+            UPDATE classification_cache SET last_hit_at = ?, hit_count = hit_count + 1
+            WHERE cache_key = ?
+        """, (now, cache_key))
+        conn.commit()
+
+        return {
+            'classification': row[0],
+            'confidence_score': row[1],
+            'key_topic': row[2],
+            'sentiment': row[3],
+            'suggested_response': row[4],
+            'cached_at': row[5]
+        }
+
+def save_cached_classification(cache_key, classification, confidence_score, key_topic, sentiment, suggested_response):
+    """Insere (ou substitui) uma classificação no cache persistente."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        now = time.time()
+        cursor.execute("""
+            INSERT OR REPLACE INTO classification_cache
+                (cache_key, classification, confidence_score, key_topic, sentiment, suggested_response, created_at, last_hit_at, hit_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+        """, (cache_key, classification, confidence_score, key_topic, sentiment, suggested_response, now, now))
+        conn.commit()
+
+def prune_classification_cache(max_entries, max_age_seconds):
+    """Remove entradas expiradas e, se o cache exceder `max_entries`, as menos usadas recentemente."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM classification_cache WHERE created_at < ?", (time.time() - max_age_seconds,))
+        cursor.execute("""
+            DELETE FROM classification_cache
+            WHERE cache_key IN (
+                SELECT cache_key FROM classification_cache
+                ORDER BY last_hit_at DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (max_entries,))
+        conn.commit()
+
+# Estados dos itens de um job: 'pending' (na fila), 'running' (com um worker até lease_until), 'done' ou 'error'.
+# O job passa de 'queued' a 'running' na primeira reserva e a 'completed' quando todos os itens terminam.
+def create_job(items):
+    """
+    Cria um job com os itens informados ({'content', 'filename'}, {'pdf_data', 'filename'} ou {'error'})
+    e retorna o seu id. O texto dos PDFs é extraído pelo worker; itens que já chegam com erro
+    (ex.: arquivo inválido) são gravados como concluídos.
+    """
+    job_id = uuid.uuid4().hex
+    now = datetime.datetime.now().isoformat()
+
+    rows = []
+    failed = 0
+    for index, item in enumerate(items):
+        if 'error' in item:
+            failed += 1
+            rows.append((job_id, index, item.get('filename'), None, None, 'error', json.dumps(item), failed))
+        else:
+            rows.append((job_id, index, item['filename'], item.get('content'), item.get('pdf_data'), 'pending', None, None))
+
+    status = 'completed' if failed == len(items) else 'queued'
+    with get_connection() as conn:
+        conn.execute("""
+            INSERT INTO classification_jobs (id, status, total_items, failed_items, created_at, updated_at, finished_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (job_id, status, len(items), failed, now, now, now if status == 'completed' else None))
+        conn.executemany("""
+            INSERT INTO classification_job_items (job_id, item_index, filename, email_content, pdf_data, status, result, finished_seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+    return job_id
+
+def claim_job_items(limit, lease_seconds, max_attempts):
+    """
+    Reserva até `limit` itens pendentes (dos jobs mais antigos primeiro) para este worker por `lease_seconds`.
+    Itens 'running' com a reserva vencida (worker reiniciado ou travado) voltam a ser reservados; os que já
+    esgotaram `max_attempts` tentativas são encerrados com erro.
+    Retorna (token, [(job_id, índice, filename, conteúdo, pdf_data)]); em itens de PDF o conteúdo é None.
+    """
+    token = uuid.uuid4().hex
+    now = time.time()
+
+    with get_connection() as conn:
+        # BEGIN IMMEDIATE serializa a reserva entre threads e processos
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute("""
+            SELECT i.job_id, i.item_index, i.filename, i.email_content, i.pdf_data, i.attempts
+            FROM classification_job_items i
+            JOIN classification_jobs j ON j.id = i.job_id
+            WHERE i.status = 'pending' OR (i.status = 'running' AND i.lease_until < ?)
+            ORDER BY j.created_at, i.job_id, i.item_index
+            LIMIT ?
+        """, (now, limit)).fetchall()
+
+        claimed = []
+        exhausted = []
+        for job_id, item_index, filename, email_content, pdf_data, attempts in rows:
+            if attempts >= max_attempts:
+                exhausted.append((job_id, item_index, filename))
+            else:
+                claimed.append((job_id, item_index, filename, email_content, pdf_data))
+
+        conn.executemany("""
+            UPDATE classification_job_items
+            SET status = 'running', attempts = attempts + 1, claim_token = ?, lease_until = ?
+            WHERE job_id = ? AND item_index = ?
+        """, [(token, now + lease_seconds, job_id, item_index) for job_id, item_index, *_ in claimed])
+
+        started_at = datetime.datetime.now().isoformat()
+        conn.executemany("""
+            UPDATE classification_jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'
+        """, [(started_at, job_id) for job_id in {row[0] for row in claimed}])
+
+        for job_id, item_index, filename in exhausted:
+            error = {'error': f"Número máximo de tentativas excedido ao analisar: {filename}"}
+            _finish_job_item(conn, job_id, item_index, error, claim_token=None)
+        conn.commit()
+
+    return token, claimed
+
+def _finish_job_item(conn, job_id, item_index, result, claim_token):
+    """Grava o resultado do item e atualiza os contadores do job (na transação aberta em `conn`)."""
+    status = 'error' if 'error' in result else 'done'
+    cursor = conn.execute("""
+        UPDATE classification_job_items
+        SET status = ?, result = ?, email_content = NULL, pdf_data = NULL, claim_token = NULL, lease_until = NULL,
+            finished_seq = (
+                SELECT succeeded_items + failed_items + 1 FROM classification_jobs WHERE id = ?
+            )
+        WHERE job_id = ? AND item_index = ? AND status NOT IN ('done', 'error')
+          AND (? IS NULL OR claim_token = ?)
+    """, (status, json.dumps(result, ensure_ascii=False), job_id, job_id, item_index, claim_token, claim_token))
+    if cursor.rowcount == 0:
+        # O item foi reservado de novo por outro worker (reserva vencida) ou já estava concluído
+        return False
+
+    now = datetime.datetime.now().isoformat()
+    column = 'failed_items' if status == 'error' else 'succeeded_items'
+    conn.execute(f"""
+        UPDATE classification_jobs
+        SET {column} = {column} + 1,
+            updated_at = ?,
+            status = CASE WHEN succeeded_items + failed_items + 1 >= total_items THEN 'completed' ELSE status END,
+            finished_at = CASE WHEN succeeded_items + failed_items + 1 >= total_items THEN ? ELSE finished_at END
+        WHERE id = ?
+    """, (now, now, job_id))
+    return True
+
+def complete_job_item(job_id, item_index, result, claim_token):
+    """Grava o resultado de um item reservado com `claim_token`; retorna False se a reserva já não era deste worker."""
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        finished = _finish_job_item(conn, job_id, item_index, result, claim_token)
+        conn.commit()
+    return finished
+
+def get_job(job_id):
+    """Retorna o estado e os contadores de um job, ou None se ele não existir."""
+    with get_connection() as conn:
+        row = conn.execute("""
+            SELECT id, status, total_items, succeeded_items, failed_items, created_at, updated_at, finished_at
+            FROM classification_jobs
+            WHERE id = ?
+        """, (job_id,)).fetchone()
+
+    if row is None:
+        return None
+    return {
+        'id': row[0],
+        'status': row[1],
+        'total': row[2],
+        'succeeded': row[3],
+        'failed': row[4],
+        'pending': row[2] - row[3] - row[4],
+        'created_at': row[5],
+        'updated_at': row[6],
+        'finished_at': row[7]
+    }
+
+def get_job_results(job_id, since=0, limit=100):
+    """
+    Retorna os itens do job concluídos depois da posição `since` (na ordem de conclusão) e a posição
+    a usar na próxima consulta: ([{'index', 'filename', 'status', 'result'}], próxima posição).
+    """
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT item_index, filename, status, result, finished_seq
+            FROM classification_job_items
+            WHERE job_id = ? AND finished_seq > ?
+            ORDER BY finished_seq
+            LIMIT ?
+        """, (job_id, since, limit)).fetchall()
+
+    items = [
+        {'index': row[0], 'filename': row[1], 'status': row[2], 'result': json.loads(row[3])}
+        for row in rows
+    ]
+    return items, rows[-1][4] if rows else since
+
+def has_unfinished_job_items():
+    """
+    Indica se há itens não concluídos: pendentes ou reservados. Após uma queda, os itens reservados
+    continuam 'running' até a reserva vencer, e os workers precisam estar rodando para retomá-los.
+    """
+    with get_connection() as conn:
+        row = conn.execute("""
+            SELECT 1 FROM classification_job_items
+            WHERE status IN ('pending', 'running')
+            LIMIT 1
+        """).fetchone()
+    return row is not None
 
 if __name__ == '__main__':
     initialize_db()
\ No newline at end of file
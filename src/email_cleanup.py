@@ -0,0 +1,139 @@
+import re
+
+from packing import estimate_tokens
+
+# Cabeçalhos que iniciam o histórico citado de uma resposta/encaminhamento (pt e en). O "Em ... escreveu:"
+# só conta com um endereço de e-mail, horário ou ano, como nos cabeçalhos gerados pelos clientes de e-mail
+# (uma frase do corpo como "On Monday you wrote:" não corta a mensagem)
+QUOTE_HEADER_PATTERNS = [
+    re.compile(
+        r'^\s*(em|on)\s(?=.{0,200}(<?[\w.+-]+@[\w-]+\.[\w.-]+>?|\d{1,2}:\d{2}|\b\d{4}\b)).{0,200}(escreveu|wrote)\s*:\s*$',
+        re.IGNORECASE
+    ),
+    re.compile(r'^\s*-{2,}\s*(mensagem original|original message|mensagem encaminhada|forwarded message)\s*-{2,}\s*$', re.IGNORECASE),
+    re.compile(r'^\s*_{10,}\s*$'),
+]
+# Bloco de cabeçalho do Outlook: "De:"/"From:" seguido, nas próximas linhas, de "Enviado:"/"Sent:"/"Data:"/"Date:"
+OUTLOOK_FROM = re.compile(r'^\s*\**\s*(de|from)\s*:\**\s', re.IGNORECASE)
+OUTLOOK_SENT = re.compile(r'^\s*\**\s*(enviado|enviada|sent|data|date)\s*:\**\s', re.IGNORECASE)
+
+# Início de assinatura: delimitador padrão "-- " ou despedidas comuns / rodapés de dispositivos
+SIGNATURE_DELIMITER = re.compile(r'^--\s*$')
+SIGNATURE_START = re.compile(
+    r'^\s*(atenciosamente|att\.?|abraços|abs\.?|cordialmente|saudações|obrigad[oa] desde já|'
+    r'best regards|kind regards|regards|best|sincerely|cheers|thanks in advance)\s*[,.!]?\s*$'
+    r'|^\s*(enviado do meu|sent from my)\b',
+    re.IGNORECASE
+)
+# Linhas após a despedida que ainda são consideradas assinatura (nome, cargo, telefone...)
+MAX_SIGNATURE_LINES = 8
+
+# Termos de aviso legal / confidencialidade; um parágrafo só é aviso com MIN_DISCLAIMER_HITS termos distintos
+DISCLAIMER_PATTERN = re.compile(
+    r'(confidencial|confidential|aviso legal|disclaimer|destinatário pretendido|intended recipient|'
+    r'privilegiad|privileged|esta mensagem.{0,80}(destinada|pode conter)|this (e-?mail|message).{0,80}(intended|may contain)|'
+    r'antes de imprimir|before printing)',
+    re.IGNORECASE
+)
+MIN_DISCLAIMER_HITS = 2
+# Parágrafos com menos palavras que isso (saudações, "Obrigado") não contam como conteúdo
+MIN_SUBSTANTIVE_WORDS = 5
+
+OMISSION_MARKER = "\n[... trecho omitido ...]\n"
+
+def strip_quoted_replies(text):
+    """Remove o histórico citado: tudo a partir do cabeçalho da mensagem anterior e as linhas iniciadas por '>'."""
+    lines = text.split('\n')
+    for position, line in enumerate(lines):
+        if position == 0:
+            # Um e-mail encaminhado pode começar pelo cabeçalho; nesse caso o conteúdo útil é o próprio histórico
+            continue
+        if any(pattern.match(line) for pattern in QUOTE_HEADER_PATTERNS):
+            lines = lines[:position]
+            break
+        if OUTLOOK_FROM.match(line) and any(OUTLOOK_SENT.match(next_line) for next_line in lines[position + 1:position + 4]):
+            lines = lines[:position]
+            break
+    return '\n'.join(line for line in lines if not line.lstrip().startswith('>'))
+
+def strip_signature(text):
+    """Remove a assinatura: a partir do delimitador '-- ' ou de uma despedida seguida de poucas linhas."""
+    lines = text.rstrip().split('\n')
+    for position in range(len(lines) - 1, 0, -1):
+        line = lines[position]
+        if SIGNATURE_DELIMITER.match(line) or SIGNATURE_START.match(line):
+            if len(lines) - position - 1 <= MAX_SIGNATURE_LINES:
+                return '\n'.join(lines[:position])
+    return text
+
+def is_disclaimer(paragraph):
+    """Indica se o parágrafo parece um aviso legal: vários termos distintos de confidencialidade/destinatário."""
+    hits = {match.group(0).lower() for match in DISCLAIMER_PATTERN.finditer(paragraph)}
+    return len(hits) >= MIN_DISCLAIMER_HITS
+
+def is_substantive(paragraph):
+    return len(paragraph.split()) >= MIN_SUBSTANTIVE_WORDS
+
+def strip_disclaimers(text):
+    """
+    Remove o bloco de avisos legais do final do e-mail: só parágrafos finais consecutivos que pareçam
+    avisos, nunca o primeiro parágrafo e nunca o último parágrafo com conteúdo.
+    """
+    paragraphs = re.split(r'\n\s*\n', text)
+    cut = len(paragraphs)
+    while cut > 1 and is_disclaimer(paragraphs[cut - 1]):
+        cut -= 1
+    if cut == len(paragraphs) or not any(is_substantive(paragraph) for paragraph in paragraphs[:cut]):
+        return text
+    return '\n\n'.join(paragraphs[:cut])
+
+def collapse_whitespace(text):
+    """Colapsa espaços repetidos e linhas em branco consecutivas."""
+    text = re.sub(r'[ \t\u00a0]+', ' ', text)
+    text = re.sub(r' ?\n ?', '\n', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+def apply_token_budget(text, max_tokens, head_ratio=0.7):
+    """
+    Limita o texto a `max_tokens` tokens estimados mantendo o início (`head_ratio` do orçamento)
+    e o final do e-mail, onde costumam estar o pedido e o fechamento.
+    """
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+
+    # estimate_tokens considera ~4 caracteres por token
+    budget_chars = max(0, max_tokens * 4 - len(OMISSION_MARKER))
+    head_chars = int(budget_chars * head_ratio)
+    tail_chars = budget_chars - head_chars
+
+    head = text[:head_chars]
+    tail = text[len(text) - tail_chars:] if tail_chars else ''
+    # Corta nas fronteiras de palavra para não deixar palavras pela metade
+    if ' ' in head[-40:]:
+        head = head[:head.rindex(' ')]
+    if ' ' in tail[:40]:
+        tail = tail[tail.index(' ') + 1:]
+    return head.rstrip() + OMISSION_MARKER + tail.lstrip()
+
+def prepare_email_for_prompt(text, max_tokens, head_ratio=0.7, cleanup=True):
+    """
+    Limpa o e-mail (histórico citado, assinatura, avisos legais e espaços) e aplica o orçamento de tokens.
+    Retorna (texto preparado, {'original', 'sent', 'saved'}) com as contagens estimadas de tokens.
+    """
+    original_tokens = estimate_tokens(text)
+
+    prepared = text.replace('\r\n', '\n').replace('\r', '\n')
+    if cleanup:
+        prepared = collapse_whitespace(strip_disclaimers(strip_signature(strip_quoted_replies(prepared))))
+        if not prepared:
+            # A limpeza não pode apagar o e-mail inteiro (ex.: só havia texto citado)
+            prepared = collapse_whitespace(text)
+    prepared = apply_token_budget(prepared, max_tokens, head_ratio)
+
+    sent_tokens = estimate_tokens(prepared)
+    return prepared, {
+        'original': original_tokens,
+        'sent': sent_tokens,
+        'saved': max(0, original_tokens - sent_tokens)
+    }
@@ -1,64 +1,101 @@
 import csv
+import zlib
 from io import StringIO
 from flask import Response
 
-def export_history_to_csv(data):
-    
-    if not data:
-        header = ['ID', 'Data/Hora', 'Classificação', 'Pontuação de Confiança', 'Conteúdo do E-mail', 'Resposta Sugerida']
-        output = StringIO()
-        writer = csv.writer(output, delimiter=';')
-        writer.writerow(header)
-        csv_string = output.getvalue()
+# Mapeamento de cabeçalhos de campo (na ordem das colunas do arquivo)
+HEADER_MAPPING = {
+    'id': 'ID',
+    'created_at': 'Data/Hora',
+    'classification': 'Classificação',
+    'confidence_score': 'Pontuação de Confiança',
+    'email_content': 'Conteúdo do E-mail',
+    'suggested_response': 'Resposta Sugerida',
+    'key_topic': 'Tópico Chave',
+    'sentiment': 'Sentimento'
+}
 
-        # Adiciona o BOM (\ufeff) para forçar o Excel a usar UTF-8
+# Colunas exportadas quando nenhuma seleção é informada
+DEFAULT_EXPORT_COLUMNS = ['id', 'created_at', 'classification', 'confidence_score', 'email_content', 'suggested_response']
+
+# Última linha do arquivo quando a leitura do banco falha no meio do download (o status 200 já foi enviado)
+EXPORT_ERROR_MARKER = '# ERRO: exportação interrompida após {count} registro(s); o arquivo está incompleto.'
+
+# Campos de texto longo cujas quebras de linha são removidas para não quebrar a linha do CSV
+MULTILINE_FIELDS = ('email_content', 'suggested_response')
+
+def iter_csv_chunks(rows, columns, chunk_size=500):
+    """
+    Gera o CSV em blocos de `chunk_size` linhas, mantendo em memória apenas o bloco atual.
+    O BOM e o cabeçalho saem logo no primeiro bloco, antes de consultar as linhas.
+    Se a leitura das linhas falhar, o arquivo termina com EXPORT_ERROR_MARKER em vez de parecer completo.
+    """
+    output = StringIO()
+    writer = csv.DictWriter(output, fieldnames=columns, delimiter=';', extrasaction='ignore', quoting=csv.QUOTE_MINIMAL)
+
+    # Adiciona o BOM (\ufeff) para forçar o Excel a usar UTF-8
+    output.write('\ufeff')
+    writer.writerow({column: HEADER_MAPPING[column] for column in columns})
+    yield output.getvalue()
+    output.seek(0)
+    output.truncate(0)
+
+    pending = 0
+    exported = 0
+    try:
+        for row in rows:
+            for field in MULTILINE_FIELDS:
+                if row.get(field):
+                    row[field] = row[field].replace('\n', ' ').replace('\r', ' ')
+            writer.writerow(row)
+            pending += 1
+            exported += 1
+
+            if pending >= chunk_size:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+                pending = 0
+    except Exception as e:
+        print(f"Erro ao exportar histórico após {exported} registro(s): {e}")
+        output.write(EXPORT_ERROR_MARKER.format(count=exported) + '\r\n')
+
+    remaining = output.getvalue()
+    if remaining:
+        yield remaining
+
+def iter_gzip(chunks):
+    """Comprime em gzip, em streaming, os blocos de texto gerados por iter_csv_chunks."""
+    compressor = zlib.compressobj(wbits=31)  # 31 = cabeçalho/rodapé gzip
+    for chunk in chunks:
+        # Z_SYNC_FLUSH envia cada bloco assim que é gerado, em vez de esperar o buffer interno do zlib encher
+        data = compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_history_to_csv(data, columns=None, compress=False):
+    """
+    Gera a resposta de download do histórico em CSV (separado por ';').
+    `data` pode ser uma lista ou um gerador de dicionários: o arquivo é enviado em streaming,
+    com memória constante, e opcionalmente comprimido em gzip (.csv.gz).
+    """
+    columns = columns or DEFAULT_EXPORT_COLUMNS
+    chunks = iter_csv_chunks(data, columns)
+
+    if compress:
         return Response(
-            '\ufeff' + csv_string,
-            mimetype="text/csv",
+            iter_gzip(chunks),
+            mimetype="application/gzip",
             headers={
-                "Content-disposition": "attachment; filename=historico_emails.csv"
+                "Content-disposition": "attachment; filename=historico_analises.csv.gz"
             }
         )
 
-    # Mapeamento de cabeçalhos de campo
-    header_mapping = {
-        'id': 'ID',
-        'created_at': 'Data/Hora',
-        'classification': 'Classificação',
-        'confidence_score': 'Pontuação de Confiança',
-        'email_content': 'Conteúdo do E-mail',
-        'suggested_response': 'Resposta Sugerida'
-    }
-    
-    fieldnames = list(header_mapping.keys())
-    output = StringIO()
-
-    writer = csv.DictWriter(output, fieldnames=fieldnames, delimiter=';', extrasaction='ignore', quoting=csv.QUOTE_MINIMAL)
-
-    writer.writerow(header_mapping)
-    
-    processed_data = []
-    for row in data:
-        new_row = row.copy()
-        # Remove quebras de linha ('\n' e '\r') dos campos de texto longo para evitar quebrar a linha do CSV
-        if new_row.get('email_content'):
-            new_row['email_content'] = new_row['email_content'].replace('\n', ' ').replace('\r', ' ')
-        
-        if new_row.get('suggested_response'):
-            new_row['suggested_response'] = new_row['suggested_response'].replace('\n', ' ').replace('\r', ' ')
-            
-        processed_data.append(new_row)
-        
-    writer.writerows(processed_data)
-    
-    csv_string = output.getvalue()
-    # Adiciona o BOM (\ufeff) no início da string
-    response_content = '\ufeff' + csv_string
-    
     return Response(
-        response_content,
+        (chunk.encode('utf-8') for chunk in chunks),
         mimetype="text/csv",
         headers={
             "Content-disposition": "attachment; filename=historico_analises.csv"
         }
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,105 @@
+import os
+import threading
+
+from database import create_job, claim_job_items, complete_job_item, has_unfinished_job_items, initialize_db
+
+class JobQueue:
+    """
+    Processa em segundo plano os jobs de classificação gravados no SQLite. Cada worker reserva
+    um lote de itens pendentes, classifica-os com `process_items` e grava cada resultado assim
+    que ele fica pronto. Como todo o estado está no banco, itens interrompidos por um reinício
+    voltam para a fila quando a reserva vence e o job continua de onde parou.
+
+    `process_items(items)` recebe uma lista de {'content', 'filename'} ou {'pdf_data', 'filename'} (PDF ainda
+    não extraído) e gera (índice, resultado);
+    é injetada pelo app para que este módulo não dependa do pipeline de classificação.
+    """
+
+    def __init__(self, process_items, num_workers=1, claim_size=32, poll_interval=2.0,
+                 lease_seconds=600.0, max_attempts=3):
+        self.process_items = process_items
+        self.num_workers = max(1, num_workers)
+        self.claim_size = max(1, claim_size)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._threads = []
+        self._pid = None
+        self._wake_up = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Inicia os workers deste processo (as threads não sobrevivem a um fork, então são recriadas por processo)."""
+        if self._threads and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'classification-job-{number}', daemon=True)
+                for number in range(self.num_workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=5.0):
+        """Pede para os workers pararem após o lote atual; itens não concluídos voltam à fila quando a reserva vencer."""
+        self._stopping.set()
+        self._wake_up.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, items):
+        """Grava um novo job e acorda os workers; retorna o id do job."""
+        job_id = create_job(items)
+        self.start()
+        self._wake_up.set()
+        return job_id
+
+    def run_forever(self):
+        """Executa os workers em primeiro plano (ex.: em um processo dedicado) até ser interrompido."""
+        self.start()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                for thread in self._threads:
+                    thread.join(1.0)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def pending(self):
+        """Indica se há itens pendentes ou reservados (os workers os retomam quando a reserva vencer)."""
+        return has_unfinished_job_items()
+
+    def _run(self):
+        initialize_db()
+        while not self._stopping.is_set():
+            try:
+                processed = self._process_batch()
+            except Exception as e:
+                # Os itens reservados voltam para a fila quando a reserva vencer
+                print(f"Erro no worker de jobs: {e}")
+                processed = 0
+
+            if not processed:
+                # Fila vazia: espera um novo job (ou o intervalo, para retomar reservas vencidas de outros processos)
+                self._wake_up.wait(self.poll_interval)
+                self._wake_up.clear()
+
+    def _process_batch(self):
+        token, claimed = claim_job_items(self.claim_size, self.lease_seconds, self.max_attempts)
+        if not claimed:
+            return 0
+
+        items = [
+            {'pdf_data': pdf_data, 'filename': filename} if pdf_data is not None else {'content': content, 'filename': filename}
+            for _, _, filename, content, pdf_data in claimed
+        ]
+        for position, result in self.process_items(items):
+            job_id, item_index = claimed[position][:2]
+            if not complete_job_item(job_id, item_index, result, token):
+                print(f"Resultado descartado: o item {item_index} do job {job_id} foi reservado por outro worker.")
+        return len(claimed)
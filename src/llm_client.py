@@ -0,0 +1,247 @@
+import random
+import threading
+import time
+
+from packing import estimate_tokens
+
+# Status HTTP e nomes de exceções (google.api_core / rede) que indicam falha transitória do serviço
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTION_NAMES = {
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'InternalServerError',
+    'DeadlineExceeded', 'GatewayTimeout', 'BadGateway', 'RetryError',
+    'TimeoutError', 'ConnectionError', 'ConnectionResetError', 'ReadTimeout', 'ConnectTimeout',
+}
+
+class LLMClientError(Exception):
+    """Erro base do cliente da IA."""
+
+class CircuitOpenError(LLMClientError):
+    """O circuito está aberto: o serviço da IA está degradado e a chamada nem foi feita."""
+
+    def __init__(self, retry_in):
+        super().__init__(f"Serviço da IA indisponível; nova tentativa em {retry_in:.0f}s.")
+        self.retry_in = retry_in
+
+class LLMDeadlineExceeded(LLMClientError):
+    """O prazo da chamada terminou (esperando o limite de taxa, o backoff ou a própria resposta)."""
+
+def is_retryable(error):
+    """Indica se o erro é transitório (limite de taxa, indisponibilidade, timeout) e vale uma nova tentativa."""
+    code = getattr(error, 'code', None)
+    try:
+        if int(code) in RETRYABLE_STATUS_CODES:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return any(cls.__name__ in RETRYABLE_EXCEPTION_NAMES for cls in type(error).__mro__)
+
+def requests_sent(error):
+    """
+    Quantas requisições chegaram ao modelo na chamada de LLMClient.generate_content que terminou com `error`
+    (0 com o circuito aberto ou o prazo esgotado na espera do limite de taxa). Para outros erros, assume 1.
+    """
+    return getattr(error, 'requests_sent', 1)
+
+class TokenBucket:
+    """
+    Balde de fichas reabastecido continuamente a `rate_per_minute` fichas por minuto.
+    As fichas são reservadas na hora (o saldo pode ficar negativo) e quem reservou espera
+    a sua vez fora do lock, o que mantém a ordem de chegada entre as threads.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.clock = clock
+        self._tokens = float(self.capacity)
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount, deadline):
+        """Reserva `amount` fichas e retorna quantos segundos esperar; falha se a espera passar do prazo."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            wait = max(0.0, (amount - self._tokens) / self.rate)
+            if now + wait > deadline:
+                raise LLMDeadlineExceeded(f"Limite de taxa: a espera de {wait:.1f}s ultrapassa o prazo da chamada.")
+            self._tokens -= amount
+            return wait
+
+    def refund(self, amount):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + min(amount, self.capacity))
+
+class CircuitBreaker:
+    """
+    Disjuntor clássico: após `failure_threshold` falhas transitórias seguidas o circuito abre e
+    as chamadas falham na hora por `reset_timeout` segundos; depois, uma única chamada de teste
+    (meio aberto) decide se ele fecha de novo ou volta a abrir.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Autoriza a chamada ou levanta CircuitOpenError."""
+        with self._lock:
+            if self.state == self.OPEN:
+                elapsed = self.clock() - self._opened_at
+                if elapsed < self.reset_timeout:
+                    raise CircuitOpenError(self.reset_timeout - elapsed)
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError(0)
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"Circuito da IA aberto após {self._failures} falha(s) seguida(s).")
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        """Libera a chamada de teste que terminou sem indicar nada sobre a saúde do serviço."""
+        with self._lock:
+            self._probe_in_flight = False
+
+class LLMClient:
+    """
+    Envolve o modelo Gemini (ou um modelo falso com o mesmo `generate_content`) com limite de
+    requisições e de tokens por minuto, novas tentativas com backoff exponencial e jitter em erros
+    transitórios, prazo total por chamada e disjuntor. `get_model` é chamado a cada requisição, para
+    que o modelo possa ser configurado sob demanda (ou trocado nos testes).
+    """
+
+    def __init__(self, get_model, requests_per_minute=0, tokens_per_minute=0, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, call_timeout=60.0, breaker=None,
+                 clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.get_model = get_model
+        self.request_bucket = TokenBucket(requests_per_minute, clock=clock) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute, clock=clock) if tokens_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.call_timeout = call_timeout
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.stats = {'calls': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0, 'throttled_seconds': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['throttled_seconds'] = round(stats['throttled_seconds'], 3)
+        stats['circuit_state'] = self.breaker.state
+        return stats
+
+    def backoff_delay(self, attempt):
+        """Backoff exponencial com jitter completo: sorteado entre 0 e base * 2^(tentativa - 1), limitado a backoff_max."""
+        return self.rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _throttle(self, estimated_tokens, deadline):
+        """Espera a vez nos baldes de requisições e de tokens (sem ultrapassar o prazo)."""
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = self.request_bucket.reserve(1, deadline)
+        if self.token_bucket is not None:
+            try:
+                wait = max(wait, self.token_bucket.reserve(estimated_tokens, deadline))
+            except LLMDeadlineExceeded:
+                if self.request_bucket is not None:
+                    self.request_bucket.refund(1)
+                raise
+        if wait > 0:
+            self._count('throttled_seconds', wait)
+            self.sleep(wait)
+
+    def generate_content(self, prompt, timeout=None, expected_output_tokens=400):
+        """
+        Chama `generate_content` do modelo respeitando os limites, o prazo e o disjuntor.
+        Levanta CircuitOpenError, LLMDeadlineExceeded ou o último erro do modelo; o erro leva em
+        `requests_sent` quantas requisições foram de fato enviadas (ver requests_sent).
+        """
+        deadline = self.clock() + (timeout or self.call_timeout)
+        estimated_tokens = estimate_tokens(prompt) + expected_output_tokens
+        attempt = 0
+        sent = 0
+
+        try:
+            while True:
+                try:
+                    self.breaker.before_call()
+                except CircuitOpenError:
+                    self._count('short_circuited')
+                    raise
+
+                try:
+                    self._throttle(estimated_tokens, deadline)
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        raise LLMDeadlineExceeded("Prazo da chamada à IA esgotado.")
+
+                    self._count('calls')
+                    sent += 1
+                    response = self.get_model().generate_content(prompt, request_options={'timeout': remaining})
+                except LLMDeadlineExceeded:
+                    self.breaker.release_probe()
+                    raise
+                except Exception as e:
+                    if not is_retryable(e):
+                        # Erros do próprio pedido (conteúdo bloqueado, argumento inválido...) não dizem nada sobre o serviço
+                        self.breaker.release_probe()
+                        raise
+
+                    self._count('failures')
+                    self.breaker.record_failure()
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        raise
+
+                    delay = self.backoff_delay(attempt)
+                    if self.clock() + delay >= deadline:
+                        raise LLMDeadlineExceeded(f"Prazo da chamada à IA esgotado após {attempt} tentativa(s): {e}") from e
+                    print(f"Erro transitório da IA ({type(e).__name__}); nova tentativa em {delay:.2f}s.")
+                    self._count('retries')
+                    self.sleep(delay)
+                    continue
+
+                self.breaker.record_success()
+                return response
+        except Exception as e:
+            # Permite ao chamador contar apenas as chamadas que chegaram ao modelo (ver requests_sent)
+            e.requests_sent = sent
+            raise
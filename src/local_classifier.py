@@ -0,0 +1,172 @@
+import json
+import math
+import os
+import random
+from collections import Counter
+
+# Classes suportadas pelo classificador local (mesmas do prompt do Gemini)
+POSITIVE_LABEL = 'Produtivo'
+NEGATIVE_LABEL = 'Improdutivo'
+
+# Respostas genéricas usadas quando o e-mail é resolvido localmente, sem passar pela IA
+LOCAL_RESPONSES = {
+    'pt': {
+        POSITIVE_LABEL: "Olá! Recebemos sua mensagem e retornaremos em breve com as informações solicitadas.",
+        NEGATIVE_LABEL: "Obrigado pela mensagem!"
+    },
+    'en': {
+        POSITIVE_LABEL: "Hello! We have received your message and will get back to you shortly with the requested information.",
+        NEGATIVE_LABEL: "Thank you for your message!"
+    }
+}
+
+_ENGLISH_MARKERS = {'the', 'and', 'you', 'your', 'please', 'thank', 'thanks', 'would', 'could', 'regards', 'dear', 'hello', 'with', 'for', 'is'}
+_PORTUGUESE_MARKERS = {'que', 'não', 'você', 'obrigado', 'obrigada', 'para', 'com', 'por', 'olá', 'prezado', 'prezada', 'atenciosamente', 'uma', 'é'}
+
+def guess_language(text):
+    """Heurística simples para escolher o idioma da resposta genérica ('pt' ou 'en')."""
+    words = text.lower().split()
+    english = sum(1 for word in words if word in _ENGLISH_MARKERS)
+    portuguese = sum(1 for word in words if word in _PORTUGUESE_MARKERS)
+    return 'en' if english > portuguese else 'pt'
+
+def _sigmoid(value):
+    if value >= 0:
+        return 1.0 / (1.0 + math.exp(-value))
+    exp_value = math.exp(value)
+    return exp_value / (1.0 + exp_value)
+
+class LocalClassifier:
+    """
+    Classificador leve Produtivo/Improdutivo: TF-IDF sobre os tokens já pré-processados
+    (minúsculas, sem stop words, radicais RSLP) + regressão logística com regularização L2.
+    Implementado em Python puro para não adicionar dependências pesadas ao deploy serverless.
+    """
+
+    def __init__(self, idf=None, weights=None, bias=0.0):
+        self.idf = idf or {}
+        self.weights = weights or {}
+        self.bias = bias
+
+    def _vectorize(self, tokens):
+        counts = Counter(token for token in tokens if token in self.idf)
+        vector = {token: count * self.idf[token] for token, count in counts.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if norm == 0:
+            return {}
+        return {token: value / norm for token, value in vector.items()}
+
+    @classmethod
+    def train(cls, documents, labels, max_epochs=10, learning_rate=2.0, l2=1e-4, min_df=1, tolerance=1e-3, seed=42):
+        """
+        Treina o modelo; `documents` são listas de tokens e `labels` são 'Produtivo'/'Improdutivo'.
+        Usa gradiente descendente estocástico (poucas passadas sobre os exemplos, em ordem aleatória) e
+        para antes de `max_epochs` quando a perda média da passada melhora menos que `tolerance`.
+        """
+        document_frequency = Counter()
+        for tokens in documents:
+            document_frequency.update(set(tokens))
+
+        total = len(documents)
+        idf = {
+            token: math.log((1 + total) / (1 + df)) + 1.0
+            for token, df in document_frequency.items()
+            if df >= min_df
+        }
+
+        model = cls(idf=idf)
+        vectors = [model._vectorize(tokens) for tokens in documents]
+        targets = [1.0 if label == POSITIVE_LABEL else 0.0 for label in labels]
+
+        # Cada exemplo atualiza só os pesos dos seus tokens (a regularização L2 também é aplicada só a eles)
+        weights = {}
+        bias = 0.0
+        order = list(range(total))
+        rng = random.Random(seed)
+        previous_loss = None
+        for epoch in range(max_epochs):
+            rng.shuffle(order)
+            step = learning_rate / (1.0 + epoch)
+            loss = 0.0
+            for position in order:
+                vector, target = vectors[position], targets[position]
+                score = bias + sum(weights.get(token, 0.0) * value for token, value in vector.items())
+                probability = _sigmoid(score)
+                loss -= math.log(max(probability if target else 1.0 - probability, 1e-12))
+                error = probability - target
+                bias -= step * error
+                for token, value in vector.items():
+                    weight = weights.get(token, 0.0)
+                    weights[token] = weight - step * (error * value + l2 * weight)
+
+            loss /= total
+            if previous_loss is not None and previous_loss - loss < tolerance:
+                break
+            previous_loss = loss
+
+        model.weights = weights
+        model.bias = bias
+        return model
+
+    def predict(self, tokens):
+        """Retorna (classificação, confiança) para uma lista de tokens pré-processados."""
+        vector = self._vectorize(tokens)
+        score = self.bias + sum(self.weights.get(token, 0.0) * value for token, value in vector.items())
+        probability = _sigmoid(score)
+        if probability >= 0.5:
+            return POSITIVE_LABEL, probability
+        return NEGATIVE_LABEL, 1.0 - probability
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'idf': self.idf, 'weights': self.weights, 'bias': self.bias}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(idf=data['idf'], weights=data['weights'], bias=data['bias'])
+
+def evaluate(documents, labels, threshold, holdout_ratio=0.2, seed=42):
+    """
+    Avalia o classificador com uma divisão treino/validação e retorna a precisão geral,
+    a fração do tráfego que seria respondida localmente no limiar informado e a precisão nessa fração.
+    """
+    indexes = list(range(len(documents)))
+    random.Random(seed).shuffle(indexes)
+    holdout_size = max(1, int(len(indexes) * holdout_ratio))
+    holdout, training = indexes[:holdout_size], indexes[holdout_size:]
+
+    model = LocalClassifier.train([documents[i] for i in training], [labels[i] for i in training])
+
+    correct = 0
+    absorbed = 0
+    absorbed_correct = 0
+    for i in holdout:
+        label, confidence = model.predict(documents[i])
+        correct += label == labels[i]
+        if confidence >= threshold:
+            absorbed += 1
+            absorbed_correct += label == labels[i]
+
+    return {
+        'holdout_size': len(holdout),
+        'accuracy': correct / len(holdout),
+        'absorbed_ratio': absorbed / len(holdout),
+        'absorbed_accuracy': absorbed_correct / absorbed if absorbed else None
+    }
+
+def iter_labeled_corpus(corpus_dir):
+    """
+    Percorre a pasta Test-Email e gera (caminho, rótulo) para cada PDF, usando o nome da
+    pasta (Produtivo/Improdutivo) ou o prefixo do arquivo (productive_/unproductive_).
+    """
+    for root, _, filenames in os.walk(corpus_dir):
+        folder = os.path.basename(root)
+        for filename in sorted(filenames):
+            if not filename.endswith('.pdf'):
+                continue
+            if folder == POSITIVE_LABEL or filename.startswith('productive_'):
+                yield os.path.join(root, filename), POSITIVE_LABEL
+            elif folder == NEGATIVE_LABEL or filename.startswith('unproductive_'):
+                yield os.path.join(root, filename), NEGATIVE_LABEL
@@ -0,0 +1,189 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites (segundos) dos histogramas de latência
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in list(zip(labelnames, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class Counter:
+    """Contador monotônico, com rótulos opcionais, no formato do Prometheus."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self.labelnames:
+            # Contador sem rótulos é exposto mesmo antes do primeiro incremento
+            values = {(): 0}
+        for key, value in sorted(values.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Histogram:
+    """Histograma cumulativo (buckets, soma e contagem), com rótulos opcionais, no formato do Prometheus."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}  # rótulos -> [contagens por bucket, soma, contagem]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][position] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()}
+        for key, (bucket_counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def generate_latest():
+    """Texto de exposição (formato 0.0.4) de todas as métricas registradas neste processo."""
+    lines = []
+    for metric in REGISTRY:
+        metric_name = f"{metric.name}_total" if metric.type == 'counter' else metric.name
+        lines.append(f"# HELP {metric_name} {metric.documentation}")
+        lines.append(f"# TYPE {metric_name} {metric.type}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Métricas da aplicação
+STAGE_SECONDS = register(Histogram(
+    'autou_stage_duration_seconds', 'Duração de cada etapa do processamento de um item ou requisição.', ['stage']
+))
+HTTP_REQUEST_SECONDS = register(Histogram(
+    'autou_http_request_duration_seconds', 'Duração das requisições HTTP até a resposta ser devolvida.',
+    ['endpoint', 'method', 'status']
+))
+ITEMS = register(Counter(
+    'autou_items', 'E-mails classificados, por origem do resultado (llm, cache, local, near_duplicate).', ['classified_by']
+))
+ITEM_ERRORS = register(Counter('autou_item_errors', 'E-mails que terminaram com erro.'))
+CACHE_LOOKUPS = register(Counter(
+    'autou_cache_lookups', 'Consultas ao cache de classificações, por resultado (hit/miss) e camada.', ['result', 'layer']
+))
+LLM_REQUESTS = register(Counter(
+    'autou_llm_requests',
+    'Chamadas à IA, por tipo (single/packed) e resultado (success/error; short_circuited/not_sent quando nada foi enviado).',
+    ['kind', 'outcome']
+))
+LLM_TOKENS = register(Counter(
+    'autou_llm_tokens', 'Tokens consumidos na IA segundo os metadados da resposta (prompt, candidates, total).', ['type']
+))
+
+class RequestTimings:
+    """Tempo acumulado por etapa em uma requisição (somado entre as threads do lote), para o Server-Timing."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            total, count = self._stages.get(stage, (0.0, 0))
+            self._stages[stage] = (total + seconds, count + 1)
+
+    def server_timing_header(self):
+        with self._lock:
+            stages = dict(self._stages)
+        entries = [
+            f'{stage};dur={total * 1000:.1f};desc="{count}x"'
+            for stage, (total, count) in stages.items()
+        ]
+        entries.append(f'total;dur={(time.perf_counter() - self.started_at) * 1000:.1f}')
+        return ', '.join(entries)
+
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+def start_request_timings():
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+def get_request_timings():
+    return _request_timings.get()
+
+def finish_request_timings():
+    _request_timings.set(None)
+
+@contextmanager
+def timed(stage):
+    """Mede a etapa: registra no histograma e, se houver uma requisição em andamento, no seu Server-Timing."""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started_at
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
+
+def submit_in_context(executor, function, *args):
+    """executor.submit preservando o contexto atual (a requisição), para as etapas medidas na thread contarem nela."""
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+def record_llm_usage(response):
+    """Soma os tokens informados em response.usage_metadata (quando o modelo os fornece)."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for token_type, attribute in (('prompt', 'prompt_token_count'), ('candidates', 'candidates_token_count'),
+                                  ('total', 'total_token_count')):
+        value = getattr(usage, attribute, None)
+        if value:
+            LLM_TOKENS.inc(value, type=token_type)
@@ -0,0 +1,84 @@
+import datetime
+import hashlib
+import math
+import random
+import re
+import struct
+
+from database import LSH_BANDS, LSH_ROWS, get_near_duplicate_candidates
+
+# Número de funções de hash da assinatura (uma faixa LSH agrupa LSH_ROWS delas)
+MINHASH_PERMUTATIONS = LSH_BANDS * LSH_ROWS
+# Tamanho dos shingles (sequências de tokens); 2 tolera bem a troca de saudação, data ou número do chamado
+SHINGLE_SIZE = 2
+# E-mails com menos shingles que isso são curtos demais para uma comparação confiável
+MIN_SHINGLES = 5
+# Desvios-padrão da estimativa descontados do limiar: um par com similaridade real igual ao limiar é
+# encontrado ~95% das vezes (sem a margem, só ~50%, já que a estimativa erra para os dois lados)
+THRESHOLD_MARGIN_Z = 1.645
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Coeficientes fixos (semente constante): as assinaturas precisam ser as mesmas entre processos e reinícios
+_random = random.Random(20240601)
+_PERMUTATIONS = [
+    (_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+_SIGNATURE_FORMAT = f'<{MINHASH_PERMUTATIONS}I'
+
+def make_shingles(tokens, size=SHINGLE_SIZE):
+    """Conjunto de shingles dos tokens pré-processados; números viram '#' (datas, chamados, valores)."""
+    tokens = [re.sub(r'\d+', '#', token) for token in tokens]
+    if len(tokens) < size:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+def minhash_signature(tokens):
+    """Assinatura MinHash (bytes) dos tokens, ou None se o texto for curto demais para comparar."""
+    shingles = make_shingles(tokens)
+    if len(shingles) < MIN_SHINGLES:
+        return None
+
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+        for shingle in shingles
+    ]
+    signature = [
+        min((a * value + b) % _MERSENNE_PRIME for value in hashes) & _MAX_HASH
+        for a, b in _PERMUTATIONS
+    ]
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+def estimate_similarity(signature, other):
+    """Similaridade de Jaccard estimada: fração das posições iguais nas duas assinaturas."""
+    if len(signature) != len(other):
+        # Assinatura de outro tamanho (gravada antes de uma mudança de MINHASH_PERMUTATIONS)
+        return 0.0
+    values = struct.unpack(_SIGNATURE_FORMAT, signature)
+    other_values = struct.unpack(_SIGNATURE_FORMAT, other)
+    return sum(1 for a, b in zip(values, other_values) if a == b) / MINHASH_PERMUTATIONS
+
+def match_threshold(threshold, permutations=MINHASH_PERMUTATIONS, z=THRESHOLD_MARGIN_Z):
+    """
+    Limiar aplicado à similaridade estimada para que pares com similaridade real `threshold` não se percam
+    no erro da estimativa: `threshold` menos `z` erros-padrão (sqrt(J(1-J)/permutações)).
+    """
+    return threshold - z * math.sqrt(threshold * (1.0 - threshold) / permutations)
+
+def find_near_duplicate(signature, threshold, max_age_days=30):
+    """
+    Procura, pelo índice LSH, o resultado da IA mais parecido com a assinatura informada.
+    `threshold` é a similaridade de Jaccard real desejada; retorna (registro, similaridade estimada) se a
+    estimativa atingir match_threshold(threshold), senão (None, 0.0).
+    """
+    min_created_at = (datetime.datetime.now() - datetime.timedelta(days=max_age_days)).isoformat()
+    best, best_similarity = None, 0.0
+    for candidate in get_near_duplicate_candidates(signature, min_created_at):
+        similarity = estimate_similarity(signature, candidate['minhash'])
+        if similarity > best_similarity:
+            best, best_similarity = candidate, similarity
+
+    if best is None or best_similarity < match_threshold(threshold):
+        return None, 0.0
+    return best, best_similarity
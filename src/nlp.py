@@ -0,0 +1,109 @@
+import os
+import re
+import threading
+from functools import lru_cache
+
+NLTK_DATA_DIR = '/tmp/nltk_data'
+
+# Recursos do NLTK usados pelo pré-processamento (nome para download, caminho para busca)
+NLTK_RESOURCES = (
+    ('stopwords', 'corpora/stopwords'),
+    ('rslp', 'stemmers/rslp'),
+)
+
+def setup_nltk_data():
+    """Garante que os dados do NLTK necessários para Português estejam em /tmp."""
+    import nltk
+
+    os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.append(NLTK_DATA_DIR)
+
+    for package, resource_path in NLTK_RESOURCES:
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            print(f"Baixando dados do NLTK ({package}) para /tmp...")
+            try:
+                nltk.download(package, download_dir=NLTK_DATA_DIR, quiet=True)
+            except Exception as e:
+                print(f"Erro ao baixar dados do NLTK: {e}")
+
+class TextPreprocessor:
+    """
+    Pipeline de Limpeza, Tokenização, Remoção de Stop Words e Stemming (RSLP) em Português.
+    Os recursos do NLTK são carregados uma única vez, na primeira utilização (ou em `warm_up`),
+    e os radicais são memorizados em um LRU por token.
+    """
+
+    def __init__(self, language='portuguese', stem_cache_size=50000):
+        self.language = language
+        self.stem_cache_size = stem_cache_size
+        self._stop_words = None
+        self._stem = None
+        self._tokenize = None
+        self._load_error = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._stem is not None:
+            return
+        with self._lock:
+            if self._stem is not None:
+                return
+            if self._load_error is not None:
+                # Não tenta baixar de novo a cada chamada se os dados já falharam neste processo
+                raise LookupError(f"Dados do NLTK indisponíveis: {self._load_error}")
+
+            setup_nltk_data()
+            import nltk
+            from nltk.corpus import stopwords
+            from nltk.stem import RSLPStemmer
+
+            try:
+                self._stop_words = frozenset(stopwords.words(self.language))
+                stemmer = RSLPStemmer()
+            except LookupError as e:
+                # A mensagem do NLTK vem emoldurada por linhas de asteriscos; guarda só a primeira linha útil
+                self._load_error = next(
+                    (line.strip() for line in str(e).splitlines() if line.strip().strip('*')),
+                    'recurso não encontrado'
+                )
+                raise
+            self._tokenize = nltk.word_tokenize
+            self._stem = lru_cache(maxsize=self.stem_cache_size)(stemmer.stem)
+
+    def warm_up(self):
+        """Carrega os recursos antecipadamente (ex.: no início do processo) para tirar o custo da primeira requisição."""
+        self._ensure_loaded()
+
+    def preprocess(self, text):
+        self._ensure_loaded()
+
+        # 1. Limpeza básica (converter para minúsculas e remover pontuação)
+        text = text.lower()
+        text = re.sub(r'[^a-z0-9\s]', '', text)
+
+        # 2. Tokenização (sem pontuação não há frases a separar, então o Punkt é dispensado)
+        tokens = self._tokenize(text, language=self.language, preserve_line=True)
+
+        # 3. Remoção de Stop Words
+        stop_words = self._stop_words
+        filtered_tokens = [word for word in tokens if word not in stop_words and word.strip()]
+
+        # 4. Stemming (Redução ao radical - RSLP para Português), memorizado por token
+        stem = self._stem
+        return ' '.join(stem(word) for word in filtered_tokens)
+
+    def stem_cache_info(self):
+        return self._stem.cache_info() if self._stem is not None else None
+
+# Instância compartilhada pelo processo
+text_preprocessor = TextPreprocessor()
+
+def preprocess_text_nlp(text):
+    """
+    Executa Limpeza, Tokenização, Remoção de Stop Words e Stemming (RSLP) em Português.
+    Retorna o texto pré-processado como uma string, separado por espaço.
+    """
+    return text_preprocessor.preprocess(text)
@@ -0,0 +1,112 @@
+import json
+import math
+
+# Classes e tons aceitos na resposta agrupada; entradas fora disso são reclassificadas individualmente
+VALID_CLASSIFICATIONS = ('Produtivo', 'Improdutivo')
+VALID_SENTIMENTS = ('Positivo', 'Negativo', 'Neutro')
+
+def estimate_tokens(text):
+    """Estimativa barata do número de tokens (~4 caracteres por token), suficiente para montar os lotes."""
+    return math.ceil(len(text) / 4)
+
+def pack_items(entries, max_items, max_tokens, max_item_tokens):
+    """
+    Agrupa itens consecutivos `(índice, item)` em lotes de até `max_items` e-mails somando no máximo
+    `max_tokens` tokens estimados. Itens longos (acima de `max_item_tokens`) e itens com erro seguem sozinhos.
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+
+    for index, item in entries:
+        tokens = estimate_tokens(item['content']) if 'error' not in item else None
+        if tokens is None or tokens > max_item_tokens:
+            groups.append([(index, item)])
+            continue
+
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append((index, item))
+        current_tokens += tokens
+
+    if current:
+        groups.append(current)
+    return groups
+
+def build_packed_prompt(template, contents):
+    """Monta o prompt agrupado, identificando cada e-mail pela sua posição (1, 2, ...)."""
+    emails = "\n".join(
+        f"=== E-mail id={number} ===\n{content}\n=== Fim do e-mail id={number} ==="
+        for number, content in enumerate(contents, start=1)
+    )
+    return template.format(emails=emails, count=len(contents))
+
+def validate_packed_entry(entry):
+    """Valida uma entrada da resposta agrupada; retorna os campos normalizados ou None se estiver malformada."""
+    if not isinstance(entry, dict):
+        return None
+
+    classification = entry.get('classification')
+    suggested_response = entry.get('suggested_response')
+    if classification not in VALID_CLASSIFICATIONS:
+        return None
+    if not isinstance(suggested_response, str) or not suggested_response.strip():
+        return None
+
+    try:
+        confidence_score = float(entry.get('confidence_score'))
+    except (TypeError, ValueError):
+        return None
+    if not 0.0 <= confidence_score <= 1.0:
+        return None
+
+    key_topic = entry.get('key_topic')
+    sentiment = entry.get('sentiment')
+    return {
+        'classification': classification,
+        'confidence_score': confidence_score,
+        'key_topic': key_topic if isinstance(key_topic, str) and key_topic.strip() else 'N/A',
+        'sentiment': sentiment if sentiment in VALID_SENTIMENTS else 'N/A',
+        'suggested_response': suggested_response
+    }
+
+def parse_packed_response(text, count):
+    """
+    Interpreta a resposta agrupada (array JSON de objetos com "id") e retorna {id: campos validados}.
+    Ids ausentes, repetidos, fora do intervalo 1..count ou com campos inválidos ficam de fora.
+    """
+    cleaned = text.strip().replace('```json', '').replace('```', '')
+    try:
+        data = json.loads(cleaned)
+    except json.JSONDecodeError:
+        return {}
+
+    # Aceita também um objeto envolvendo o array (ex.: {"results": [...]})
+    if isinstance(data, dict):
+        data = next((value for value in data.values() if isinstance(value, list)), [])
+    if not isinstance(data, list):
+        return {}
+
+    parsed = {}
+    seen = set()
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            number = int(entry.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= number <= count:
+            continue
+        if number in seen:
+            # Duas respostas para o mesmo e-mail: não dá para saber qual é a certa
+            parsed.pop(number, None)
+            continue
+        seen.add(number)
+
+        result = validate_packed_entry(entry)
+        if result is not None:
+            parsed[number] = result
+    return parsed
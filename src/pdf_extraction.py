@@ -0,0 +1,292 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, CancelledError, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import pypdf
+
+# Orçamentos por arquivo: páginas lidas, caracteres coletados e tempo de extração (segundos)
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "20000"))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "20"))
+# Espera máxima (segundos), além das ondas do próprio lote, de um arquivo na fila do pool ocupado por outras requisições
+PDF_QUEUE_TIMEOUT = float(os.getenv("PDF_QUEUE_TIMEOUT", "60"))
+
+# Modo de execução: 'process' (paralelo e isolado), 'thread' ou 'inline' (serial, sem pool)
+PDF_EXTRACTION_MODE = os.getenv("PDF_EXTRACTION_MODE", "process")
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+class PdfExtractionTimeout(Exception):
+    """A extração de um PDF excedeu o tempo limite."""
+
+def extract_pdf_text(data, max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS):
+    """
+    Extrai o texto de um PDF (bytes) página a página, parando assim que atingir `max_pages`
+    páginas ou `max_chars` caracteres, o suficiente para a classificação.
+    Retorna um dicionário com o texto e quantas páginas foram lidas.
+    """
+    reader = pypdf.PdfReader(BytesIO(data))
+    total_pages = len(reader.pages)
+
+    parts = []
+    collected = 0
+    pages_read = 0
+    for page in reader.pages:
+        if pages_read >= max_pages or collected >= max_chars:
+            break
+        text = page.extract_text() or ""
+        parts.append(text)
+        collected += len(text)
+        pages_read += 1
+
+    text = "".join(parts)
+    return {
+        'text': text[:max_chars].strip(),
+        'pages_read': pages_read,
+        'total_pages': total_pages,
+        'truncated': pages_read < total_pages or len(text) > max_chars
+    }
+
+def lost_in_broken_pool(future):
+    """Indica se o arquivo não foi extraído por causa da queda do pool (ainda na fila, cancelado ou interrompido)."""
+    if not future.done():
+        return True
+    return future.cancelled() or isinstance(future.exception(), BrokenProcessPool)
+
+# Fila pela qual cada worker informa quando começou a extrair um arquivo (definida em _init_worker)
+_start_reports = None
+
+def _init_worker(start_reports):
+    global _start_reports
+    _start_reports = start_reports
+
+def _extract_reporting_start(task_id, data, max_pages, max_chars):
+    """
+    Executada no worker: informa o início real da extração e extrai o texto. O prazo de cada arquivo conta a
+    partir daí, e não do envio ao pool, em que ele pode esperar atrás dos arquivos de outras requisições.
+    time.monotonic() usa o mesmo relógio em todos os processos da máquina.
+    """
+    if _start_reports is not None:
+        _start_reports.put((task_id, time.monotonic()))
+    return extract_pdf_text(data, max_pages, max_chars)
+
+class PdfExtractor:
+    """
+    Executa a extração de vários PDFs em um pool compartilhado pelo processo. No modo 'process'
+    o parsing roda em processos separados: é paralelo de verdade (sem GIL) e um arquivo patológico
+    que estoura o tempo limite tem o pool derrubado e recriado, sem travar o servidor; os arquivos de
+    outros lotes que estavam no pool derrubado são reenviados ao novo pool.
+    O tempo limite de cada arquivo conta a partir do momento em que um worker começa a extraí-lo:
+    esperar na fila atrás de outros lotes não derruba o pool (a espera tem o seu próprio limite, `queue_timeout`).
+    Se o ambiente não suportar multiprocessing (ex.: sem /dev/shm), cai para o modo 'thread'.
+    """
+
+    def __init__(self, mode=PDF_EXTRACTION_MODE, max_workers=PDF_MAX_WORKERS, timeout=PDF_TIMEOUT,
+                 max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS, queue_timeout=PDF_QUEUE_TIMEOUT):
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self._executor = None
+        self._start_reports = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._watched = set()  # tarefas aguardadas por alguma chamada de extract_many
+        self._started = {}  # tarefa -> início real da extração (time.monotonic)
+        self._started_lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                return self._executor
+
+            if self.mode == 'process':
+                try:
+                    # 'spawn' evita herdar o estado das threads do servidor ao criar os processos
+                    context = multiprocessing.get_context('spawn')
+                    # Uma fila por pool: um processo encerrado no meio de um put pode deixá-la inutilizável
+                    start_reports = context.Queue()
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=context,
+                        initializer=_init_worker, initargs=(start_reports,)
+                    )
+                    self._start_reports = start_reports
+                except (OSError, NotImplementedError, ImportError) as e:
+                    print(f"Pool de processos indisponível ({e}); usando threads para extrair PDFs.")
+                    self.mode = 'thread'
+
+            if self.mode == 'thread':
+                start_reports = queue.SimpleQueue()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='pdf',
+                    initializer=_init_worker, initargs=(start_reports,)
+                )
+                self._start_reports = start_reports
+
+            self._pid = os.getpid()
+            return self._executor
+
+    def _reset_executor(self, executor):
+        """Derruba o pool (encerrando processos presos em PDFs patológicos) para ser recriado."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        # ProcessPoolExecutor não expõe como matar um worker ocupado; usa a lista interna, se existir
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.terminate()
+
+    def _submit(self, executor, data):
+        """Envia um arquivo ao pool; retorna (id da tarefa, future)."""
+        task_id = next(self._task_ids)
+        with self._started_lock:
+            self._watched.add(task_id)
+        return task_id, executor.submit(_extract_reporting_start, task_id, data, self.max_pages, self.max_chars)
+
+    def _forget(self, task_id):
+        with self._started_lock:
+            self._watched.discard(task_id)
+            self._started.pop(task_id, None)
+
+    def _collect_start_reports(self):
+        """Lê os inícios informados pelos workers (de todas as chamadas em andamento) sem bloquear."""
+        reports = self._start_reports
+        if reports is None:
+            return
+        while True:
+            try:
+                task_id, started_at = reports.get_nowait()
+            except (queue.Empty, OSError, ValueError, EOFError):
+                return
+            with self._started_lock:
+                if task_id in self._watched:
+                    self._started[task_id] = started_at
+
+    def _started_at(self, task_id):
+        with self._started_lock:
+            return self._started.get(task_id)
+
+    def _resubmit(self, broken_executor, payloads):
+        """Reenvia ao pool recriado os arquivos de um pool derrubado (por outro lote); retorna (pool, [(id, future)])."""
+        with self._lock:
+            discard = self._executor is broken_executor
+            if discard:
+                self._executor = None
+        if discard:
+            broken_executor.shutdown(wait=False, cancel_futures=True)
+        executor = self._get_executor()
+        return executor, [self._submit(executor, data) for data in payloads]
+
+    def extract_many(self, payloads):
+        """
+        Extrai o texto de uma lista de PDFs (bytes), em paralelo, preservando a ordem.
+        Cada posição do resultado é o dicionário de extract_pdf_text ou a exceção ocorrida.
+        """
+        if not payloads:
+            return []
+
+        if self.mode == 'inline':
+            results = []
+            for data in payloads:
+                try:
+                    results.append(extract_pdf_text(data, self.max_pages, self.max_chars))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        executor = self._get_executor()
+        submitted_at = time.monotonic()
+        try:
+            submissions = [self._submit(executor, data) for data in payloads]
+        except (OSError, RuntimeError) as e:
+            if self.mode != 'process':
+                raise
+            # Não foi possível iniciar os processos neste ambiente: passa a usar threads
+            print(f"Pool de processos indisponível ({e}); usando threads para extrair PDFs.")
+            self._reset_executor(executor)
+            self.mode = 'thread'
+            return self.extract_many(payloads)
+
+        task_ids = [task_id for task_id, _ in submissions]
+        futures = [future for _, future in submissions]
+        executors = [executor] * len(futures)
+        resubmitted = [False] * len(futures)
+        # Quanto um arquivo pode esperar na fila do pool: as "ondas" de max_workers à sua frente neste lote mais queue_timeout
+        queue_deadline = submitted_at + self.timeout * ((len(payloads) - 1) // self.max_workers) + self.queue_timeout
+        results = [None] * len(futures)
+        unfinished = set(range(len(futures)))
+        timed_out = set()  # pools com arquivos que estouraram o prazo durante a extração
+
+        while unfinished:
+            self._collect_start_reports()
+            now = time.monotonic()
+            for index in sorted(unfinished):
+                future = futures[index]
+                if future.done():
+                    try:
+                        results[index] = future.result()
+                    except (BrokenProcessPool, CancelledError) as e:
+                        # O pool foi derrubado por outro lote (PDF patológico): reenvia uma vez, ao pool recriado, este
+                        # arquivo e os seguintes ainda não extraídos; nunca extrai na thread da requisição
+                        if resubmitted[index]:
+                            results[index] = e if isinstance(e, BrokenProcessPool) else BrokenProcessPool("O pool de extração foi reiniciado.")
+                        else:
+                            broken_executor = executors[index]
+                            positions = [
+                                position for position in sorted(unfinished)
+                                if executors[position] is broken_executor and not resubmitted[position]
+                                and lost_in_broken_pool(futures[position])
+                            ]
+                            try:
+                                new_executor, new_submissions = self._resubmit(broken_executor, [payloads[p] for p in positions])
+                            except (OSError, RuntimeError) as resubmit_error:
+                                results[index] = resubmit_error
+                            else:
+                                for position, (new_task_id, new_future) in zip(positions, new_submissions):
+                                    self._forget(task_ids[position])
+                                    task_ids[position], futures[position] = new_task_id, new_future
+                                    executors[position] = new_executor
+                                    resubmitted[position] = True
+                                continue
+                    except Exception as e:
+                        results[index] = e
+                    unfinished.discard(index)
+                    self._forget(task_ids[index])
+                    continue
+
+                started_at = self._started_at(task_ids[index])
+                if started_at is not None:
+                    if now >= started_at + self.timeout:
+                        # Extração em andamento há mais que o limite: o pool será derrubado para liberar o worker
+                        timed_out.add(executors[index])
+                        future.cancel()
+                        results[index] = PdfExtractionTimeout(f"Tempo limite de {self.timeout:.0f}s excedido ao extrair o PDF.")
+                    else:
+                        continue
+                elif now >= queue_deadline:
+                    # Ainda esperando na fila (pool ocupado por outros lotes): desiste sem derrubar o pool
+                    future.cancel()
+                    results[index] = PdfExtractionTimeout("O PDF esperou demais na fila de extração.")
+                else:
+                    continue
+                unfinished.discard(index)
+                self._forget(task_ids[index])
+
+            if unfinished:
+                # Acorda quando algum arquivo terminar, ou a cada 0,1 s para ler os inícios informados pelos workers
+                wait([futures[index] for index in unfinished], timeout=0.1, return_when=FIRST_COMPLETED)
+
+        for timed_out_executor in timed_out:
+            self._reset_executor(timed_out_executor)
+        return results
+
+# Instância compartilhada pelo processo
+pdf_extractor = PdfExtractor()
@@ -4,47 +4,36 @@ document.addEventListener("DOMContentLoaded", () => {
 
 async function fetchDashboardData() {
   try {
-    const response = await fetch("/dashboard/data");
+    // Os agregados são calculados no servidor: o payload não cresce com o histórico
+    const response = await fetch("/dashboard/summary");
     if (!response.ok) {
       throw new Error("Não foi possível carregar os dados do dashboard.");
     }
-    const data = await response.json();
-    processAndRenderCharts(data);
+    const summary = await response.json();
+    processAndRenderCharts(summary);
   } catch (error) {
     console.error("Erro ao buscar dados do dashboard:", error);
   }
 }
 
-function processAndRenderCharts(data) {
-  if (!data || data.length === 0) {
+function processAndRenderCharts(summary) {
+  if (!summary || !summary.total) {
     console.log("Nenhum dado de histórico para exibir.");
     return;
   }
 
-  // --- Processamento para o Gráfico de Pizza ---
-  const classificationCounts = data.reduce((acc, item) => {
-    const classification = item.classification || "Desconhecido";
-    acc[classification] = (acc[classification] || 0) + 1;
-    return acc;
-  }, {});
+  // --- Dados para o Gráfico de Pizza ---
+  const classificationCounts = Object.fromEntries(
+    Object.entries(summary.classifications).map(([classification, stats]) => [
+      classification,
+      stats.count,
+    ])
+  );
 
   renderClassificationChart(classificationCounts);
 
-  // --- Processamento para a Lista de Tópicos ---
-  const keyTopicCounts = data.reduce((acc, item) => {
-    const topic = item.key_topic || "N/A";
-    if (topic !== "N/A") {
-      acc[topic] = (acc[topic] || 0) + 1;
-    }
-    return acc;
-  }, {});
-
-  // Ordena os tópicos por contagem (do maior para o menor)
-  const sortedTopics = Object.entries(keyTopicCounts).sort(
-    ([, a], [, b]) => b - a
-  );
-
-  renderTopicsList(sortedTopics);
+  // --- Lista de Tópicos (já ordenada por contagem no servidor) ---
+  renderTopicsList(summary.top_topics);
 }
 
 function renderClassificationChart(counts) {
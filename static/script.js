@@ -97,13 +97,33 @@ document.addEventListener("DOMContentLoaded", () => {
         `;
   }
 
+  // Busca no histórico: com texto usa /history/search; vazio volta à listagem cronológica
+  const historySearchForm = document.getElementById("history-search-form");
+  if (historySearchForm) {
+    historySearchForm.addEventListener("submit", (event) => {
+      event.preventDefault();
+      historySearchQuery = document
+        .getElementById("history-search-input")
+        .value.trim();
+      historyNextCursor = null;
+      loadHistory();
+    });
+  }
+
   const historyContainer = document.getElementById("history");
   if (historyContainer) {
     historyContainer.addEventListener("click", (event) => {
+      if (event.target.closest("#load-more-history")) {
+        loadHistory(true);
+        return;
+      }
       const header = event.target.closest(".history-header");
       if (header) {
         const item = header.closest(".history-item");
         item.classList.toggle("expanded");
+        if (item.classList.contains("expanded")) {
+          loadHistoryDetail(item);
+        }
       }
     });
   }
@@ -138,15 +158,24 @@ async function handleFormSubmit() {
   loadingIndicator.classList.remove("hidden");
 
   try {
-    const response = await fetch("/classify", {
+    // Usa o endpoint em streaming para exibir cada resultado assim que ele fica pronto
+    const response = await fetch("/classify/stream", {
       method: "POST",
       body: formData,
     });
-    const responseData = await response.json();
     if (!response.ok) {
+      const responseData = await response.json();
       throw new Error(responseData.error || "Ocorreu um erro no servidor.");
     }
-    displayResults(responseData);
+
+    const results = [];
+    await readNdjsonStream(response, (message) => {
+      if (message.type === "result") {
+        // Mantém a ordem de upload mesmo que os itens terminem fora de ordem
+        results[message.index] = message.result;
+        displayResults(results.filter(Boolean));
+      }
+    });
     loadHistory();
   } catch (error) {
     console.error("Erro:", error);
@@ -156,6 +185,27 @@ async function handleFormSubmit() {
   }
 }
 
+// Lê uma resposta NDJSON linha a linha, chamando onMessage para cada objeto recebido
+async function readNdjsonStream(response, onMessage) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (line.trim()) onMessage(JSON.parse(line));
+    }
+  }
+
+  if (buffer.trim()) onMessage(JSON.parse(buffer));
+}
+
 function displayResults(data) {
   const resultsArea = document.getElementById("results-area");
   resultsArea.innerHTML = "";
@@ -296,30 +346,68 @@ function clearError() {
 }
 
 // FUNÇÕES PARA O HISTÓRICO
-async function loadHistory() {
+// Cursor da próxima página do histórico (null quando não há mais registros)
+let historyNextCursor = null;
+// Texto buscado no histórico ("" = listagem cronológica)
+let historySearchQuery = "";
+
+async function loadHistory(append = false) {
   try {
-    const response = await fetch("/history");
+    const params = new URLSearchParams({ limit: "20" });
+    if (append && historyNextCursor) {
+      params.set("cursor", historyNextCursor);
+    }
+    if (historySearchQuery) {
+      params.set("q", historySearchQuery);
+    }
+    const endpoint = historySearchQuery ? "/history/search" : "/history/page";
+    const response = await fetch(`${endpoint}?${params}`);
     if (!response.ok) {
       throw new Error("Não foi possível carregar o histórico.");
     }
-    const historyData = await response.json();
-    displayHistory(historyData);
+    const page = await response.json();
+    historyNextCursor = page.next_cursor;
+    displayHistory(page.items, append);
   } catch (error) {
     console.error("Erro ao carregar histórico:", error);
   }
 }
 
-function displayHistory(history) {
+// Busca o conteúdo completo do e-mail apenas quando o item é expandido
+async function loadHistoryDetail(item) {
+  if (item.dataset.loaded) return;
+  item.dataset.loaded = "true";
+  try {
+    const response = await fetch(`/history/${item.dataset.id}`);
+    if (!response.ok) {
+      throw new Error("Não foi possível carregar o e-mail.");
+    }
+    const detail = await response.json();
+    item.querySelector(".history-email-content").innerHTML = (
+      detail.email_content || ""
+    ).replace(/\n/g, "<br>");
+  } catch (error) {
+    delete item.dataset.loaded;
+    console.error("Erro ao carregar detalhe do histórico:", error);
+  }
+}
+
+function displayHistory(history, append = false) {
   const historyList = document.getElementById("history-list");
-  if (history.length === 0) {
-    historyList.innerHTML = "<p>Nenhuma análise foi feita ainda.</p>";
+  const loadMoreButton = document.getElementById("load-more-history");
+  if (loadMoreButton) loadMoreButton.remove();
+
+  if (!append && history.length === 0) {
+    historyList.innerHTML = historySearchQuery
+      ? "<p>Nenhuma análise encontrada para a busca.</p>"
+      : "<p>Nenhuma análise foi feita ainda.</p>";
     return;
   }
 
-  historyList.innerHTML = history
+  const itemsHTML = history
     .map(
       (item) => `
-        <div class="history-item">
+        <div class="history-item" data-id="${item.id}">
             <div class="history-header">
                 <div class="history-header-left">
                     <span class="history-category category-${item.classification.toLowerCase()}">${
@@ -336,15 +424,31 @@ function displayHistory(history) {
             <div class="history-content-wrapper">
                 <p class="history-content">
                     <strong>E-mail Analisado:</strong><br>
-                    ${item.email_content.replace(/\n/g, "<br>")}
+                    <span class="history-email-content">${item.email_snippet.replace(
+                      /\n/g,
+                      "<br>"
+                    )}</span>
                 </p>
                 <p class="history-content" style="margin-top: 1rem;">
                     <strong>Resposta Sugerida:</strong><br>
-                    ${item.suggested_response.replace(/\n/g, "<br>")}
+                    ${(item.suggested_response || "").replace(/\n/g, "<br>")}
                 </p>
             </div>
         </div>
     `
     )
     .join("");
+
+  if (append) {
+    historyList.insertAdjacentHTML("beforeend", itemsHTML);
+  } else {
+    historyList.innerHTML = itemsHTML;
+  }
+
+  if (historyNextCursor) {
+    historyList.insertAdjacentHTML(
+      "beforeend",
+      `<button type="button" id="load-more-history" class="load-more-btn">Carregar mais</button>`
+    );
+  }
 }
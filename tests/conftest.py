@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos da aplicação ficam em src/ e são importados pelo nome (como no app.py)
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+@pytest.fixture
+def temp_database(tmp_path, monkeypatch):
+    """Aponta o módulo database para um arquivo SQLite temporário e aplica as migrações."""
+    import database
+
+    path = str(tmp_path / 'emails.db')
+    monkeypatch.setattr(database, 'DATABASE_NAME', path)
+    database.initialize_db()
+    return path
@@ -0,0 +1,66 @@
+from email_cleanup import (
+    apply_token_budget, prepare_email_for_prompt, strip_disclaimers, strip_quoted_replies, strip_signature,
+    OMISSION_MARKER,
+)
+
+def prepared(text, max_tokens=2000):
+    return prepare_email_for_prompt(text, max_tokens)[0]
+
+# Falsos positivos: termos de aviso legal ou frases de resposta no próprio conteúdo do e-mail
+
+def test_keeps_body_paragraph_mentioning_confidential():
+    text = "Olá equipe,\n\nPreciso com urgência do acesso ao relatório confidencial do cliente X até sexta.\n\nObrigado"
+    assert prepared(text) == text
+
+def test_keeps_body_paragraph_mentioning_privileged():
+    text = "Hi team,\n\nCould you send the privileged access request form? We need it for the audit.\n\nBest\nAna"
+    assert prepared(text) == "Hi team,\n\nCould you send the privileged access request form? We need it for the audit."
+
+def test_body_line_with_wrote_does_not_cut_the_email():
+    text = "Hi,\n\nOn Monday you wrote:\nthe report is late. Can you resend it today?\n\nThanks"
+    assert strip_quoted_replies(text) == text
+
+def test_never_removes_the_only_substantive_paragraph():
+    text = "Oi,\n\nEste e-mail confidencial é destinado ao destinatário pretendido da auditoria, favor responder hoje."
+    assert strip_disclaimers(text) == text
+
+# Remoções esperadas
+
+def test_strips_trailing_disclaimer_block():
+    text = ("Olá,\n\nSegue o pedido de reembolso do mês passado, favor aprovar.\n\n"
+            "Esta mensagem pode conter informação confidencial e privilegiada, destinada exclusivamente "
+            "ao destinatário pretendido.")
+    assert strip_disclaimers(text) == "Olá,\n\nSegue o pedido de reembolso do mês passado, favor aprovar."
+
+def test_strips_gmail_reply_header_and_quoted_text():
+    text = ("Please send the invoice for March, the payment is blocked.\n\n"
+            "On Mon, Jan 5, 2024 at 10:00 AM John <john@example.com> wrote:\n> old message")
+    assert prepared(text) == "Please send the invoice for March, the payment is blocked."
+
+def test_strips_portuguese_reply_header():
+    text = "Pode enviar o boleto?\n\nEm seg., 5 de jan. de 2024 às 10:00, Fulano <f@example.com> escreveu:\n> antigo"
+    assert prepared(text) == "Pode enviar o boleto?"
+
+def test_strips_outlook_header_block():
+    text = "Confirmo a reunião.\n\nDe: Fulano <f@example.com>\nEnviado: segunda-feira\nAssunto: Reunião\n\nTexto antigo"
+    assert strip_quoted_replies(text).strip() == "Confirmo a reunião."
+
+def test_strips_signature_after_closing():
+    text = "Pode verificar o chamado 123?\n\nAtenciosamente,\nFulano\nAnalista"
+    assert strip_signature(text) == "Pode verificar o chamado 123?\n"
+
+def test_cleanup_never_empties_the_email():
+    text = "> só texto citado\n> nada mais"
+    assert prepared(text)
+
+def test_token_budget_keeps_head_and_tail():
+    text = "início " + "palavra " * 2000 + "final"
+    budgeted = apply_token_budget(text, 100)
+    assert budgeted.startswith("início") and budgeted.endswith("final")
+    assert OMISSION_MARKER in budgeted
+    assert len(budgeted) <= 100 * 4
+
+def test_reports_saved_tokens():
+    _, tokens = prepare_email_for_prompt("a " * 10000, 100)
+    assert tokens['sent'] <= 100 < tokens['original']
+    assert tokens['saved'] == tokens['original'] - tokens['sent']
@@ -0,0 +1,29 @@
+import gzip
+
+from export import EXPORT_ERROR_MARKER, iter_csv_chunks, iter_gzip
+
+COLUMNS = ['id', 'classification']
+
+def failing_rows(count):
+    for index in range(count):
+        yield {'id': index, 'classification': 'Produtivo'}
+    raise RuntimeError('database is locked')
+
+def test_complete_export_has_no_error_marker():
+    rows = [{'id': 1, 'classification': 'Produtivo'}, {'id': 2, 'classification': 'Improdutivo'}]
+    content = ''.join(iter_csv_chunks(rows, COLUMNS))
+
+    assert content.splitlines() == ['﻿ID;Classificação', '1;Produtivo', '2;Improdutivo']
+
+def test_database_error_mid_stream_ends_with_error_marker():
+    content = ''.join(iter_csv_chunks(failing_rows(3), COLUMNS, chunk_size=2))
+
+    lines = content.splitlines()
+    assert lines[1:4] == ['0;Produtivo', '1;Produtivo', '2;Produtivo']
+    assert lines[-1] == EXPORT_ERROR_MARKER.format(count=3)
+
+def test_gzip_export_keeps_error_marker_and_valid_archive():
+    data = b''.join(iter_gzip(iter_csv_chunks(failing_rows(1), COLUMNS)))
+
+    lines = gzip.decompress(data).decode('utf-8').splitlines()
+    assert lines[-1] == EXPORT_ERROR_MARKER.format(count=1)
@@ -0,0 +1,79 @@
+import database
+
+def job_items(count):
+    return [{'content': f'E-mail {number}', 'filename': f'{number}.txt'} for number in range(count)]
+
+def test_claim_reserves_each_item_once(temp_database):
+    job_id = database.create_job(job_items(3))
+
+    _, first = database.claim_job_items(2, lease_seconds=600, max_attempts=3)
+    _, second = database.claim_job_items(2, lease_seconds=600, max_attempts=3)
+    _, third = database.claim_job_items(2, lease_seconds=600, max_attempts=3)
+
+    assert [item[1] for item in first] == [0, 1]
+    assert [item[1] for item in second] == [2]
+    assert third == []
+    assert database.get_job(job_id)['status'] == 'running'
+    # Itens reservados ainda contam como não concluídos (para a retomada após uma queda)
+    assert database.has_unfinished_job_items()
+
+def test_expired_lease_is_reclaimed_and_stale_result_discarded(temp_database):
+    job_id = database.create_job(job_items(1))
+
+    stale_token, claimed = database.claim_job_items(10, lease_seconds=-1, max_attempts=3)
+    assert len(claimed) == 1
+
+    # A reserva já venceu: outro worker assume o item
+    token, reclaimed = database.claim_job_items(10, lease_seconds=600, max_attempts=3)
+    assert [item[1] for item in reclaimed] == [0]
+
+    assert not database.complete_job_item(job_id, 0, {'classification': 'Produtivo'}, stale_token)
+    assert database.complete_job_item(job_id, 0, {'classification': 'Improdutivo'}, token)
+
+    job = database.get_job(job_id)
+    assert job['status'] == 'completed' and job['succeeded'] == 1
+    results, next_since = database.get_job_results(job_id)
+    assert results[0]['result'] == {'classification': 'Improdutivo'}
+    assert next_since == 1
+    assert not database.has_unfinished_job_items()
+
+def test_item_fails_after_max_attempts(temp_database):
+    job_id = database.create_job(job_items(1))
+
+    for _ in range(2):
+        _, claimed = database.claim_job_items(10, lease_seconds=-1, max_attempts=2)
+        assert len(claimed) == 1
+    _, claimed = database.claim_job_items(10, lease_seconds=-1, max_attempts=2)
+
+    assert claimed == []
+    job = database.get_job(job_id)
+    assert job['status'] == 'completed' and job['failed'] == 1
+    results, _ = database.get_job_results(job_id)
+    assert 'error' in results[0]['result']
+
+def test_job_results_are_paged_in_completion_order(temp_database):
+    job_id = database.create_job(job_items(3))
+    token, _ = database.claim_job_items(10, lease_seconds=600, max_attempts=3)
+    for index in (2, 0, 1):
+        database.complete_job_item(job_id, index, {'index': index}, token)
+
+    first, since = database.get_job_results(job_id, limit=2)
+    rest, _ = database.get_job_results(job_id, since=since)
+    assert [item['index'] for item in first + rest] == [2, 0, 1]
+
+def test_items_with_errors_are_stored_finished(temp_database):
+    job_id = database.create_job([{'error': 'PDF inválido', 'filename': 'a.pdf'}])
+    assert database.get_job(job_id)['status'] == 'completed'
+    results, _ = database.get_job_results(job_id)
+    assert results[0]['result'] == {'error': 'PDF inválido', 'filename': 'a.pdf'}
+
+def test_pdf_items_are_stored_raw_for_the_worker(temp_database):
+    job_id = database.create_job([{'pdf_data': b'%PDF-1.4 ...', 'filename': 'a.pdf'}, {'content': 'Texto', 'filename': 'b.txt'}])
+
+    token, claimed = database.claim_job_items(10, lease_seconds=600, max_attempts=3)
+    assert [item[2:] for item in claimed] == [('a.pdf', None, b'%PDF-1.4 ...'), ('b.txt', 'Texto', None)]
+
+    database.complete_job_item(job_id, 0, {'classification': 'Produtivo'}, token)
+    with database.get_connection() as conn:
+        row = conn.execute("SELECT pdf_data FROM classification_job_items WHERE job_id = ? AND item_index = 0", (job_id,)).fetchone()
+    assert row[0] is None
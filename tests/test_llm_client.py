@@ -0,0 +1,177 @@
+import pytest
+
+from llm_client import (
+    CircuitBreaker, CircuitOpenError, LLMClient, LLMDeadlineExceeded, TokenBucket, is_retryable, requests_sent
+)
+
+class FakeClock:
+    """Relógio controlado pelo teste: sleep só avança o tempo."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+class InvalidArgument(Exception):
+    code = 400
+
+class FakeModel:
+    """Modelo falso que devolve (ou levanta) os itens de `outcomes` em ordem."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def make_client(model, clock, **kwargs):
+    kwargs.setdefault('breaker', CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock))
+    return LLMClient(lambda: model, clock=clock, sleep=clock.sleep, **kwargs)
+
+def test_is_retryable():
+    assert is_retryable(ServiceUnavailable())
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(InvalidArgument())
+    assert not is_retryable(ValueError())
+
+def test_retries_transient_errors_with_backoff():
+    clock = FakeClock()
+    model = FakeModel([ServiceUnavailable(), ServiceUnavailable(), 'ok'])
+    client = make_client(model, clock, max_retries=3, backoff_base=1.0, backoff_max=8.0)
+
+    assert client.generate_content('prompt') == 'ok'
+    assert model.calls == 3
+    assert len(clock.sleeps) == 2
+    # Jitter completo: cada espera fica entre 0 e base * 2^(tentativa - 1)
+    assert 0 <= clock.sleeps[0] <= 1.0 and 0 <= clock.sleeps[1] <= 2.0
+    assert client.get_stats()['retries'] == 2
+
+def test_gives_up_after_max_retries():
+    clock = FakeClock()
+    model = FakeModel([ServiceUnavailable()] * 3)
+    client = make_client(model, clock, max_retries=2,
+                         breaker=CircuitBreaker(failure_threshold=10, clock=clock))
+
+    with pytest.raises(ServiceUnavailable):
+        client.generate_content('prompt')
+    assert model.calls == 3
+
+def test_does_not_retry_request_errors():
+    clock = FakeClock()
+    model = FakeModel([InvalidArgument()])
+    client = make_client(model, clock)
+
+    with pytest.raises(InvalidArgument):
+        client.generate_content('prompt')
+    assert model.calls == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+def test_backoff_past_the_deadline_raises_deadline_exceeded():
+    clock = FakeClock()
+    model = FakeModel([ServiceUnavailable()] * 5)
+    client = make_client(model, clock, max_retries=5, backoff_base=10.0, backoff_max=10.0)
+    client.rng.uniform = lambda low, high: high
+
+    with pytest.raises(LLMDeadlineExceeded):
+        client.generate_content('prompt', timeout=5)
+    assert model.calls == 1
+
+def test_rate_limit_wait_past_the_deadline_raises_deadline_exceeded():
+    clock = FakeClock()
+    model = FakeModel(['ok', 'ok'])
+    client = make_client(model, clock, requests_per_minute=1)
+
+    assert client.generate_content('prompt', timeout=5) == 'ok'
+    # A próxima ficha só estaria disponível em 60 s
+    with pytest.raises(LLMDeadlineExceeded):
+        client.generate_content('prompt', timeout=5)
+    assert model.calls == 1
+
+def test_rate_limit_waits_for_the_next_token():
+    clock = FakeClock()
+    model = FakeModel(['ok', 'ok'])
+    client = make_client(model, clock, requests_per_minute=60)
+    client.request_bucket = TokenBucket(60, capacity=1, clock=clock)
+
+    client.generate_content('prompt')
+    client.generate_content('prompt')
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+def test_breaker_opens_half_opens_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    model = FakeModel([ServiceUnavailable(), ServiceUnavailable(), 'ok'])
+    client = make_client(model, clock, max_retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(ServiceUnavailable):
+            client.generate_content('prompt')
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Aberto: falha na hora, sem chamar o modelo
+    with pytest.raises(CircuitOpenError):
+        client.generate_content('prompt')
+    assert model.calls == 2
+    assert client.get_stats()['short_circuited'] == 1
+
+    # Após o reset_timeout, uma chamada de teste fecha o circuito
+    clock.now += 30
+    assert client.generate_content('prompt') == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_failed_probe_reopens_the_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 10
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Só uma chamada de teste por vez
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_errors_report_how_many_requests_were_sent():
+    clock = FakeClock()
+    model = FakeModel([ServiceUnavailable()] * 3)
+    client = make_client(model, clock, max_retries=2, backoff_base=0.1)
+
+    with pytest.raises(ServiceUnavailable) as failed:
+        client.generate_content('prompt')
+    assert requests_sent(failed.value) == 3
+
+    # O circuito abriu com as três falhas: a próxima chamada nem chega ao modelo
+    with pytest.raises(CircuitOpenError) as short_circuited:
+        client.generate_content('prompt')
+    assert requests_sent(short_circuited.value) == 0
+    assert model.calls == 3
+
+def test_deadline_while_throttled_reports_no_request_sent():
+    clock = FakeClock()
+    client = make_client(FakeModel(['ok']), clock, requests_per_minute=1)
+    client.generate_content('prompt', timeout=5)
+
+    with pytest.raises(LLMDeadlineExceeded) as exceeded:
+        client.generate_content('prompt', timeout=5)
+    assert requests_sent(exceeded.value) == 0
+    assert requests_sent(ValueError()) == 1
@@ -0,0 +1,49 @@
+import random
+
+import database
+from local_classifier import LocalClassifier, NEGATIVE_LABEL, POSITIVE_LABEL
+
+def make_corpus(size, seed=1):
+    rng = random.Random(seed)
+    documents, labels = [], []
+    for _ in range(size):
+        positive = rng.random() < 0.5
+        productive, unproductive = ('pedid', 'boleto', 'acess', 'fatur'), ('parabens', 'obrig', 'feliz', 'natal')
+        own, other = (productive, unproductive) if positive else (unproductive, productive)
+        documents.append([rng.choice(own) for _ in range(6)] + [rng.choice(other)] + [f'comum{rng.randrange(200)}' for _ in range(10)])
+        labels.append(POSITIVE_LABEL if positive else NEGATIVE_LABEL)
+    return documents, labels
+
+def test_train_separates_the_classes():
+    documents, labels = make_corpus(400)
+    model = LocalClassifier.train(documents[:300], labels[:300])
+
+    predictions = [model.predict(tokens) for tokens in documents[300:]]
+    assert all(label == expected for (label, _), expected in zip(predictions, labels[300:]))
+    assert sum(confidence >= 0.9 for _, confidence in predictions) > 50
+
+def test_train_is_deterministic_for_a_seed():
+    documents, labels = make_corpus(100)
+    first = LocalClassifier.train(documents, labels, seed=7)
+    second = LocalClassifier.train(documents, labels, seed=7)
+    assert first.weights == second.weights and first.bias == second.bias
+
+def insert_history(count, source='llm'):
+    database.insert_classifications([
+        (POSITIVE_LABEL if number % 2 else NEGATIVE_LABEL, 0.9, 'N/A', 'Neutro', 'Ok', f'E-mail {number}', source)
+        for number in range(count)
+    ])
+
+def test_get_training_data_returns_only_llm_rows(temp_database):
+    insert_history(5)
+    insert_history(3, source='local')
+    assert len(database.get_training_data()) == 5
+
+def test_get_training_data_samples_up_to_max_rows(temp_database):
+    insert_history(50)
+    sample = database.get_training_data(max_rows=10)
+
+    assert len(sample) == 10
+    assert len(set(sample)) == 10
+    # A amostra não se limita às primeiras linhas da tabela
+    assert any(int(content.split()[-1]) >= 10 for content, _ in sample)
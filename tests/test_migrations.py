@@ -0,0 +1,147 @@
+import sqlite3
+
+import pytest
+
+import database
+
+# Schema da primeira versão do projeto (antes das migrações versionadas)
+BASELINE_SCHEMA = """
+    CREATE TABLE classifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        classification TEXT NOT NULL,
+        confidence_score REAL NOT NULL,
+        suggested_response TEXT,
+        email_content TEXT,
+        created_at TEXT NOT NULL,
+        key_topic TEXT,
+        sentiment TEXT
+    )
+"""
+
+@pytest.fixture
+def baseline_database(tmp_path, monkeypatch):
+    path = str(tmp_path / 'baseline.db')
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany("""
+        INSERT INTO classifications (classification, confidence_score, suggested_response, email_content, created_at, key_topic, sentiment)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        ('Produtivo', 0.9, 'Vamos enviar.', 'Preciso da segunda via do boleto\nde março', '2024-03-01T10:00:00', 'Boleto', 'Neutro'),
+        ('Improdutivo', 0.7, 'Obrigado!', 'Parabéns pelo ótimo atendimento ' * 10, '2024-03-02T10:00:00', None, 'Positivo'),
+    ])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(database, 'DATABASE_NAME', path)
+    return path
+
+def columns(path, table):
+    with sqlite3.connect(path) as conn:
+        return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+# Migrações (user_version)
+
+def test_migrates_baseline_database(baseline_database):
+    database.initialize_db()
+
+    with sqlite3.connect(baseline_database) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(database.MIGRATIONS)
+        assert conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0] == 2
+    assert {'source', 'email_snippet', 'minhash'} <= columns(baseline_database, 'classifications')
+
+def test_migrations_are_idempotent(baseline_database, monkeypatch):
+    database.initialize_db()
+    # Simula outro processo encontrando o banco parcialmente marcado: as migrações rodam de novo sem erro
+    with sqlite3.connect(baseline_database) as conn:
+        conn.execute("PRAGMA user_version = 0")
+    monkeypatch.setattr(database, '_initialized_database', None)
+    database.initialize_db()
+
+    with sqlite3.connect(baseline_database) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(database.MIGRATIONS)
+        assert conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0] == 2
+
+# Snippets do histórico
+
+def test_migration_backfills_snippets(baseline_database):
+    database.initialize_db()
+
+    items, _ = database.get_history_page(limit=10)
+    assert [item['email_snippet'] for item in items][1] == 'Preciso da segunda via do boleto de março'
+    assert items[0]['email_snippet'].endswith('...')
+
+# Agregados do dashboard
+
+def test_migration_backfills_rollups(baseline_database):
+    database.initialize_db()
+
+    aggregates = database.get_dashboard_aggregates()
+    assert aggregates['total'] == 2
+    assert aggregates['classifications']['Produtivo']['count'] == 1
+
+def test_new_rows_after_migration_update_rollups(baseline_database):
+    database.initialize_db()
+    database.insert_classifications([
+        ('Produtivo', 0.8, 'Pagamento', 'Neutro', 'Ok', 'Fatura 123 em atraso', 'llm'),
+    ])
+
+    aggregates = database.get_dashboard_aggregates()
+    assert aggregates['total'] == 3
+    assert aggregates['classifications']['Produtivo']['count'] == 2
+
+# Busca textual
+
+def test_migration_indexes_existing_rows(baseline_database):
+    database.initialize_db()
+
+    results, _ = database.search_history('boleto')
+    assert [result['classification'] for result in results] == ['Produtivo']
+
+def test_new_rows_after_migration_are_searchable(baseline_database):
+    database.initialize_db()
+    database.insert_classifications([
+        ('Produtivo', 0.8, 'Pagamento', 'Neutro', 'Ok', 'Fatura 123 em atraso', 'llm'),
+    ])
+
+    results, _ = database.search_history('fatura')
+    assert len(results) == 1
+
+def test_search_index_is_created_when_fts5_becomes_available(baseline_database, monkeypatch):
+    # Primeira inicialização com um SQLite sem FTS5: a migração é pulada, mas a versão avança
+    skip_search = lambda conn: None
+    monkeypatch.setattr(database, '_migration_history_search', skip_search)
+    monkeypatch.setattr(database, 'MIGRATIONS', [
+        skip_search if migration.__name__ == '_migration_history_search' else migration
+        for migration in database.MIGRATIONS
+    ])
+    database.initialize_db()
+    with sqlite3.connect(baseline_database) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(database.MIGRATIONS)
+        assert database._history_search_missing(conn)
+    monkeypatch.undo()
+    monkeypatch.setattr(database, 'DATABASE_NAME', baseline_database)
+    monkeypatch.setattr(database, '_initialized_database', None)
+
+    database.initialize_db()
+
+    results, _ = database.search_history('boleto')
+    assert [result['classification'] for result in results] == ['Produtivo']
+
+# Assinaturas MinHash
+
+def test_minhash_migration_discards_old_signatures(temp_database, monkeypatch):
+    database.insert_classifications([('Produtivo', 0.9, 'N/A', 'Neutro', 'Ok', 'E-mail antigo', 'llm', b'\x01' * 256)])
+    with sqlite3.connect(temp_database) as conn:
+        conn.execute(f"PRAGMA user_version = {len(database.MIGRATIONS) - 1}")
+    monkeypatch.setattr(database, '_initialized_database', None)
+    database.initialize_db()
+
+    with sqlite3.connect(temp_database) as conn:
+        assert conn.execute("SELECT minhash FROM classifications").fetchone()[0] is None
+        assert conn.execute("SELECT COUNT(*) FROM classification_lsh_bands").fetchone()[0] == 0
+    # Pendente de reindexação (flask reindex-near-duplicates)
+    assert len(list(database.iter_rows_without_signature())) == 1
+
+    database.insert_classifications([('Produtivo', 0.9, 'N/A', 'Neutro', 'Ok', 'E-mail novo', 'llm', b'\x02' * 512)])
+    with sqlite3.connect(temp_database) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM classification_lsh_bands").fetchone()[0] == database.LSH_BANDS
@@ -0,0 +1,56 @@
+import random
+import string
+
+import database
+from near_duplicates import (
+    MINHASH_PERMUTATIONS, estimate_similarity, find_near_duplicate, make_shingles, match_threshold, minhash_signature
+)
+
+def make_pair(seed, length=75, changed=6):
+    """Dois textos de tokens distintos que diferem só nos `changed` últimos tokens."""
+    rng = random.Random(seed)
+    word = lambda: ''.join(rng.choice(string.ascii_lowercase) for _ in range(8))
+    tokens = [word() for _ in range(length)]
+    return tokens, tokens[:length - changed] + [word() for _ in range(changed)]
+
+def jaccard(tokens, other):
+    shingles, other_shingles = make_shingles(tokens), make_shingles(other)
+    return len(shingles & other_shingles) / len(shingles | other_shingles)
+
+def test_known_jaccard_pairs_at_the_threshold_are_matched():
+    # 74 shingles em cada texto, 68 em comum: Jaccard = 68 / 80 = 0,85
+    pairs = [make_pair(seed) for seed in range(50)]
+    assert all(abs(jaccard(a, b) - 0.85) < 1e-9 for a, b in pairs)
+
+    estimates = [estimate_similarity(minhash_signature(a), minhash_signature(b)) for a, b in pairs]
+    # Sem a margem, cerca de metade dos pares ficaria abaixo do limiar
+    assert sum(estimate >= match_threshold(0.85) for estimate in estimates) >= 45
+
+def test_dissimilar_pairs_are_not_matched():
+    pairs = [make_pair(seed, changed=20) for seed in range(50)]
+    assert all(jaccard(a, b) < 0.6 for a, b in pairs)
+
+    estimates = [estimate_similarity(minhash_signature(a), minhash_signature(b)) for a, b in pairs]
+    assert not any(estimate >= match_threshold(0.85) for estimate in estimates)
+
+def test_match_threshold_margin_shrinks_with_more_permutations():
+    assert match_threshold(0.85) < 0.85
+    assert match_threshold(0.85, permutations=64) < match_threshold(0.85, permutations=MINHASH_PERMUTATIONS)
+    assert match_threshold(1.0) == 1.0
+
+def test_signatures_of_another_size_are_ignored():
+    tokens, other = make_pair(0)
+    assert estimate_similarity(minhash_signature(tokens), minhash_signature(other)[:256]) == 0.0
+
+def test_find_near_duplicate_uses_the_lsh_index(temp_database):
+    stored, incoming = make_pair(3)
+    database.insert_classifications([
+        ('Produtivo', 0.9, 'Boleto', 'Neutro', 'Ok', ' '.join(stored), 'llm', minhash_signature(stored)),
+    ])
+
+    match, similarity = find_near_duplicate(minhash_signature(incoming), 0.85)
+    assert match is not None and match['classification'] == 'Produtivo'
+    assert similarity >= match_threshold(0.85)
+
+    unrelated, _ = make_pair(4)
+    assert find_near_duplicate(minhash_signature(unrelated), 0.85) == (None, 0.0)
@@ -0,0 +1,64 @@
+import json
+
+from packing import build_packed_prompt, estimate_tokens, pack_items, parse_packed_response
+
+def entry(number, **fields):
+    value = {
+        'id': number,
+        'classification': 'Produtivo',
+        'confidence_score': 0.9,
+        'key_topic': 'Pagamento',
+        'sentiment': 'Neutro',
+        'suggested_response': 'Vamos verificar.',
+    }
+    value.update(fields)
+    return value
+
+def test_parses_entries_by_id():
+    text = json.dumps([entry(2, classification='Improdutivo'), entry(1)])
+    parsed = parse_packed_response(text, 2)
+    assert parsed[1]['classification'] == 'Produtivo'
+    assert parsed[2]['classification'] == 'Improdutivo'
+
+def test_accepts_markdown_fence_and_wrapping_object():
+    text = '```json\n' + json.dumps({'results': [entry(1)]}) + '\n```'
+    assert list(parse_packed_response(text, 1)) == [1]
+
+def test_invalid_json_returns_nothing():
+    assert parse_packed_response('não é json', 3) == {}
+    assert parse_packed_response(json.dumps(entry(1)), 1) == {}
+
+def test_drops_out_of_range_and_duplicated_ids():
+    text = json.dumps([entry(1), entry(2), entry(2, classification='Improdutivo'), entry(3), entry('x')])
+    assert set(parse_packed_response(text, 2)) == {1}
+
+def test_drops_invalid_entries_and_normalizes_optional_fields():
+    text = json.dumps([
+        entry(1, classification='Talvez'),
+        entry(2, confidence_score=1.5),
+        entry(3, suggested_response=''),
+        entry(4, key_topic='', sentiment='Irritado'),
+    ])
+    parsed = parse_packed_response(text, 4)
+    assert set(parsed) == {4}
+    assert parsed[4]['key_topic'] == 'N/A' and parsed[4]['sentiment'] == 'N/A'
+
+def test_build_packed_prompt_numbers_emails():
+    prompt = build_packed_prompt('{count}:{emails}', ['a', 'b'])
+    assert prompt.startswith('2:')
+    assert '=== E-mail id=1 ===\na\n' in prompt and '=== E-mail id=2 ===\nb\n' in prompt
+
+def test_pack_items_respects_item_and_token_limits():
+    short = 'x' * 40      # 10 tokens
+    long = 'x' * 4000     # 1000 tokens: segue sozinho
+    entries = list(enumerate({'content': content} for content in [short, short, short, long, short]))
+    groups = pack_items(entries, max_items=2, max_tokens=100, max_item_tokens=600)
+    assert all(len(group) <= 2 for group in groups)
+    assert [3] in [[index for index, _ in group] for group in groups]
+    assert sorted(index for group in groups for index, _ in group) == [0, 1, 2, 3, 4]
+    assert estimate_tokens(short) == 10
+
+def test_pack_items_keeps_errors_alone():
+    entries = [(0, {'content': 'a'}), (1, {'error': 'falha'}), (2, {'content': 'b'})]
+    groups = pack_items(entries, max_items=8, max_tokens=4000, max_item_tokens=600)
+    assert [(1, {'error': 'falha'})] in groups
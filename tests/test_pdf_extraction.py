@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+import pdf_extraction
+from pdf_extraction import PdfExtractionTimeout, PdfExtractor
+
+@pytest.fixture(autouse=True)
+def slow_extraction(monkeypatch):
+    # Cada "PDF" é a duração (em segundos) da extração simulada
+    def extract(data, max_pages, max_chars):
+        time.sleep(float(data))
+        return {'text': data.decode(), 'pages_read': 1, 'total_pages': 1, 'truncated': False}
+    monkeypatch.setattr(pdf_extraction, 'extract_pdf_text', extract)
+
+def kinds(results):
+    return ['timeout' if isinstance(result, PdfExtractionTimeout) else 'ok' for result in results]
+
+def test_waiting_behind_another_batch_does_not_count_as_timeout():
+    extractor = PdfExtractor(mode='thread', max_workers=1, timeout=0.5)
+    results = {}
+
+    def run(name, payloads):
+        results[name] = kinds(extractor.extract_many(payloads))
+
+    # Com um único worker, o segundo lote espera ~0,9 s na fila, mas cada arquivo leva só 0,3 s
+    threads = [threading.Thread(target=run, args=(name, [b'0.3'] * 3)) for name in ('first', 'second')]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+
+    assert results == {'first': ['ok'] * 3, 'second': ['ok'] * 3}
+
+def test_file_running_longer_than_timeout_fails():
+    extractor = PdfExtractor(mode='thread', max_workers=2, timeout=0.3)
+    assert kinds(extractor.extract_many([b'0.05', b'1.0'])) == ['ok', 'timeout']
+
+def test_file_that_never_starts_gives_up_after_queue_timeout():
+    extractor = PdfExtractor(mode='thread', max_workers=1, timeout=5.0, queue_timeout=0.2)
+    blocker = threading.Thread(target=extractor.extract_many, args=([b'1.0'],))
+    blocker.start()
+    time.sleep(0.05)
+
+    started_at = time.monotonic()
+    assert kinds(extractor.extract_many([b'0.01'])) == ['timeout']
+    assert time.monotonic() - started_at < 1.0
+    blocker.join()
+
+def test_inline_mode_keeps_order():
+    extractor = PdfExtractor(mode='inline')
+    assert [result['text'] for result in extractor.extract_many([b'0.02', b'0.01'])] == ['0.02', '0.01']